@@ -151,7 +151,8 @@ with main_container:
         # 显示选中的曲目
         selected_song = get_selected_song()
         if selected_song:
-            st.info(f"📋 当前选中曲目：{selected_song}")
+            selected_song_id, selected_song_name = selected_song
+            st.info(f"📋 当前选中曲目：{selected_song_name}")
 
         # 检查是否显示音频播放器
         if st.session_state.get('show_audio_player'):
@@ -162,16 +163,19 @@ with main_container:
             render_sheet_music_management(st.session_state.show_sheet_management)
         elif selected_song:
             # 当选中曲目时，显示评分管理界面
-            st.header(f"🎯 {selected_song} - 评分管理")
+            st.header(f"🎯 {selected_song_name} - 评分管理")
 
             # 导入演奏录音管理模块
-            from utils.recording_manager import render_recordings_list, render_recording_upload_form
+            from utils.recording_manager import render_recordings_list, render_recording_upload_form, render_leaderboard
 
             # 添加新演奏录音
-            render_recording_upload_form(selected_song)
+            render_recording_upload_form(selected_song_id)
+
+            # 排行榜
+            render_leaderboard(selected_song_id)
 
             # 显示已有演奏录音列表
-            render_recordings_list(selected_song)
+            render_recordings_list(selected_song_id)
         else:
             # 没有选中曲目时的提示
             st.empty()
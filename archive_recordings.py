@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+归档长时间没有新评分的录音（冷存储）
+
+用法：
+    PYTHONPATH=. python archive_recordings.py [--days N] [--batch-size N] [--dry-run] [--vacuum]
+    PYTHONPATH=. python archive_recordings.py --restore 录音ID [录音ID ...]
+
+归档流程（见 database/archive.py）：
+1. 找出上传超过 N 天、且 N 天内没有新评分的录音
+2. 录音、参考音频、评分图表文件用 gzip 压缩到归档目录，录音、评分、分段数据写入归档数据库
+3. 在线库中删除这些数据，只保留存根（演奏者、乐器、最近一次总分），删除原文件
+4. --vacuum 时整理在线数据库，释放删除数据占用的空间，让数据库文件和备份变小
+
+归档的录音也可以在录音列表的"已归档的录音"中恢复。
+"""
+import sys
+import os
+import argparse
+from datetime import datetime, timedelta, timezone
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database.models.base import SessionLocal, engine, init_db
+from database.archive import archive_old_recordings, find_archivable_recordings, restore_recording
+from config.settings import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, ARCHIVE_DATABASE_PATH, ARCHIVE_DIR
+
+
+def vacuum():
+    """整理在线数据库（VACUUM 不能在事务中执行）"""
+    print("🔄 正在整理数据库...")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.exec_driver_sql("VACUUM")
+    print("✅ 数据库整理完成")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="归档长时间没有新评分的录音，或从归档恢复录音")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="超过多少天没有新评分的录音被归档")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="每个事务归档的录音数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计会被归档的录音，不做修改")
+    parser.add_argument("--vacuum", action="store_true", help="归档后整理数据库，释放空间")
+    parser.add_argument("--restore", type=int, nargs="+", metavar="ID", help="从归档恢复指定的录音")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"冷存储归档：数据库 {ARCHIVE_DATABASE_PATH}，文件目录 {ARCHIVE_DIR}")
+    print("=" * 60)
+
+    # 已有数据库可能还没有存根表等新表（与应用启动时相同）
+    init_db()
+
+    db = SessionLocal()
+    try:
+        if args.restore:
+            restored = 0
+            for recording_id in args.restore:
+                if restore_recording(db, recording_id):
+                    restored += 1
+                    print(f"✅ 已恢复录音 {recording_id}")
+                else:
+                    print(f"❌ 录音 {recording_id} 不在归档中")
+            print(f"✅ 恢复完成：{restored}/{len(args.restore)}")
+            return
+
+        if args.dry_run:
+            older_than = datetime.now(timezone.utc) - timedelta(days=args.days)
+            recording_ids = find_archivable_recordings(db, older_than)
+            print(f"📋 超过 {args.days} 天没有新评分的录音：{len(recording_ids)} 个（未归档）")
+            return
+
+        archived = archive_old_recordings(db, days=args.days, batch_size=max(1, args.batch_size))
+        print(f"✅ 归档完成：{archived} 个录音")
+    finally:
+        db.close()
+
+    if args.vacuum:
+        vacuum()
+
+
+if __name__ == "__main__":
+    main()
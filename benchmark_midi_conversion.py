@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+基准测试脚本：对比 MusicXML → MIDI 快速路径与 music21 转换的耗时
+
+用法：
+    PYTHONPATH=. python benchmark_midi_conversion.py [乐谱文件或目录 ...]
+
+不指定参数时，使用 data/output 和 tmp/output 中识别出的茉莉花分谱。
+"""
+import sys
+import os
+import io
+import glob
+import time
+import tempfile
+import contextlib
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.musicxml_fast import musicxml_to_midi_fast, UnsupportedScoreError
+from utils.midi_tools import musicxml_to_midi2
+
+DEFAULT_PATTERNS = ["data/output/*茉莉花*.mxl", "tmp/output/*茉莉花*.mxl"]
+MUSICXML_EXTENSIONS = (".mxl", ".musicxml", ".xml")
+REPEAT = 3
+
+
+def collect_files(args):
+    """收集待测试的乐谱文件"""
+    files = []
+    if not args:
+        for pattern in DEFAULT_PATTERNS:
+            files.extend(glob.glob(pattern))
+    for arg in args:
+        if os.path.isdir(arg):
+            for name in sorted(os.listdir(arg)):
+                if name.lower().endswith(MUSICXML_EXTENSIONS):
+                    files.append(os.path.join(arg, name))
+        else:
+            files.append(arg)
+    return sorted(set(files))
+
+
+def best_time(func, *args):
+    """重复执行取最短耗时（秒）"""
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_music21(xml_path, midi_path):
+    """music21 转换（屏蔽其过程输出）"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        musicxml_to_midi2(xml_path, midi_path)
+
+
+def main():
+    files = collect_files(sys.argv[1:])
+    if not files:
+        print("❌ 没有找到乐谱文件")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("MusicXML → MIDI 转换基准测试")
+    print("=" * 60)
+
+    total_fast = 0.0
+    total_music21 = 0.0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fast_midi = os.path.join(tmp_dir, "fast.mid")
+        music21_midi = os.path.join(tmp_dir, "music21.mid")
+
+        for xml_path in files:
+            print(f"\n{os.path.basename(xml_path)}")
+            try:
+                note_count = musicxml_to_midi_fast(xml_path, fast_midi)
+            except UnsupportedScoreError as e:
+                print(f"  ⚠️ 快速路径不适用：{e}")
+                continue
+
+            fast_time = best_time(musicxml_to_midi_fast, xml_path, fast_midi)
+            music21_time = best_time(run_music21, xml_path, music21_midi)
+            total_fast += fast_time
+            total_music21 += music21_time
+
+            print(f"  音符数: {note_count}")
+            print(f"  快速路径: {fast_time * 1000:.1f} ms")
+            print(f"  music21:  {music21_time * 1000:.1f} ms")
+            print(f"  加速比:   {music21_time / fast_time:.1f}x")
+
+    print("\n" + "=" * 60)
+    if total_fast > 0:
+        print(f"合计：快速路径 {total_fast * 1000:.1f} ms，music21 {total_music21 * 1000:.1f} ms，"
+              f"加速比 {total_music21 / total_fast:.1f}x")
+    else:
+        print("没有适用快速路径的乐谱")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+基准测试脚本：对比乐谱图片预处理前后的 OMR 识别耗时
+
+用法：
+    PYTHONPATH=. python benchmark_omr_preprocess.py [图片文件或目录 ...]
+
+不指定参数时，使用 test-files 下的乐谱图片。
+Audiveris 不可用时只统计预处理本身的耗时和图片尺寸变化。
+"""
+import sys
+import os
+import io
+import glob
+import time
+import tempfile
+import contextlib
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.omr import run_audiveris, AUDIVERIS_BIN
+from utils.omr_preprocess import preprocess_image, IMAGE_EXTENSIONS
+
+DEFAULT_PATTERNS = ["test-files/*.png", "test-files/*.jpg", "test-files/*.jpeg"]
+
+
+def collect_files(args):
+    """收集待测试的图片文件"""
+    files = []
+    if not args:
+        for pattern in DEFAULT_PATTERNS:
+            files.extend(glob.glob(pattern))
+    for arg in args:
+        if os.path.isdir(arg):
+            for name in sorted(os.listdir(arg)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    files.append(os.path.join(arg, name))
+        else:
+            files.append(arg)
+    return sorted(set(files))
+
+
+def timed_omr(image_path, output_dir):
+    """运行一次命令行识别（屏蔽其过程输出），返回 (耗时秒数, 导出的 mxl 数量)"""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        mxl_paths = run_audiveris(image_path, output_dir)
+    return time.perf_counter() - start, len(mxl_paths or [])
+
+
+def main():
+    files = collect_files(sys.argv[1:])
+    if not files:
+        print("❌ 没有找到乐谱图片")
+        sys.exit(1)
+
+    run_omr = os.path.exists(AUDIVERIS_BIN)
+
+    print("=" * 60)
+    print("乐谱图片预处理 OMR 基准测试")
+    if not run_omr:
+        print(f"⚠️ 未找到 {AUDIVERIS_BIN}，只统计预处理本身")
+    print("=" * 60)
+
+    total_original = 0.0
+    total_preprocessed = 0.0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for image_path in files:
+            print(f"\n{os.path.basename(image_path)}")
+            stem = os.path.splitext(os.path.basename(image_path))[0]
+            preprocessed_path = os.path.join(tmp_dir, "preprocessed", f"{stem}.png")
+
+            start = time.perf_counter()
+            info = preprocess_image(image_path, preprocessed_path)
+            preprocess_time = time.perf_counter() - start
+
+            original_pixels = info["original_size"][0] * info["original_size"][1]
+            output_pixels = info["output_size"][0] * info["output_size"][1]
+            print(f"  尺寸:     {info['original_size']} → {info['output_size']}"
+                  f"（像素 {output_pixels / original_pixels:.0%}）")
+            print(f"  倾斜:     {info['skew_degrees']}°，线间距 {info['interline']}px，缩放 {info['scale']}")
+            print(f"  文件大小: {os.path.getsize(image_path) / 1024:.0f} KB → "
+                  f"{os.path.getsize(preprocessed_path) / 1024:.0f} KB")
+            print(f"  预处理:   {preprocess_time * 1000:.0f} ms")
+
+            if not run_omr:
+                continue
+
+            original_time, original_count = timed_omr(image_path, os.path.join(tmp_dir, "original", stem))
+            preprocessed_time, preprocessed_count = timed_omr(preprocessed_path,
+                                                              os.path.join(tmp_dir, "after", stem))
+            preprocessed_time += preprocess_time
+            total_original += original_time
+            total_preprocessed += preprocessed_time
+
+            print(f"  原图识别: {original_time:.1f} s（导出 {original_count} 个乐谱）")
+            print(f"  预处理后: {preprocessed_time:.1f} s（含预处理，导出 {preprocessed_count} 个乐谱）")
+            print(f"  节省:     {original_time - preprocessed_time:.1f} s")
+
+    print("\n" + "=" * 60)
+    if total_original > 0:
+        print(f"合计：原图 {total_original:.1f} s，预处理后 {total_preprocessed:.1f} s，"
+              f"节省 {(1 - total_preprocessed / total_original):.0%}")
+    else:
+        print("没有运行 OMR 识别，未统计识别耗时")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+基准测试脚本：OMR 识别吞吐量
+
+用法：
+    PYTHONPATH=. python benchmark_omr_throughput.py [乐谱文件或目录 ...] [--modes cold,daemon,cached] [--limit N]
+
+不指定文件时，使用 test-files/茉莉花分谱 中的 20 个分谱。
+
+测试模式：
+- cold:   每个文件启动一次 Audiveris 命令行（含 JVM 启动），不使用缓存和预处理
+- daemon: 常驻 Audiveris 进程（JVM 只启动一次），单独统计启动耗时
+- cached: 完整识别流程 run_omr（预处理、按页并行、缓存），先识别一遍，再测命中缓存的耗时
+
+每种模式报告每页耗时、吞吐量、识别进程峰值内存和识别成功率；
+cold 与 daemon 同时运行时给出 JVM 启动开销。
+"""
+import sys
+import os
+import io
+import time
+import argparse
+import tempfile
+import threading
+import contextlib
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import utils.omr as omr
+import utils.omr_cache as omr_cache
+import utils.omr_preprocess as omr_preprocess
+from utils.omr import run_audiveris, run_omr, AUDIVERIS_BIN
+from utils.omr_pages import get_pdf_page_count
+
+DEFAULT_DIR = "test-files/茉莉花分谱"
+SCORE_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg")
+MODES = ("cold", "daemon", "cached")
+
+
+def collect_files(args):
+    """收集待测试的乐谱文件"""
+    files = []
+    for arg in args or [DEFAULT_DIR]:
+        if os.path.isdir(arg):
+            for name in sorted(os.listdir(arg)):
+                if name.lower().endswith(SCORE_EXTENSIONS):
+                    files.append(os.path.join(arg, name))
+        else:
+            files.append(arg)
+    return sorted(set(files))
+
+
+def count_pages(path):
+    return max(1, get_pdf_page_count(path)) if path.lower().endswith(".pdf") else 1
+
+
+class MemorySampler:
+    """
+    后台采样当前进程所有子孙进程（Audiveris 启动脚本、JVM）的常驻内存之和，记录峰值。
+    依赖 /proc，非 Linux 系统上峰值为 None。
+    """
+
+    def __init__(self, interval=0.2):
+        self.interval = interval
+        self.peak_bytes = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _descendants_rss():
+        parents = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # 进程名可能包含空格，从最后一个 ')' 之后解析
+                    fields = f.read().rsplit(")", 1)[1].split()
+                parents[int(entry)] = int(fields[1])
+            except (OSError, IndexError, ValueError):
+                continue
+
+        root = os.getpid()
+        descendants = set()
+        changed = True
+        while changed:
+            changed = False
+            for pid, ppid in parents.items():
+                if pid not in descendants and (ppid == root or ppid in descendants):
+                    descendants.add(pid)
+                    changed = True
+
+        total = 0
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        for pid in descendants:
+            try:
+                with open(f"/proc/{pid}/statm") as f:
+                    total += int(f.read().split()[1]) * page_size
+            except (OSError, IndexError, ValueError):
+                continue
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = self._descendants_rss()
+            self.peak_bytes = max(self.peak_bytes or 0, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        if os.path.isdir("/proc"):
+            self._thread = threading.Thread(target=self._run, name="omr-memory-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+def quiet(func, *args, **kwargs):
+    """执行函数并屏蔽其过程输出"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def format_memory(peak_bytes):
+    return f"{peak_bytes / 1024 / 1024:.0f} MB" if peak_bytes else "n/a"
+
+
+def run_files(files, recognize, label):
+    """逐个识别文件并计时，返回结果统计"""
+    results = []
+    with MemorySampler() as sampler:
+        for path in files:
+            pages = count_pages(path)
+            start = time.perf_counter()
+            try:
+                mxl_paths = quiet(recognize, path)
+            except Exception as e:
+                print(f"  ⚠️ {os.path.basename(path)} 识别异常: {e}")
+                mxl_paths = None
+            elapsed = time.perf_counter() - start
+            ok = bool(mxl_paths)
+            results.append({"path": path, "pages": pages, "seconds": elapsed, "ok": ok})
+            print(f"  {'✅' if ok else '❌'} {os.path.basename(path)}: {pages} 页，"
+                  f"{elapsed:.2f} s（每页 {elapsed / pages:.2f} s）")
+    return summarize(label, results, sampler.peak_bytes)
+
+
+def summarize(label, results, peak_bytes):
+    pages = sum(item["pages"] for item in results)
+    seconds = sum(item["seconds"] for item in results)
+    succeeded = [item for item in results if item["ok"]]
+    # 每页耗时只按识别成功的文件计算，失败（如未安装 Audiveris）几乎不耗时，会让吞吐量虚高
+    ok_pages = sum(item["pages"] for item in succeeded)
+    ok_seconds = sum(item["seconds"] for item in succeeded)
+    summary = {
+        "label": label,
+        "files": len(results),
+        "pages": pages,
+        "seconds": seconds,
+        "per_page": ok_seconds / ok_pages if ok_pages else None,
+        "success_rate": len(succeeded) / len(results) if results else 0.0,
+        "peak_bytes": peak_bytes,
+    }
+    per_page = f"{summary['per_page']:.2f} s" if summary["per_page"] is not None else "n/a（没有成功识别的页）"
+    print(f"  小计：{summary['files']} 个文件 {pages} 页，共 {seconds:.1f} s，每页 {per_page}，"
+          f"成功率 {summary['success_rate']:.0%}，峰值内存 {format_memory(peak_bytes)}")
+    return summary
+
+
+def bench_cold(files, tmp_dir):
+    """每个文件一个新的 Audiveris 进程"""
+    output_dir = os.path.join(tmp_dir, "cold")
+    return run_files(files, lambda path: run_audiveris(path, output_dir), "冷启动命令行")
+
+
+def bench_daemon(files, tmp_dir):
+    """常驻进程：先单独计时启动，再逐个识别"""
+    from utils.omr_daemon import AudiverisDaemon, OmrDaemonError
+
+    output_dir = os.path.join(tmp_dir, "daemon")
+    daemon = AudiverisDaemon(max_jobs=len(files) + 1)
+    start = time.perf_counter()
+    try:
+        quiet(daemon.start)
+    except OmrDaemonError as e:
+        print(f"  ⚠️ 常驻识别进程无法启动，跳过：{e}")
+        return None
+    startup = time.perf_counter() - start
+    print(f"  常驻进程启动（JVM + 类加载）：{startup:.2f} s")
+
+    try:
+        summary = run_files(files, lambda path: daemon.recognize(path, output_dir), "常驻进程")
+    finally:
+        daemon.stop()
+    summary["startup"] = startup
+    return summary
+
+
+def bench_cached(files, tmp_dir):
+    """完整识别流程：使用临时缓存目录，先识别一遍，再测命中缓存的耗时"""
+    cache_dir = os.path.join(tmp_dir, "omr_cache")
+    omr.OMR_CACHE_DIR = cache_dir
+    omr_cache.OMR_CACHE_DIR = cache_dir
+    omr_preprocess.OMR_PREPROCESS_DIR = os.path.join(cache_dir, "preprocessed")
+
+    print("  首次识别（写入缓存）：")
+    first = run_files(files, run_omr, "完整流程（首次）")
+    print("  再次识别（命中缓存）：")
+    cached = run_files(files, run_omr, "完整流程（命中缓存）")
+    return first, cached
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OMR 识别吞吐量基准测试")
+    parser.add_argument("paths", nargs="*", help=f"乐谱文件或目录，默认 {DEFAULT_DIR}")
+    parser.add_argument("--modes", default=",".join(MODES), help="测试模式，逗号分隔：cold,daemon,cached")
+    parser.add_argument("--limit", type=int, default=0, help="最多测试的文件数（0 表示全部）")
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = [mode for mode in modes if mode not in MODES]
+    if unknown:
+        parser.error(f"未知的测试模式：{', '.join(unknown)}")
+
+    files = collect_files(args.paths)
+    if args.limit:
+        files = files[:args.limit]
+    if not files:
+        print("❌ 没有找到乐谱文件")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("OMR 识别吞吐量基准测试")
+    print(f"{len(files)} 个文件，共 {sum(count_pages(path) for path in files)} 页")
+    print("=" * 60)
+
+    if not os.path.exists(AUDIVERIS_BIN):
+        print(f"⚠️ 未找到 {AUDIVERIS_BIN}，识别会全部失败，结果只反映失败路径的开销")
+
+    summaries = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if "cold" in modes:
+            print("\n【冷启动命令行】")
+            summaries["cold"] = bench_cold(files, tmp_dir)
+        if "daemon" in modes:
+            print("\n【常驻进程】")
+            summaries["daemon"] = bench_daemon(files, tmp_dir)
+        if "cached" in modes:
+            print("\n【完整流程 + 缓存】")
+            summaries["first"], summaries["cached"] = bench_cached(files, tmp_dir)
+
+    print("\n" + "=" * 60)
+    print(f"{'模式':<16}{'每页耗时':>10}{'页/分钟':>10}{'成功率':>8}{'峰值内存':>12}")
+    for summary in summaries.values():
+        if not summary:
+            continue
+        if summary["per_page"] is None:
+            per_page, throughput = "n/a", "n/a"
+        else:
+            per_page = f"{summary['per_page']:.2f}s"
+            throughput = f"{60 / summary['per_page']:.1f}" if summary["per_page"] else "inf"
+        print(f"{summary['label']:<16}{per_page:>10}{throughput:>10}"
+              f"{summary['success_rate']:>8.0%}{format_memory(summary['peak_bytes']):>12}")
+
+    cold, daemon = summaries.get("cold"), summaries.get("daemon")
+    # 两种方式都全部识别成功时，总耗时之差才是 JVM 启动开销
+    if cold and daemon and cold["files"] and cold["success_rate"] == daemon["success_rate"] == 1:
+        per_file_saving = (cold["seconds"] - daemon["seconds"]) / cold["files"]
+        print(f"\nJVM 启动开销：常驻进程启动 {daemon['startup']:.2f} s；"
+              f"命令行方式每个文件多花 {per_file_saving:.2f} s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+批量导入曲目、乐谱和演奏录音
+
+用法：
+    PYTHONPATH=. python bulk_import.py <导入目录或清单.json> [--link] [--batch-size N] [--workers N] [--no-score]
+
+目录结构：
+    导入目录/
+        曲目名称/
+            song.json                    可选，曲目信息 {"composer", "genre", "difficulty", "description"}
+            sheets/乐器.pdf              乐谱，文件名为乐器（mxl、musicxml、xml、pdf、png、jpg、jpeg）
+            recordings/演奏者__乐器.mp3  演奏录音（mp3、wav、m4a、flac）；省略"__乐器"时，
+                                         曲目只有一个乐谱则使用该乐谱的乐器，否则为"合声"
+
+清单文件（JSON，文件路径相对于清单所在目录）：
+    {"songs": [{"name": "茉莉花", "composer": "民歌",
+                "solos": [{"instrument": "Flute", "file": "sheets/flute.pdf"}],
+                "recordings": [{"performer": "张三", "instrument": "Flute", "file": "rec/zhang.mp3"}]}]}
+
+导入流程：
+1. 已存在的曲目沿用，已有同乐器乐谱的跳过
+2. 并行复制文件到乐谱、录音存储目录（--link 时使用硬链接，跨文件系统时退回复制）
+3. 按批写入数据库，每批一个事务；某一批失败时删除还没写入数据库的条目已复制的文件
+4. 逐个为导入的录音评分（--no-score 跳过）；评分图表使用 matplotlib.pyplot 的全局状态，不能多线程并行。
+   乐谱的 MP3 可之后在乐谱管理中生成
+"""
+import sys
+import os
+import json
+import time
+import shutil
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database.models.base import SessionLocal
+from database.crud import (
+    get_song_ids_by_name, get_existing_solo_keys,
+    bulk_create_songs, bulk_create_solos, bulk_create_recordings
+)
+from config.settings import (
+    SHEET_MUSIC_DIR, RECORDING_DIR, IMPORT_BATCH_SIZE, IMPORT_COPY_WORKERS
+)
+
+SHEET_EXTENSIONS = (".mxl", ".musicxml", ".xml", ".pdf", ".png", ".jpg", ".jpeg")
+RECORDING_EXTENSIONS = (".mp3", ".wav", ".m4a", ".flac")
+SONG_FIELDS = ("composer", "genre", "difficulty", "description")
+DEFAULT_INSTRUMENT = "合声"
+PERFORMER_SEPARATOR = "__"
+
+
+def _list_files(directory, extensions):
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.lower().endswith(extensions)]
+
+
+def load_directory(root: str) -> dict:
+    """按目录结构生成导入计划"""
+    plan = {"songs": [], "solos": [], "recordings": []}
+    for song_name in sorted(os.listdir(root)):
+        song_dir = os.path.join(root, song_name)
+        if not os.path.isdir(song_dir):
+            continue
+
+        song = {"name": song_name}
+        info_path = os.path.join(song_dir, "song.json")
+        if os.path.exists(info_path):
+            with open(info_path, encoding="utf-8") as f:
+                info = json.load(f)
+            song.update({field: info[field] for field in SONG_FIELDS if info.get(field)})
+        plan["songs"].append(song)
+
+        sheets = _list_files(os.path.join(song_dir, "sheets"), SHEET_EXTENSIONS)
+        instruments = [os.path.splitext(os.path.basename(path))[0] for path in sheets]
+        for instrument, path in zip(instruments, sheets):
+            plan["solos"].append({"song_name": song_name, "instrument": instrument, "source": path})
+
+        default_instrument = instruments[0] if len(instruments) == 1 else DEFAULT_INSTRUMENT
+        for path in _list_files(os.path.join(song_dir, "recordings"), RECORDING_EXTENSIONS):
+            stem = os.path.splitext(os.path.basename(path))[0]
+            performer, _, instrument = stem.partition(PERFORMER_SEPARATOR)
+            plan["recordings"].append({"song_name": song_name, "performer_name": performer,
+                                       "instrument": instrument or default_instrument, "source": path})
+    return plan
+
+
+def load_manifest(manifest_path: str) -> dict:
+    """按 JSON 清单生成导入计划"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    plan = {"songs": [], "solos": [], "recordings": []}
+    for entry in manifest.get("songs", []):
+        song_name = entry["name"]
+        plan["songs"].append({"name": song_name, **{field: entry[field] for field in SONG_FIELDS if entry.get(field)}})
+
+        solos = entry.get("solos", [])
+        for solo in solos:
+            plan["solos"].append({"song_name": song_name, "instrument": solo["instrument"],
+                                  "source": os.path.join(base_dir, solo["file"])})
+
+        default_instrument = solos[0]["instrument"] if len(solos) == 1 else DEFAULT_INSTRUMENT
+        for recording in entry.get("recordings", []):
+            plan["recordings"].append({"song_name": song_name, "performer_name": recording["performer"],
+                                       "instrument": recording.get("instrument") or default_instrument,
+                                       "source": os.path.join(base_dir, recording["file"])})
+    return plan
+
+
+def load_plan(path: str) -> dict:
+    return load_directory(path) if os.path.isdir(path) else load_manifest(path)
+
+
+def assign_destinations(items: list, base_dir: str, prefix_field: str, timestamp: str):
+    """
+    为每个文件分配存储路径，命名与界面上传一致：曲目目录/前缀_时间戳_原文件名
+    同一次导入的文件使用相同时间戳，重名时追加序号
+    """
+    reserved = set()
+    for item in items:
+        song_dir = os.path.join(base_dir, item["song_name"].replace("/", "_").replace("\\", "_"))
+        name, ext = os.path.splitext(os.path.basename(item["source"]))
+        stem = f"{item[prefix_field]}_{timestamp}_{name}"
+        candidate = os.path.join(song_dir, f"{stem}{ext}")
+        counter = 2
+        while candidate in reserved or os.path.exists(candidate):
+            candidate = os.path.join(song_dir, f"{stem}_{counter}{ext}")
+            counter += 1
+        reserved.add(candidate)
+        item["file_path"] = candidate
+        item["original_filename"] = os.path.basename(item["source"])
+
+
+def _transfer(source: str, destination: str, link: bool) -> int:
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    if link:
+        try:
+            os.link(source, destination)
+            return os.path.getsize(destination)
+        except OSError:
+            pass  # 跨文件系统等情况，退回复制
+    shutil.copy2(source, destination)
+    return os.path.getsize(destination)
+
+
+def transfer_files(items: list, link: bool = False, workers: int = IMPORT_COPY_WORKERS):
+    """并行复制（或硬链接）文件，返回 (成功的条目, 失败的 (条目, 错误))"""
+    done, failed = [], []
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="import-copy") as executor:
+        futures = {executor.submit(_transfer, item["source"], item["file_path"], link): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                item["file_size"] = future.result()
+                done.append(item)
+            except OSError as e:
+                failed.append((item, str(e)))
+    # 保持导入计划中的顺序
+    order = {id(item): index for index, item in enumerate(items)}
+    done.sort(key=lambda item: order[id(item)])
+    return done, failed
+
+
+def _remove_files(items: list):
+    for item in items:
+        try:
+            os.remove(item["file_path"])
+        except OSError:
+            pass
+
+
+def insert_batches(session_factory, create_func, rows: list, fields: tuple, batch_size: int) -> list:
+    """按批写入，返回 create_func 返回的新记录ID列表；某一批失败时删除该批及之后各批已复制的文件后抛出"""
+    results = []
+    db = session_factory()
+    try:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            try:
+                results.extend(create_func(db, [{field: row.get(field) for field in fields} for row in batch]))
+            except Exception:
+                db.rollback()
+                _remove_files([row for row in rows[start:] if "file_path" in row])
+                raise
+    finally:
+        db.close()
+    return results
+
+
+def _score_recording(session_factory, recording: dict) -> bool:
+    from utils.recording_manager import perform_scoring
+
+    db = session_factory()
+    try:
+        return bool(perform_scoring(db, recording["song_id"], recording["instrument"],
+                                    recording["file_path"], recording["id"]))
+    finally:
+        db.close()
+
+
+def score_recordings(session_factory, recordings: list):
+    """
+    逐个为录音评分，返回 (成功数, 失败数)
+    评分时绘制图表（compare_audio2、plot_segment_scores_bar）使用 pyplot 的全局状态，不是线程安全的，因此不并行
+    """
+    succeeded = failed = 0
+    for index, recording in enumerate(recordings, 1):
+        try:
+            ok = _score_recording(session_factory, recording)
+        except Exception as e:
+            print(f"❌ 评分任务异常: {e}")
+            ok = False
+        succeeded += ok
+        failed += not ok
+        print(f"📊 评分进度 {index}/{len(recordings)}（成功 {succeeded}，失败 {failed}）")
+    return succeeded, failed
+
+
+def _rate(count: int, seconds: float) -> str:
+    return f"{count / seconds:.0f}" if seconds > 0 else "-"
+
+
+def run_import(plan: dict, session_factory=SessionLocal, sheet_dir: str = SHEET_MUSIC_DIR,
+               recording_dir: str = RECORDING_DIR, link: bool = False, batch_size: int = IMPORT_BATCH_SIZE,
+               workers: int = IMPORT_COPY_WORKERS, score: bool = True) -> dict:
+    """执行导入计划，返回统计信息"""
+    started = time.perf_counter()
+    summary = {"songs": 0, "songs_existing": 0, "solos": 0, "solos_skipped": 0,
+               "recordings": 0, "files_failed": 0, "scored": 0, "score_failed": 0}
+
+    # 1. 过滤已存在的曲目和乐谱（同一曲目同一乐器只保留一个乐谱）
+    song_names = [song["name"] for song in plan["songs"]]
+    db = session_factory()
+    try:
+        song_ids = get_song_ids_by_name(db, song_names)
+        song_names_by_id = {song_id: name for name, song_id in song_ids.items()}
+        solo_keys = {(song_names_by_id[song_id], instrument)
+                     for song_id, instrument in get_existing_solo_keys(db, list(song_ids.values()))}
+    finally:
+        db.close()
+
+    new_songs, seen = [], set(song_ids)
+    for song in plan["songs"]:
+        if song["name"] not in seen:
+            seen.add(song["name"])
+            new_songs.append(song)
+    summary["songs_existing"] = len(song_ids)
+
+    solos = []
+    for solo in plan["solos"]:
+        key = (solo["song_name"], solo["instrument"])
+        if key in solo_keys:
+            print(f"⏭️ 跳过已有乐谱: {key[0]} - {key[1]}")
+            summary["solos_skipped"] += 1
+            continue
+        solo_keys.add(key)
+        solos.append(solo)
+    recordings = list(plan["recordings"])
+
+    # 2. 并行复制文件
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    assign_destinations(solos, sheet_dir, "instrument", timestamp)
+    assign_destinations(recordings, recording_dir, "performer_name", timestamp)
+
+    copy_started = time.perf_counter()
+    solos, solo_failures = transfer_files(solos, link, workers)
+    recordings, recording_failures = transfer_files(recordings, link, workers)
+    copy_seconds = time.perf_counter() - copy_started
+    for item, error in solo_failures + recording_failures:
+        print(f"❌ 文件导入失败: {item['source']}，错误: {error}")
+    summary["files_failed"] = len(solo_failures) + len(recording_failures)
+    total_bytes = sum(item["file_size"] for item in solos + recordings)
+    print(f"📁 {'链接' if link else '复制'} {len(solos) + len(recordings)} 个文件"
+          f"（{total_bytes / 1024 / 1024:.1f} MB），耗时 {copy_seconds:.2f} s，"
+          f"{_rate(len(solos) + len(recordings), copy_seconds)} 个/秒")
+
+    # 3. 按批写入数据库（曲目 → 乐谱 → 录音）
+    # 某一阶段失败时 insert_batches 删除该阶段未写入条目的文件，之后各阶段的文件在这里删除
+    insert_started = time.perf_counter()
+    try:
+        new_song_ids = insert_batches(session_factory, bulk_create_songs, new_songs, ("name",) + SONG_FIELDS,
+                                      batch_size)
+    except Exception:
+        _remove_files(solos + recordings)
+        raise
+    song_ids.update(zip((song["name"] for song in new_songs), new_song_ids))
+    summary["songs"] = len(new_song_ids)
+    # 乐谱、录音按曲目ID关联
+    for item in solos + recordings:
+        item["song_id"] = song_ids[item["song_name"]]
+    try:
+        summary["solos"] = len(insert_batches(session_factory, bulk_create_solos, solos,
+                                              ("song_id", "instrument", "file_path", "original_filename",
+                                               "file_size"), batch_size))
+    except Exception:
+        _remove_files(recordings)
+        raise
+    for recording in recordings:
+        recording["audio_path"] = recording["file_path"]
+    recording_ids = insert_batches(session_factory, bulk_create_recordings, recordings,
+                                   ("song_id", "performer_name", "instrument", "audio_path",
+                                    "original_filename", "file_size"), batch_size)
+    for recording, recording_id in zip(recordings, recording_ids):
+        recording["id"] = recording_id
+    summary["recordings"] = len(recording_ids)
+    insert_seconds = time.perf_counter() - insert_started
+    rows = summary["songs"] + summary["solos"] + summary["recordings"]
+    print(f"💾 写入 {rows} 行（曲目 {summary['songs']}，乐谱 {summary['solos']}，录音 {summary['recordings']}），"
+          f"耗时 {insert_seconds:.2f} s，{_rate(rows, insert_seconds)} 行/秒")
+
+    # 4. 评分
+    if score and recordings:
+        score_started = time.perf_counter()
+        summary["scored"], summary["score_failed"] = score_recordings(session_factory, recordings)
+        score_seconds = time.perf_counter() - score_started
+        print(f"🎯 评分 {len(recordings)} 个录音，耗时 {score_seconds:.1f} s，"
+              f"每个 {score_seconds / len(recordings):.2f} s")
+
+    summary["seconds"] = time.perf_counter() - started
+    summary["rows_per_second"] = rows / insert_seconds if insert_seconds > 0 else 0.0
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量导入曲目、乐谱和演奏录音")
+    parser.add_argument("source", help="导入目录或 JSON 清单文件")
+    parser.add_argument("--link", action="store_true", help="使用硬链接代替复制（跨文件系统时自动复制）")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="每个事务写入的行数")
+    parser.add_argument("--workers", type=int, default=IMPORT_COPY_WORKERS, help="复制文件的线程数")
+    parser.add_argument("--no-score", action="store_true", help="只导入，不为录音评分")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        print(f"❌ 导入源不存在: {args.source}")
+        sys.exit(1)
+
+    plan = load_plan(args.source)
+    print("=" * 60)
+    print(f"批量导入：{len(plan['songs'])} 首曲目，{len(plan['solos'])} 个乐谱，{len(plan['recordings'])} 个录音")
+    print("=" * 60)
+
+    summary = run_import(plan, link=args.link, batch_size=max(1, args.batch_size), workers=args.workers,
+                         score=not args.no_score)
+
+    print("=" * 60)
+    print(f"✅ 导入完成，总耗时 {summary['seconds']:.1f} s")
+    print(f"   曲目：新建 {summary['songs']}，已存在 {summary['songs_existing']}")
+    print(f"   乐谱：新建 {summary['solos']}，跳过 {summary['solos_skipped']}")
+    print(f"   录音：新建 {summary['recordings']}，文件失败 {summary['files_failed']}")
+    if not args.no_score:
+        print(f"   评分：成功 {summary['scored']}，失败 {summary['score_failed']}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+全局运行配置文件
+所有配置项都可以通过环境变量覆盖
+"""
+import os
+
+
+def _env_bool(name, default):
+    """读取布尔型环境变量"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name, default):
+    """读取整型环境变量"""
+    value = os.environ.get(name)
+    if value is None or not value.strip():
+        return default
+    return int(value)
+
+
+# 音色库路径
+SOUNDFONT_PATH = os.environ.get("MUSIC_EVALUATOR_SOUNDFONT", "data/FluidR3_GM.sf2")
+
+# 乐谱、演奏录音的永久存储目录
+SHEET_MUSIC_DIR = os.environ.get("MUSIC_EVALUATOR_SHEET_MUSIC_DIR", "data/sheet_music")
+RECORDING_DIR = os.environ.get("MUSIC_EVALUATOR_RECORDING_DIR", "data/recordings")
+
+# 参考音频缓存目录
+REFERENCE_CACHE_DIR = os.environ.get("MUSIC_EVALUATOR_REFERENCE_CACHE_DIR", "data/reference_cache")
+
+# 上传乐谱后是否在后台为所有乐器预生成参考音频（上传表单中的默认值）
+PRERENDER_REFERENCES = _env_bool("MUSIC_EVALUATOR_PRERENDER_REFERENCES", True)
+
+# 后台预生成使用的线程数
+PRERENDER_WORKERS = _env_int("MUSIC_EVALUATOR_PRERENDER_WORKERS", 1)
+
+# 合成音频（参考音频、乐谱MP3）的压缩格式：mp3 / ogg（Vorbis）/ opus
+AUDIO_FORMAT = os.environ.get("MUSIC_EVALUATOR_AUDIO_FORMAT", "mp3").lower()
+
+# 合成音频的目标码率（kbps）；MP3 为恒定码率，Vorbis/Opus 为近似值
+AUDIO_BITRATE_KBPS = _env_int("MUSIC_EVALUATOR_AUDIO_BITRATE_KBPS", 128)
+
+# 评分时演奏速度与乐谱速度相差超过该比例，就按演奏速度重新合成参考音频再对齐
+TEMPO_MATCH_THRESHOLD = float(os.environ.get("MUSIC_EVALUATOR_TEMPO_MATCH_THRESHOLD", "0.05"))
+
+# DTW 对齐的搜索半径（fastdtw radius）。1 是 fastdtw 的默认值，也是可用的最小值（radius=0 时 fastdtw 出错），
+# 对齐开销与匹配速度前相同；演奏速度偏离较大、对齐不准时可以调大，开销约随半径线性增加
+DTW_RADIUS = max(1, _env_int("MUSIC_EVALUATOR_DTW_RADIUS", 1))
+
+# Audiveris 安装目录（包含 bin/ 和 lib/）
+AUDIVERIS_HOME = os.environ.get("MUSIC_EVALUATOR_AUDIVERIS_HOME", "Audiveris/app")
+
+# 是否使用常驻 Audiveris 进程进行识别（不可用时自动退回命令行方式）
+OMR_USE_DAEMON = _env_bool("MUSIC_EVALUATOR_OMR_USE_DAEMON", True)
+
+# 常驻识别进程处理多少个任务后重启，避免内存持续增长
+OMR_DAEMON_MAX_JOBS = _env_int("MUSIC_EVALUATOR_OMR_DAEMON_MAX_JOBS", 20)
+
+# 常驻识别进程的编译输出目录
+OMR_DAEMON_BUILD_DIR = os.environ.get("MUSIC_EVALUATOR_OMR_DAEMON_BUILD_DIR", "tmp/omr_daemon")
+
+# OMR 识别结果缓存目录（按乐谱内容 + Audiveris 版本缓存 .mxl）
+OMR_CACHE_DIR = os.environ.get("MUSIC_EVALUATOR_OMR_CACHE_DIR", "data/omr_cache")
+
+# 允许 OMR 使用的总内存（MB）和每个 Audiveris JVM 的最大堆内存（MB），
+# 两者决定同时运行的识别进程上限，超出的任务排队等待
+OMR_MEMORY_BUDGET_MB = _env_int("MUSIC_EVALUATOR_OMR_MEMORY_BUDGET_MB", 4096)
+OMR_JVM_MEMORY_MB = _env_int("MUSIC_EVALUATOR_OMR_JVM_MEMORY_MB", 2048)
+
+# 同时运行的识别任务上限（默认由内存预算计算）
+OMR_MAX_CONCURRENT_JOBS = _env_int("MUSIC_EVALUATOR_OMR_MAX_CONCURRENT_JOBS",
+                                   max(1, OMR_MEMORY_BUDGET_MB // max(1, OMR_JVM_MEMORY_MB)))
+
+# 每页乐谱的识别超时时间（秒），整本识别时按页数累计，超时后强制结束识别进程
+OMR_PAGE_TIMEOUT = _env_int("MUSIC_EVALUATOR_OMR_PAGE_TIMEOUT", 300)
+
+# 识别任务排队的最长等待时间（秒），超过后放弃本次识别
+OMR_QUEUE_TIMEOUT = _env_int("MUSIC_EVALUATOR_OMR_QUEUE_TIMEOUT", 900)
+
+# 常驻识别进程池大小（同时运行的 Audiveris JVM 数量）
+OMR_DAEMON_POOL_SIZE = _env_int("MUSIC_EVALUATOR_OMR_DAEMON_POOL_SIZE", OMR_MAX_CONCURRENT_JOBS)
+
+# 多页PDF是否拆分成单页并行识别
+OMR_PAGE_PARALLEL = _env_bool("MUSIC_EVALUATOR_OMR_PAGE_PARALLEL", True)
+
+# 按页并行识别时的并发数
+OMR_PAGE_WORKERS = _env_int("MUSIC_EVALUATOR_OMR_PAGE_WORKERS", OMR_MAX_CONCURRENT_JOBS)
+
+# 识别前是否对乐谱图片做预处理（灰度、二值化、纠偏、裁边、缩放）
+OMR_PREPROCESS = _env_bool("MUSIC_EVALUATOR_OMR_PREPROCESS", True)
+
+# 预处理后五线谱线间距的上限像素数，更大的图片会缩小到该值（Audiveris 在 20 像素左右识别最快且准确）
+OMR_TARGET_INTERLINE = _env_int("MUSIC_EVALUATOR_OMR_TARGET_INTERLINE", 20)
+
+# 预处理结果缓存目录
+OMR_PREPROCESS_DIR = os.environ.get("MUSIC_EVALUATOR_OMR_PREPROCESS_DIR", "data/omr_cache/preprocessed")
+
+# 数据库连接地址
+DATABASE_URL = os.environ.get("MUSIC_EVALUATOR_DATABASE_URL", "sqlite:///data/music_evaluator.db")
+
+# SQLite 日志模式：WAL 下读写互不阻塞（评分写入时界面仍可读取）
+SQLITE_JOURNAL_MODE = os.environ.get("MUSIC_EVALUATOR_SQLITE_JOURNAL_MODE", "WAL").upper()
+
+# SQLite 同步级别：WAL 模式下 NORMAL 已能保证数据库不损坏，断电时最多丢失最近的事务
+SQLITE_SYNCHRONOUS = os.environ.get("MUSIC_EVALUATOR_SQLITE_SYNCHRONOUS", "NORMAL").upper()
+
+# 数据库被锁定时的最长等待时间（毫秒），超时才报 "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = _env_int("MUSIC_EVALUATOR_SQLITE_BUSY_TIMEOUT_MS", 10000)
+
+# 每个连接的页缓存大小（KB）
+SQLITE_CACHE_SIZE_KB = _env_int("MUSIC_EVALUATOR_SQLITE_CACHE_SIZE_KB", 32768)
+
+# 内存映射读取的大小上限（MB），0 表示关闭
+SQLITE_MMAP_SIZE_MB = _env_int("MUSIC_EVALUATOR_SQLITE_MMAP_SIZE_MB", 256)
+
+# 连接池：常驻连接数、高峰时额外允许的连接数、取连接的最长等待时间（秒）
+DB_POOL_SIZE = _env_int("MUSIC_EVALUATOR_DB_POOL_SIZE", 5)
+DB_MAX_OVERFLOW = _env_int("MUSIC_EVALUATOR_DB_MAX_OVERFLOW", 10)
+DB_POOL_TIMEOUT = _env_int("MUSIC_EVALUATOR_DB_POOL_TIMEOUT", 30)
+
+# 连接最长复用时间（秒），-1 表示不限
+DB_POOL_RECYCLE = _env_int("MUSIC_EVALUATOR_DB_POOL_RECYCLE", 3600)
+
+# 列表分页：曲目列表、评分（录音）列表每页显示的条数
+SONG_PAGE_SIZE = _env_int("MUSIC_EVALUATOR_SONG_PAGE_SIZE", 20)
+RECORDING_PAGE_SIZE = _env_int("MUSIC_EVALUATOR_RECORDING_PAGE_SIZE", 10)
+# 排行榜显示前多少名
+LEADERBOARD_SIZE = _env_int("MUSIC_EVALUATOR_LEADERBOARD_SIZE", 10)
+
+# 批量导入：每个事务写入的行数、复制文件的线程数（导入后的评分逐个执行，见 bulk_import.py）
+IMPORT_BATCH_SIZE = _env_int("MUSIC_EVALUATOR_IMPORT_BATCH_SIZE", 500)
+IMPORT_COPY_WORKERS = _env_int("MUSIC_EVALUATOR_IMPORT_COPY_WORKERS", 8)
+
+# 冷存储归档：归档数据库、压缩文件的存放目录、录音超过多少天没有新评分时归档、每个事务归档的录音数
+ARCHIVE_DATABASE_PATH = os.environ.get("MUSIC_EVALUATOR_ARCHIVE_DATABASE_PATH", "data/archive.db")
+ARCHIVE_DIR = os.environ.get("MUSIC_EVALUATOR_ARCHIVE_DIR", "data/archive")
+ARCHIVE_AFTER_DAYS = _env_int("MUSIC_EVALUATOR_ARCHIVE_AFTER_DAYS", 365)
+ARCHIVE_BATCH_SIZE = _env_int("MUSIC_EVALUATOR_ARCHIVE_BATCH_SIZE", 100)
@@ -0,0 +1,170 @@
+"""
+评分统计分析
+
+统计全部在 SQL 中完成（计数、平均、最高/最低、百分位数、分数分布），
+只返回汇总后的轻量结果（ScoreSummary、ScoreHistogramBin），不加载评分记录的 ORM 对象。
+
+分组维度（group_by）：
+- None:        不分组，全部评分汇总为一组
+- "user":      按评分用户（匿名评分的分组值为 None）
+- "song":      按曲目（分组值为曲目ID）
+- "instrument": 按演奏乐器
+- "day" / "week" / "month": 按评分时间（UTC）分段，分组值如 "2025-03-01"、"2025-W09"、"2025-03"
+"""
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Sequence
+from sqlalchemy import String, case, func, literal, select
+from sqlalchemy.orm import Session
+from database.models.models import PerformanceRecording, PerformanceScore
+
+# 评分满分
+MAX_SCORE = 100
+
+# 默认统计的百分位数
+DEFAULT_PERCENTILES = (50, 90)
+
+# 时间分段 → strftime 格式
+TIME_BUCKETS = {
+    "day": "%Y-%m-%d",
+    "week": "%Y-W%W",
+    "month": "%Y-%m",
+}
+
+GROUP_BY_OPTIONS = (None, "user", "song", "instrument") + tuple(TIME_BUCKETS)
+
+
+class ScoreSummary(NamedTuple):
+    """一组评分的汇总"""
+    group: object
+    count: int
+    average: Optional[float]
+    minimum: Optional[int]
+    maximum: Optional[int]
+    percentiles: dict  # 百分位 → 分数（最近秩法，取实际出现过的分数）
+
+
+class ScoreHistogramBin(NamedTuple):
+    """分数分布中的一个区间 [lower, upper)，最高一档包含满分"""
+    group: object
+    lower: int
+    upper: int
+    count: int
+
+
+def _group_column(group_by: Optional[str]):
+    """分组表达式，以及是否需要关联录音表"""
+    if group_by is None:
+        return literal(None), False
+    if group_by == "user":
+        return PerformanceScore.user_id, False
+    if group_by == "song":
+        return PerformanceRecording.song_id, True
+    if group_by == "instrument":
+        return PerformanceRecording.instrument, True
+    if group_by in TIME_BUCKETS:
+        return func.strftime(TIME_BUCKETS[group_by], PerformanceScore.created_at), False
+    raise ValueError(f"不支持的分组方式: {group_by}，可选 {GROUP_BY_OPTIONS}")
+
+
+def _stored_time(value: datetime):
+    """
+    时间过滤条件的绑定值，格式与库中 created_at 一致（'YYYY-MM-DD HH:MM:SS'），
+    按字符串比较时才不会因为微秒部分漏掉边界上的记录
+    """
+    return literal(value.strftime("%Y-%m-%d %H:%M:%S"), String)
+
+
+def _filtered_select(columns, group_by: Optional[str], user_id: int = None, song_id: int = None,
+                     instrument: str = None, since: datetime = None, until: datetime = None):
+    """
+    带过滤条件的评分查询：只统计有总分的评分，时间范围为 [since, until)
+    需要按曲目、乐器分组或过滤时才关联录音表
+    """
+    _, needs_recording = _group_column(group_by)
+    query = select(*columns).where(PerformanceScore.overall_score.isnot(None))
+    if needs_recording or song_id is not None or instrument is not None:
+        query = query.join(PerformanceRecording, PerformanceRecording.id == PerformanceScore.recording_id)
+    if user_id is not None:
+        query = query.where(PerformanceScore.user_id == user_id)
+    if song_id is not None:
+        query = query.where(PerformanceRecording.song_id == song_id)
+    if instrument is not None:
+        query = query.where(PerformanceRecording.instrument == instrument)
+    if since is not None:
+        query = query.where(PerformanceScore.created_at >= _stored_time(since))
+    if until is not None:
+        query = query.where(PerformanceScore.created_at < _stored_time(until))
+    return query
+
+
+def score_summary(db: Session, group_by: str = None, percentiles: Sequence[int] = DEFAULT_PERCENTILES,
+                  **filters) -> List[ScoreSummary]:
+    """
+    按分组统计评分：数量、平均分、最低分、最高分和百分位数，按分组值排序
+    filters 可以是 user_id、song_id、instrument、since、until
+
+    百分位数用窗口函数在组内按分数排名，取排名为 ceil(总数 × p / 100) 的分数，
+    与其余统计在同一条查询中完成。
+    """
+    for p in percentiles:
+        if not 0 < p <= 100:
+            raise ValueError(f"百分位数必须在 (0, 100] 之间: {p}")
+
+    group, _ = _group_column(group_by)
+    score = PerformanceScore.overall_score
+    ranked = _filtered_select([
+        group.label("group_key"),
+        score.label("score"),
+        func.row_number().over(partition_by=group, order_by=score).label("rank"),
+        func.count().over(partition_by=group).label("total"),
+    ], group_by, **filters).subquery()
+
+    # 最近秩：ceil(total * p / 100)，用整数运算避免依赖 SQLite 的数学函数
+    percentile_columns = [
+        func.max(case((ranked.c.rank == (ranked.c.total * p + 99) // 100, ranked.c.score))).label(f"p{p}")
+        for p in percentiles
+    ]
+    query = select(
+        ranked.c.group_key,
+        func.count(),
+        func.avg(ranked.c.score),
+        func.min(ranked.c.score),
+        func.max(ranked.c.score),
+        *percentile_columns
+    ).group_by(ranked.c.group_key).order_by(ranked.c.group_key)
+
+    return [
+        ScoreSummary(
+            group=row[0],
+            count=row[1],
+            average=round(row[2], 1) if row[2] is not None else None,
+            minimum=row[3],
+            maximum=row[4],
+            percentiles=dict(zip(percentiles, row[5:])),
+        )
+        for row in db.execute(query)
+    ]
+
+
+def score_histogram(db: Session, group_by: str = None, bucket_width: int = 10,
+                    **filters) -> List[ScoreHistogramBin]:
+    """
+    按分组统计总分分布，每 bucket_width 分一档，只返回有评分的区间，按分组值、区间排序
+    filters 同 score_summary
+    """
+    if not 0 < bucket_width <= MAX_SCORE:
+        raise ValueError(f"区间宽度必须在 (0, {MAX_SCORE}] 之间: {bucket_width}")
+
+    group, _ = _group_column(group_by)
+    score = PerformanceScore.overall_score
+    # 满分并入最高一档
+    top_lower = (MAX_SCORE - 1) // bucket_width * bucket_width
+    lower = case((score >= MAX_SCORE, top_lower), else_=score // bucket_width * bucket_width).label("lower")
+
+    query = _filtered_select([group.label("group_key"), lower, func.count()], group_by, **filters)
+    query = query.group_by(group, lower).order_by(group, lower)
+
+    return [
+        ScoreHistogramBin(group=row[0], lower=row[1], upper=row[1] + bucket_width, count=row[2])
+        for row in db.execute(query)
+    ]
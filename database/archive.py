@@ -0,0 +1,219 @@
+"""
+冷存储归档
+
+长时间没有新评分的录音，连同它的评分和分段数据移到归档数据库（ARCHIVE_DATABASE_PATH）；
+录音、参考音频和评分图表文件用 gzip 压缩后移到归档目录（ARCHIVE_DIR）。
+在线库只保留 ArchivedRecording 存根，列表查询和数据库备份只涉及在线数据。
+恢复时按录音ID把数据和文件取回原位置，ID和文件路径都保持不变。
+
+归档时先压缩文件、写入归档库并提交，再在在线库中替换为存根并提交，最后删除原文件，
+中途失败不会丢失数据：替换存根失败时撤销归档库中的数据，恢复后归档库中没删掉的数据在下次归档时覆盖。
+录音、评分表使用 AUTOINCREMENT，已归档的ID不会再分配给新记录；归档库中已有同一ID、
+且在线库中有该ID的存根时拒绝归档，不覆盖已归档的数据。
+"""
+import os
+import gzip
+import shutil
+import hashlib
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import List
+from sqlalchemy import String, create_engine, delete, exists, literal, select
+from sqlalchemy.orm import Session
+from database.models.base import Base
+from database.models.models import ArchivedRecording, PerformanceRecording, PerformanceScore, ScoreSegments
+from database.crud import get_archived_recording, replace_recordings_with_stubs, restore_recording_rows
+from config.settings import ARCHIVE_DATABASE_PATH, ARCHIVE_DIR, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+
+recordings_table = PerformanceRecording.__table__
+scores_table = PerformanceScore.__table__
+segments_table = ScoreSegments.__table__
+
+# 归档数据库中的表（结构与在线库相同）
+ARCHIVE_TABLES = [recordings_table, scores_table, segments_table]
+
+_archive_engines = {}
+
+
+def get_archive_engine(path: str = ARCHIVE_DATABASE_PATH):
+    """归档数据库的引擎（同一路径只创建一次），首次使用时建表"""
+    engine = _archive_engines.get(path)
+    if engine is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        engine = create_engine(f"sqlite:///{path}")
+        Base.metadata.create_all(bind=engine, tables=ARCHIVE_TABLES)
+        _archive_engines[path] = engine
+    return engine
+
+
+def archive_file_path(path: str, recording_id: int, archive_dir: str = ARCHIVE_DIR) -> str:
+    """文件在归档目录中的位置：按录音ID分目录，文件名前加原路径的哈希，避免不同目录的同名文件冲突"""
+    digest = hashlib.sha1(path.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(archive_dir, str(recording_id), f"{digest}_{os.path.basename(path)}.gz")
+
+
+def _compress(source: str, destination: str):
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    with open(source, "rb") as src, gzip.open(destination, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+
+def _decompress(source: str, destination: str):
+    os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+    with gzip.open(source, "rb") as src, open(destination, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+
+def _recording_files(recording, scores) -> List[str]:
+    """录音相关的文件（录音、参考音频、评分图表），去重"""
+    paths = [recording["audio_path"]]
+    for score in scores:
+        paths.extend((score["reference_audio_path"], score["chart_path"]))
+    return list(dict.fromkeys(path for path in paths if path))
+
+
+def _delete_archived_rows(connection, recording_ids):
+    """删除归档库中指定录音的数据（录音、评分、分段）"""
+    if not recording_ids:
+        return
+    score_ids = select(scores_table.c.id).where(scores_table.c.recording_id.in_(recording_ids))
+    connection.execute(delete(segments_table).where(segments_table.c.score_id.in_(score_ids)))
+    connection.execute(delete(scores_table).where(scores_table.c.recording_id.in_(recording_ids)))
+    connection.execute(delete(recordings_table).where(recordings_table.c.id.in_(recording_ids)))
+
+
+def find_archivable_recordings(db: Session, older_than: datetime, limit: int = None) -> List[int]:
+    """上传时间早于 older_than、且此后没有新评分的录音ID（最早的在前）"""
+    # 与库中 created_at 的格式（'YYYY-MM-DD HH:MM:SS'，UTC）一致，按字符串比较
+    cutoff = literal(older_than.strftime("%Y-%m-%d %H:%M:%S"), String)
+    recent_score = exists().where(
+        PerformanceScore.recording_id == PerformanceRecording.id,
+        PerformanceScore.created_at >= cutoff
+    )
+    query = db.query(PerformanceRecording.id).filter(
+        PerformanceRecording.created_at < cutoff, ~recent_score
+    ).order_by(PerformanceRecording.created_at, PerformanceRecording.id).limit(limit)
+    return [recording_id for recording_id, in query]
+
+
+def archive_recordings(db: Session, recording_ids: List[int], archive_engine=None,
+                       archive_dir: str = ARCHIVE_DIR) -> int:
+    """归档一批录音（数据、文件），返回归档的录音数"""
+    archive_engine = archive_engine or get_archive_engine()
+    recordings = db.execute(select(recordings_table).where(recordings_table.c.id.in_(recording_ids))).mappings().all()
+    if not recordings:
+        return 0
+    ids = [recording["id"] for recording in recordings]
+    with archive_engine.connect() as connection:
+        conflicts = set(connection.execute(
+            select(recordings_table.c.id).where(recordings_table.c.id.in_(ids))
+        ).scalars().all())
+    # 在线库中仍有录音、没有存根的是之前中途失败（归档或恢复）留下的数据，覆盖；
+    # 有存根的是已归档的另一个录音（旧版数据库中ID被重用），拒绝归档
+    stubbed = db.query(ArchivedRecording.id).filter(ArchivedRecording.id.in_(conflicts)).all() if conflicts else []
+    if stubbed:
+        raise ValueError(f"归档库中已有录音 {sorted(stub_id for stub_id, in stubbed)}，为避免覆盖已归档的数据，停止归档")
+    scores = db.execute(select(scores_table).where(scores_table.c.recording_id.in_(ids))).mappings().all()
+    segments = db.execute(select(segments_table).where(
+        segments_table.c.score_id.in_([score["id"] for score in scores])
+    )).mappings().all()
+
+    # 1. 压缩文件到归档目录
+    scores_by_recording = defaultdict(list)
+    for score in scores:
+        scores_by_recording[score["recording_id"]].append(score)
+    archived_files = []
+    for recording in recordings:
+        for path in _recording_files(recording, scores_by_recording[recording["id"]]):
+            if os.path.exists(path):
+                _compress(path, archive_file_path(path, recording["id"], archive_dir))
+                archived_files.append(path)
+
+    # 2. 写入归档库（先清除上次中途失败留下的数据）
+    with archive_engine.begin() as connection:
+        _delete_archived_rows(connection, conflicts)
+        for table, rows in ((recordings_table, recordings), (scores_table, scores), (segments_table, segments)):
+            if rows:
+                connection.execute(table.insert(), [dict(row) for row in rows])
+
+    # 3. 在线库中替换为存根；失败时撤销归档库中的数据和压缩文件，下次归档重新开始
+    try:
+        archived = replace_recordings_with_stubs(db, ids)
+    except Exception:
+        db.rollback()
+        try:
+            with archive_engine.begin() as connection:
+                _delete_archived_rows(connection, ids)
+        except Exception as e:
+            # 没删掉的数据在下次归档这些录音时覆盖
+            print(f"⚠️ 撤销归档库中的数据失败: {e}")
+        for recording_id in ids:
+            shutil.rmtree(os.path.join(archive_dir, str(recording_id)), ignore_errors=True)
+        raise
+
+    # 4. 删除原文件
+    for path in archived_files:
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"⚠️ 删除已归档文件失败 {path}: {e}")
+    return archived
+
+
+def archive_old_recordings(db: Session, days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE,
+                           archive_engine=None, archive_dir: str = ARCHIVE_DIR, now: datetime = None) -> int:
+    """归档超过 days 天没有新评分的录音，每批一个事务，返回归档的录音总数"""
+    older_than = (now or datetime.now(timezone.utc)) - timedelta(days=days)
+    total = 0
+    while True:
+        recording_ids = find_archivable_recordings(db, older_than, batch_size)
+        if not recording_ids:
+            break
+        total += archive_recordings(db, recording_ids, archive_engine, archive_dir)
+        print(f"📦 已归档 {total} 个录音")
+    return total
+
+
+def restore_recording(db: Session, recording_id: int, archive_engine=None, archive_dir: str = ARCHIVE_DIR) -> bool:
+    """从归档取回录音的数据和文件，录音没有归档存根或归档库中没有数据时返回 False"""
+    if get_archived_recording(db, recording_id) is None:
+        return False
+    archive_engine = archive_engine or get_archive_engine()
+
+    with archive_engine.connect() as connection:
+        recording = connection.execute(
+            select(recordings_table).where(recordings_table.c.id == recording_id)
+        ).mappings().first()
+        scores = connection.execute(
+            select(scores_table).where(scores_table.c.recording_id == recording_id)
+        ).mappings().all()
+        segments = connection.execute(select(segments_table).where(
+            segments_table.c.score_id.in_([score["id"] for score in scores])
+        )).mappings().all()
+    if recording is None:
+        print(f"❌ 归档库中没有录音 {recording_id}")
+        return False
+    score_ids = [score["id"] for score in scores]
+    if db.query(PerformanceRecording.id).filter(PerformanceRecording.id == recording_id).first() or \
+            db.query(PerformanceScore.id).filter(PerformanceScore.id.in_(score_ids)).first():
+        # 旧版数据库（录音、评分表没有 AUTOINCREMENT）中ID可能已被新记录占用
+        print(f"❌ 录音 {recording_id} 或其评分的ID已被在线库中的新记录占用，无法恢复")
+        return False
+
+    # 文件先解压回原位置，再写回数据库
+    for path in _recording_files(recording, scores):
+        archived_path = archive_file_path(path, recording_id, archive_dir)
+        if os.path.exists(archived_path):
+            _decompress(archived_path, path)
+
+    restore_recording_rows(db, dict(recording), [dict(score) for score in scores],
+                           [dict(segment) for segment in segments])
+
+    # 在线库已恢复；归档库中的数据删除失败时留到下次归档该录音时覆盖
+    try:
+        with archive_engine.begin() as connection:
+            _delete_archived_rows(connection, [recording_id])
+    except Exception as e:
+        print(f"⚠️ 录音 {recording_id} 已恢复，但从归档库删除失败: {e}")
+    shutil.rmtree(os.path.join(archive_dir, str(recording_id)), ignore_errors=True)
+    return True
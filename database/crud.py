@@ -1,12 +1,37 @@
 """
 数据库 CRUD 操作
 """
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import case, delete, func, insert, inspect, select, tuple_, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, aliased, defer, joinedload
+from collections import Counter
+from typing import Callable, List, Optional, Tuple
 from database.models.models import (
     Song, Solo, User, SheetMusicProject, SheetPage,
-    GeneratedAudio, PerformanceRecording, PerformanceScore
+    GeneratedAudio, PerformanceRecording, PerformanceScore, ScoreSegments, ArchivedRecording, LeaderboardEntry
 )
+from database.segments import SEGMENT_DTYPE, encode_segment_scores, decode_segment_scores
+from database.search import songs_fts, songs_fts_match, songs_fts_rank, build_match_query
+
+# 分页
+def _keyset_page(query, created_at_column, key_column, limit: int, cursor=None,
+                 row_key: Callable = None) -> Tuple[list, Optional[object]]:
+    """
+    键集分页：按 (创建时间, 主键) 倒序取一页，翻页耗时与页码无关
+
+    cursor 为上一页最后一行的主键。翻页条件与该行在库中的创建时间直接比较，
+    不受 Python 端时间格式的影响。多取一行判断是否还有下一页。
+    返回 (本页数据, 下一页游标)，没有下一页时游标为 None。
+    """
+    if cursor is not None:
+        cursor_created_at = select(created_at_column).where(key_column == cursor).scalar_subquery()
+        query = query.filter(tuple_(created_at_column, key_column) < tuple_(cursor_created_at, cursor))
+
+    rows = query.order_by(created_at_column.desc(), key_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    row_key = row_key or (lambda row: getattr(row, key_column.key))
+    return rows[:limit], row_key(rows[limit - 1])
 
 # Song CRUD
 def create_song(db: Session, name: str, description: str = None, composer: str = None,
@@ -24,6 +49,10 @@ def create_song(db: Session, name: str, description: str = None, composer: str =
     db.refresh(db_song)
     return db_song
 
+def get_song_by_id(db: Session, song_id: int) -> Optional[Song]:
+    """根据ID获取曲目"""
+    return db.query(Song).filter(Song.id == song_id).first()
+
 def get_song_by_name(db: Session, name: str) -> Optional[Song]:
     """根据名称获取曲目"""
     return db.query(Song).filter(Song.name == name).first()
@@ -32,15 +61,51 @@ def get_all_songs(db: Session) -> List[Song]:
     """获取所有曲目"""
     return db.query(Song).order_by(Song.created_at.desc()).all()
 
-def search_songs_by_name(db: Session, search_term: str) -> List[Song]:
-    """根据名称搜索曲目"""
-    return db.query(Song).filter(Song.name.contains(search_term)).order_by(Song.name).all()
-
-def update_song(db: Session, name: str, description: str = None, composer: str = None,
+def get_songs_page(db: Session, limit: int, cursor: int = None) -> Tuple[List[Song], Optional[int]]:
+    """
+    分页获取曲目（最新的在前）
+    cursor 为上一页最后一首曲目的ID，返回 (本页曲目, 下一页游标)
+    """
+    return _keyset_page(db.query(Song), Song.created_at, Song.id, limit, cursor)
+
+def count_songs(db: Session) -> int:
+    """曲目总数"""
+    return db.query(Song).count()
+
+def search_songs_by_name(db: Session, search_term: str, limit: int = None) -> List[Song]:
+    """根据名称搜索曲目（子串匹配，需要扫描全表）"""
+    return db.query(Song).filter(Song.name.contains(search_term)).order_by(Song.name).limit(limit).all()
+
+def search_songs(db: Session, search_term: str, limit: int = 50) -> List[Song]:
+    """
+    全文搜索曲目：在名称、作曲家、类型、简介中按词前缀匹配，按相关度排序
+    没有结果时（如搜索中文词的中间部分），或数据库尚未建立搜索索引时，退回到名称的子串匹配
+    """
+    match_query = build_match_query(search_term)
+    if match_query is None:
+        return []
+
+    try:
+        songs = db.query(Song).join(
+            songs_fts, songs_fts.c.rowid == Song.id
+        ).filter(
+            songs_fts_match(match_query)
+        ).order_by(songs_fts_rank()).limit(limit).all()
+    except OperationalError as e:
+        # 未执行 migrate_add_song_search.py，或 SQLite 不支持 FTS5
+        print(f"⚠️ 全文搜索不可用，改用名称匹配: {e}")
+        db.rollback()
+        songs = []
+
+    return songs or search_songs_by_name(db, search_term.strip(), limit)
+
+def update_song(db: Session, song_id: int, name: str = None, description: str = None, composer: str = None,
                genre: str = None, difficulty: str = None, synthesized_audio_path: str = None) -> Optional[Song]:
-    """更新曲目信息"""
-    db_song = get_song_by_name(db, name)
+    """更新曲目信息（乐谱、录音按曲目ID关联，改名不影响它们）"""
+    db_song = get_song_by_id(db, song_id)
     if db_song:
+        if name is not None:
+            db_song.name = name
         if description is not None:
             db_song.description = description
         if composer is not None:
@@ -55,44 +120,105 @@ def update_song(db: Session, name: str, description: str = None, composer: str =
         db.refresh(db_song)
     return db_song
 
-def delete_song(db: Session, name: str) -> bool:
+def delete_song(db: Session, song_id: int) -> bool:
     """删除曲目"""
-    db_song = get_song_by_name(db, name)
+    db_song = get_song_by_id(db, song_id)
     if db_song:
         db.delete(db_song)
         db.commit()
         return True
     return False
 
+# 曲目计数
+# Song.solo_count / recording_count / latest_score_at 在增删乐谱、录音、评分的同一事务中更新，
+# 曲目列表直接读取计数字段，不必为每首曲目查询乐谱和录音。
+def _adjust_song_counts(db: Session, song_id: int, solos: int = 0, recordings: int = 0):
+    """在当前事务中增减曲目的乐谱、录音数量（由数据库完成加减，并发写入不会丢失更新）"""
+    values = {}
+    if solos:
+        values["solo_count"] = Song.solo_count + solos
+    if recordings:
+        values["recording_count"] = Song.recording_count + recordings
+    if values:
+        # 计数变化不算曲目信息修改，保持 updated_at 不变
+        db.execute(update(Song).where(Song.id == song_id).values(updated_at=Song.updated_at, **values)
+                   .execution_options(synchronize_session=False))
+
+def _latest_score_at_subquery(song_id_column):
+    return select(func.max(PerformanceScore.created_at)).join(
+        PerformanceRecording, PerformanceRecording.id == PerformanceScore.recording_id
+    ).where(PerformanceRecording.song_id == song_id_column).scalar_subquery()
+
+def _refresh_latest_score_at(db: Session, song_id: int):
+    """在当前事务中按现有评分重新计算曲目的最近评分时间"""
+    db.execute(update(Song).where(Song.id == song_id).values(
+        latest_score_at=_latest_score_at_subquery(Song.id), updated_at=Song.updated_at
+    ).execution_options(synchronize_session=False))
+
+def get_song_counts(db: Session, song_id: int):
+    """读取曲目的计数字段，返回 (乐谱数量, 录音数量, 最近评分时间)，曲目不存在时返回 None"""
+    return db.query(Song.solo_count, Song.recording_count, Song.latest_score_at).filter(
+        Song.id == song_id
+    ).first()
+
+def count_solos_by_song(db: Session, song_id: int) -> int:
+    """按乐谱表实际计数（COUNT），用于核对计数字段"""
+    return db.query(func.count(Solo.id)).filter(Solo.song_id == song_id).scalar()
+
+def recount_song_counts(db: Session, song_id: int = None) -> int:
+    """
+    按乐谱、录音、评分表重新计算计数字段（song_id 为空时重算所有曲目），返回更新的曲目数
+    用于修复绕过 CRUD 直接修改数据库后的计数
+    """
+    solo_count = select(func.count(Solo.id)).where(Solo.song_id == Song.id).scalar_subquery()
+    recording_count = select(func.count(PerformanceRecording.id)).where(
+        PerformanceRecording.song_id == Song.id
+    ).scalar_subquery()
+    statement = update(Song).values(
+        solo_count=solo_count,
+        recording_count=recording_count,
+        latest_score_at=_latest_score_at_subquery(Song.id),
+        updated_at=Song.updated_at
+    ).execution_options(synchronize_session=False)
+    if song_id is not None:
+        statement = statement.where(Song.id == song_id)
+    updated = db.execute(statement).rowcount
+    db.commit()
+    return updated
+
 # Solo CRUD
-def create_solo(db: Session, song_name: str, instrument: str, file_path: str,
-               original_filename: str = None, file_size: int = None, mp3_path: str = None) -> Solo:
+def create_solo(db: Session, song_id: int, instrument: str, file_path: str,
+               original_filename: str = None, file_size: int = None, mp3_path: str = None,
+               normalized_xml_path: str = None, midi_path: str = None) -> Solo:
     """创建单奏乐谱记录"""
     db_solo = Solo(
-        song_name=song_name,
+        song_id=song_id,
         instrument=instrument,
         file_path=file_path,
         original_filename=original_filename,
         file_size=file_size,
-        mp3_path=mp3_path
+        mp3_path=mp3_path,
+        normalized_xml_path=normalized_xml_path,
+        midi_path=midi_path
     )
     db.add(db_solo)
+    _adjust_song_counts(db, song_id, solos=1)
     db.commit()
     db.refresh(db_solo)
     return db_solo
 
-def get_solos_by_song(db: Session, song_name: str) -> List[Solo]:
+def get_solos_by_song(db: Session, song_id: int) -> List[Solo]:
     """获取曲目的所有单奏乐谱"""
-    return db.query(Solo).filter(Solo.song_name == song_name).order_by(Solo.created_at.desc()).all()
+    return db.query(Solo).filter(Solo.song_id == song_id).order_by(Solo.created_at.desc()).all()
 
 def get_solo_by_id(db: Session, solo_id: int) -> Optional[Solo]:
     """根据ID获取单奏乐谱"""
     return db.query(Solo).filter(Solo.id == solo_id).first()
 
-def get_solo_by_song_and_instrument(db: Session, song_name: str, instrument: str) -> Optional[Solo]:
-    """根据曲目名称和乐器类型获取单奏乐谱"""
+def get_solo_by_song_and_instrument(db: Session, song_id: int, instrument: str) -> Optional[Solo]:
+    """根据曲目ID和乐器类型获取单奏乐谱"""
     return db.query(Solo).filter(
-        Solo.song_name == song_name,
+        Solo.song_id == song_id,
         Solo.instrument == instrument
     ).first()
 
@@ -101,12 +227,14 @@ def delete_solo(db: Session, solo_id: int) -> bool:
     db_solo = get_solo_by_id(db, solo_id)
     if db_solo:
         db.delete(db_solo)
+        _adjust_song_counts(db, db_solo.song_id, solos=-1)
         db.commit()
         return True
     return False
 
 def update_solo(db: Session, solo_id: int, instrument: str = None, file_path: str = None,
-               original_filename: str = None, file_size: int = None, mp3_path: str = None) -> Optional[Solo]:
+               original_filename: str = None, file_size: int = None, mp3_path: str = None,
+               normalized_xml_path: str = None, midi_path: str = None) -> Optional[Solo]:
     """更新单奏乐谱信息"""
     db_solo = get_solo_by_id(db, solo_id)
     if db_solo:
@@ -120,6 +248,10 @@ def update_solo(db: Session, solo_id: int, instrument: str = None, file_path: st
             db_solo.file_size = file_size
         if mp3_path is not None:
             db_solo.mp3_path = mp3_path
+        if normalized_xml_path is not None:
+            db_solo.normalized_xml_path = normalized_xml_path
+        if midi_path is not None:
+            db_solo.midi_path = midi_path
         # Update the modification timestamp
         from datetime import datetime
         db_solo.created_at = datetime.now()
@@ -145,13 +277,13 @@ def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
     return db.query(User).filter(User.id == user_id).first()
 
 # SheetMusicProject CRUD
-def create_project(db: Session, title: str, description: str = None, user_id: int = None, song_name: str = None) -> SheetMusicProject:
+def create_project(db: Session, title: str, description: str = None, user_id: int = None, song_id: int = None) -> SheetMusicProject:
     """创建乐谱项目"""
     db_project = SheetMusicProject(
         title=title,
         description=description,
         user_id=user_id,
-        song_name=song_name
+        song_id=song_id
     )
     db.add(db_project)
     db.commit()
@@ -179,14 +311,17 @@ def update_project(db: Session, project_id: int, title: str = None, description:
     return db_project
 
 # SheetPage CRUD
-def create_sheet_page(db: Session, project_id: int, page_number: int,
-                     original_image_path: str = None, musicxml_path: str = None) -> SheetPage:
+def create_sheet_page(db: Session, project_id: Optional[int], page_number: int,
+                     original_image_path: str = None, musicxml_path: str = None,
+                     solo_id: int = None, status: str = "uploaded") -> SheetPage:
     """创建乐谱页面"""
     db_page = SheetPage(
         project_id=project_id,
+        solo_id=solo_id,
         page_number=page_number,
         original_image_path=original_image_path,
-        musicxml_path=musicxml_path
+        musicxml_path=musicxml_path,
+        status=status
     )
     db.add(db_page)
     db.commit()
@@ -197,6 +332,45 @@ def get_pages_by_project(db: Session, project_id: int) -> List[SheetPage]:
     """获取项目的所有页面"""
     return db.query(SheetPage).filter(SheetPage.project_id == project_id).order_by(SheetPage.page_number).all()
 
+def get_pages_by_solo(db: Session, solo_id: int) -> List[SheetPage]:
+    """获取单奏乐谱的所有页面"""
+    return db.query(SheetPage).filter(SheetPage.solo_id == solo_id).order_by(SheetPage.page_number).all()
+
+def replace_solo_pages(db: Session, solo_id: int, pages: List[dict]) -> List[SheetPage]:
+    """
+    用按页识别的结果替换单奏乐谱的页面记录
+
+    pages 中每项包含 page_number、image_path、content_hash、musicxml_path、status
+    """
+    db.query(SheetPage).filter(SheetPage.solo_id == solo_id).delete(synchronize_session=False)
+    db_pages = [
+        SheetPage(
+            solo_id=solo_id,
+            page_number=page["page_number"],
+            original_image_path=page.get("image_path"),
+            musicxml_path=page.get("musicxml_path"),
+            content_hash=page.get("content_hash"),
+            status=page.get("status", "uploaded")
+        )
+        for page in pages
+    ]
+    db.add_all(db_pages)
+    db.commit()
+    return db_pages
+
+def get_known_page_results(db: Session, solo_id: int) -> dict:
+    """
+    返回单奏乐谱上次按页识别成功的页面 {页面内容哈希: MusicXML路径}
+    重新上传时内容未变化的页可直接复用，不必再次识别
+    """
+    pages = db.query(SheetPage).filter(
+        SheetPage.solo_id == solo_id,
+        SheetPage.status == "processed",
+        SheetPage.content_hash.isnot(None),
+        SheetPage.musicxml_path.isnot(None)
+    ).all()
+    return {page.content_hash: page.musicxml_path for page in pages}
+
 def update_page_status(db: Session, page_id: int, status: str, musicxml_path: str = None) -> Optional[SheetPage]:
     """更新页面状态"""
     db_page = db.query(SheetPage).filter(SheetPage.id == page_id).first()
@@ -231,11 +405,11 @@ def get_audio_by_project(db: Session, project_id: int, instrument: str = None) -
     return query.order_by(GeneratedAudio.created_at.desc()).first()
 
 # PerformanceRecording CRUD
-def create_recording(db: Session, song_name: str, performer_name: str, instrument: str, audio_path: str,
+def create_recording(db: Session, song_id: int, performer_name: str, instrument: str, audio_path: str,
                     original_filename: str = None, file_size: int = None) -> PerformanceRecording:
     """创建演奏录音记录"""
     db_recording = PerformanceRecording(
-        song_name=song_name,
+        song_id=song_id,
         performer_name=performer_name,
         instrument=instrument,
         audio_path=audio_path,
@@ -243,13 +417,27 @@ def create_recording(db: Session, song_name: str, performer_name: str, instrumen
         file_size=file_size
     )
     db.add(db_recording)
+    _adjust_song_counts(db, song_id, recordings=1)
     db.commit()
     db.refresh(db_recording)
     return db_recording
 
-def get_recordings_by_song(db: Session, song_name: str) -> List[PerformanceRecording]:
+def get_recordings_by_song(db: Session, song_id: int) -> List[PerformanceRecording]:
     """获取曲目的所有演奏录音"""
-    return db.query(PerformanceRecording).filter(PerformanceRecording.song_name == song_name).order_by(PerformanceRecording.created_at.desc()).all()
+    return db.query(PerformanceRecording).filter(PerformanceRecording.song_id == song_id).order_by(PerformanceRecording.created_at.desc()).all()
+
+def get_recordings_page(db: Session, song_id: int, limit: int,
+                        cursor: int = None) -> Tuple[List[PerformanceRecording], Optional[int]]:
+    """
+    分页获取曲目的演奏录音（最新的在前）
+    cursor 为上一页最后一条录音的ID，返回 (本页录音, 下一页游标)
+    """
+    query = db.query(PerformanceRecording).filter(PerformanceRecording.song_id == song_id)
+    return _keyset_page(query, PerformanceRecording.created_at, PerformanceRecording.id, limit, cursor)
+
+def count_recordings_by_song(db: Session, song_id: int) -> int:
+    """曲目的演奏录音数量"""
+    return db.query(PerformanceRecording).filter(PerformanceRecording.song_id == song_id).count()
 
 def get_recording_by_id(db: Session, recording_id: int) -> Optional[PerformanceRecording]:
     """根据ID获取演奏录音"""
@@ -259,7 +447,14 @@ def delete_recording(db: Session, recording_id: int) -> bool:
     """删除演奏录音"""
     db_recording = get_recording_by_id(db, recording_id)
     if db_recording:
+        song_id = db_recording.song_id
+        leaderboard_key = (song_id, db_recording.instrument, db_recording.performer_name)
         db.delete(db_recording)
+        db.flush()
+        _adjust_song_counts(db, song_id, recordings=-1)
+        # 录音的评分随录音一起删除，重新计算最近评分时间和排行榜
+        _refresh_latest_score_at(db, song_id)
+        _refresh_leaderboard_entries(db, [leaderboard_key])
         db.commit()
         return True
     return False
@@ -268,8 +463,12 @@ def update_recording(db: Session, recording_id: int, performer_name: str = None)
     """更新演奏录音信息"""
     db_recording = get_recording_by_id(db, recording_id)
     if db_recording:
-        if performer_name is not None:
+        if performer_name is not None and performer_name != db_recording.performer_name:
+            # 评分从原演奏者的排行榜条目移到新演奏者
+            old_key = (db_recording.song_id, db_recording.instrument, db_recording.performer_name)
             db_recording.performer_name = performer_name
+            db.flush()
+            _refresh_leaderboard_entries(db, [old_key, (db_recording.song_id, db_recording.instrument, performer_name)])
         db.commit()
         db.refresh(db_recording)
     return db_recording
@@ -279,8 +478,12 @@ def create_score(db: Session, recording_id: int, overall_score: int,
                 pitch_score: int, rhythm_score: int, pitch_error: float, rhythm_error: float,
                 suggestions: str, chart_path: str = None, reference_audio_path: str = None,
                 project_id: int = None, user_id: int = None, reference_solo_id: int = None,
-                rhythm_stability_error: float = None) -> PerformanceScore:
-    """创建演奏评分记录"""
+                rhythm_stability_error: float = None, segment_scores_pitch=None,
+                segment_scores_rhythm=None, segment_size: int = None) -> PerformanceScore:
+    """
+    创建演奏评分记录
+    提供分段评分（音准、节奏分数序列，长度相同）时一并以二进制数组保存到 ScoreSegments
+    """
     db_score = PerformanceScore(
         recording_id=recording_id,
         project_id=project_id,
@@ -297,10 +500,55 @@ def create_score(db: Session, recording_id: int, overall_score: int,
         reference_audio_path=reference_audio_path
     )
     db.add(db_score)
+    db.flush()
+    if segment_scores_pitch is not None and segment_scores_rhythm is not None:
+        _add_score_segments(db, db_score.id, segment_scores_pitch, segment_scores_rhythm, segment_size)
+    _record_song_score_time(db, recording_id, db_score.id)
+    _record_leaderboard_score(db, recording_id, db_score.id, overall_score)
     db.commit()
     db.refresh(db_score)
     return db_score
 
+def _add_score_segments(db: Session, score_id: int, pitch_scores, rhythm_scores, segment_size: int = None):
+    if len(pitch_scores) != len(rhythm_scores):
+        raise ValueError(f"音准、节奏分段数量不一致: {len(pitch_scores)} != {len(rhythm_scores)}")
+    db.add(ScoreSegments(
+        score_id=score_id,
+        segment_size=segment_size,
+        segment_count=len(pitch_scores),
+        dtype=SEGMENT_DTYPE,
+        pitch=encode_segment_scores(pitch_scores),
+        rhythm=encode_segment_scores(rhythm_scores)
+    ))
+
+def get_score_segments(db: Session, score_id: int) -> Optional[dict]:
+    """
+    读取并解码评分的分段数据，没有时返回 None
+    返回 {"pitch": 音准分数数组, "rhythm": 节奏分数数组, "segment_size": 每段帧数}
+    """
+    segments = db.query(ScoreSegments).filter(ScoreSegments.score_id == score_id).first()
+    if segments is None:
+        return None
+    return {
+        "pitch": decode_segment_scores(segments.pitch, segments.dtype),
+        "rhythm": decode_segment_scores(segments.rhythm, segments.dtype),
+        "segment_size": segments.segment_size,
+    }
+
+def _record_song_score_time(db: Session, recording_id: int, score_id: int):
+    """在当前事务中把新评分的创建时间记为录音所属曲目的最近评分时间（不早于已记录的时间）"""
+    score_created_at = select(PerformanceScore.created_at).where(PerformanceScore.id == score_id).scalar_subquery()
+    song_id = select(PerformanceRecording.song_id).where(
+        PerformanceRecording.id == recording_id
+    ).scalar_subquery()
+    db.execute(update(Song).where(Song.id == song_id).values(
+        latest_score_at=case(
+            (Song.latest_score_at.is_(None) | (Song.latest_score_at < score_created_at), score_created_at),
+            else_=Song.latest_score_at
+        ),
+        updated_at=Song.updated_at
+    ).execution_options(synchronize_session=False))
+
 def get_scores_by_project(db: Session, project_id: int) -> List[PerformanceScore]:
     """获取项目的所有评分"""
     return db.query(PerformanceScore).filter(
@@ -319,22 +567,303 @@ def get_scores_by_recording_id(db: Session, recording_id: int) -> List[Performan
         PerformanceScore.recording_id == recording_id
     ).order_by(PerformanceScore.created_at.desc()).all()
 
+def _recordings_with_latest_scores_query(db: Session, song_id: int):
+    """录音及其最新评分（参考乐谱一并加载）的查询，见 get_recordings_with_latest_scores"""
+    latest_score_id = db.query(PerformanceScore.id).filter(
+        PerformanceScore.recording_id == PerformanceRecording.id
+    ).order_by(
+        PerformanceScore.created_at.desc(), PerformanceScore.id.desc()
+    ).limit(1).correlate(PerformanceRecording).scalar_subquery()
+
+    latest_score = aliased(PerformanceScore)
+    return db.query(PerformanceRecording, latest_score).outerjoin(
+        latest_score, latest_score.id == latest_score_id
+    ).options(
+        joinedload(latest_score.reference_solo),
+        defer(latest_score.segment_scores)
+    ).filter(
+        PerformanceRecording.song_id == song_id
+    )
+
+def get_recordings_with_latest_scores(db: Session, song_id: int
+                                      ) -> List[Tuple[PerformanceRecording, Optional[PerformanceScore]]]:
+    """
+    获取曲目的所有演奏录音及各自最新的一条评分（参考乐谱一并加载），按上传时间倒序
+
+    一次查询完成，录音列表不必再为每条录音分别查询评分和参考乐谱。
+    列表不显示的分段评分数据（segment_scores）不加载。
+    """
+    return _recordings_with_latest_scores_query(db, song_id).order_by(
+        PerformanceRecording.created_at.desc(), PerformanceRecording.id.desc()
+    ).all()
+
+def get_recordings_page_with_latest_scores(db: Session, song_id: int, limit: int, cursor: int = None
+                                           ) -> Tuple[List[Tuple[PerformanceRecording, Optional[PerformanceScore]]],
+                                                      Optional[int]]:
+    """
+    分页版的 get_recordings_with_latest_scores
+    cursor 为上一页最后一条录音的ID，返回 (本页 [(录音, 最新评分)], 下一页游标)
+    """
+    return _keyset_page(_recordings_with_latest_scores_query(db, song_id),
+                        PerformanceRecording.created_at, PerformanceRecording.id, limit, cursor,
+                        row_key=lambda row: row[0].id)
+
+# 排行榜
+# LeaderboardEntry 按 (曲目, 乐器, 演奏者) 汇总综合评分：创建评分时在同一事务中增量更新；
+# 删除、改名、归档、恢复录音时只重新计算受影响演奏者的条目（最高分无法增量扣减）。
+def _leaderboard_key(song_id, instrument, performer_name):
+    return (LeaderboardEntry.song_id == song_id) & (LeaderboardEntry.instrument == instrument) & \
+        (LeaderboardEntry.performer_name == performer_name)
+
+def _record_leaderboard_score(db: Session, recording_id: int, score_id: int, overall_score: int):
+    """在当前事务中把新评分计入录音所属演奏者的排行榜条目（没有条目时新建）"""
+    if overall_score is None:
+        return
+    recording = db.query(
+        PerformanceRecording.song_id, PerformanceRecording.instrument, PerformanceRecording.performer_name
+    ).filter(PerformanceRecording.id == recording_id).one()
+    score_created_at = select(PerformanceScore.created_at).where(PerformanceScore.id == score_id).scalar_subquery()
+    updated = db.execute(update(LeaderboardEntry).where(_leaderboard_key(*recording)).values(
+        best_score=case((LeaderboardEntry.best_score < overall_score, overall_score),
+                        else_=LeaderboardEntry.best_score),
+        # 与原最高分相同时保留第一次达到的时间
+        best_score_at=case((LeaderboardEntry.best_score < overall_score, score_created_at),
+                           else_=LeaderboardEntry.best_score_at),
+        latest_score=overall_score,
+        score_total=LeaderboardEntry.score_total + overall_score,
+        score_count=LeaderboardEntry.score_count + 1,
+        latest_score_at=score_created_at
+    ).execution_options(synchronize_session=False)).rowcount
+    if not updated:
+        db.execute(insert(LeaderboardEntry).values(
+            song_id=recording.song_id, instrument=recording.instrument, performer_name=recording.performer_name,
+            best_score=overall_score, best_score_at=score_created_at, latest_score=overall_score,
+            score_total=overall_score, score_count=1, latest_score_at=score_created_at
+        ))
+
+def _leaderboard_from_scores(*conditions):
+    """按评分表汇总排行榜条目的查询（conditions 为录音表上的过滤条件），列顺序与 LEADERBOARD_COLUMNS 相同"""
+    group = (PerformanceRecording.song_id, PerformanceRecording.instrument, PerformanceRecording.performer_name)
+    ranked = select(
+        *group, PerformanceScore.overall_score, PerformanceScore.created_at,
+        func.row_number().over(
+            partition_by=group, order_by=(PerformanceScore.created_at.desc(), PerformanceScore.id.desc())
+        ).label("recency"),
+        # 最高分中最早的一次
+        func.row_number().over(
+            partition_by=group,
+            order_by=(PerformanceScore.overall_score.desc(), PerformanceScore.created_at, PerformanceScore.id)
+        ).label("best_rank")
+    ).join(PerformanceScore, PerformanceScore.recording_id == PerformanceRecording.id).where(
+        PerformanceScore.overall_score.isnot(None), *conditions
+    ).subquery()
+    return select(
+        ranked.c.song_id, ranked.c.instrument, ranked.c.performer_name,
+        func.max(ranked.c.overall_score),
+        func.max(case((ranked.c.best_rank == 1, ranked.c.created_at))),
+        func.max(case((ranked.c.recency == 1, ranked.c.overall_score))),
+        func.sum(ranked.c.overall_score),
+        func.count(),
+        func.max(ranked.c.created_at)
+    ).group_by(ranked.c.song_id, ranked.c.instrument, ranked.c.performer_name)
+
+LEADERBOARD_COLUMNS = ["song_id", "instrument", "performer_name", "best_score", "best_score_at", "latest_score",
+                       "score_total", "score_count", "latest_score_at"]
+
+def _refresh_leaderboard_entries(db: Session, keys):
+    """在当前事务中按评分表重新计算指定 (曲目ID, 乐器, 演奏者) 的排行榜条目"""
+    keys = list(set(keys))
+    for chunk in _chunks(keys):
+        db.execute(delete(LeaderboardEntry).where(
+            tuple_(LeaderboardEntry.song_id, LeaderboardEntry.instrument, LeaderboardEntry.performer_name).in_(chunk)
+        ).execution_options(synchronize_session=False))
+        db.execute(insert(LeaderboardEntry).from_select(LEADERBOARD_COLUMNS, _leaderboard_from_scores(
+            tuple_(PerformanceRecording.song_id, PerformanceRecording.instrument,
+                   PerformanceRecording.performer_name).in_(chunk)
+        )))
+
+def rebuild_leaderboard(db: Session, song_id: int = None) -> int:
+    """
+    按评分表重建排行榜（song_id 为空时重建所有曲目），返回条目数
+    用于首次建表后填充，或修复绕过 CRUD 直接修改数据库后的排行榜
+    """
+    entries = delete(LeaderboardEntry).execution_options(synchronize_session=False)
+    conditions = []
+    if song_id is not None:
+        entries = entries.where(LeaderboardEntry.song_id == song_id)
+        conditions.append(PerformanceRecording.song_id == song_id)
+    db.execute(entries)
+    inserted = db.execute(insert(LeaderboardEntry).from_select(
+        LEADERBOARD_COLUMNS, _leaderboard_from_scores(*conditions)
+    )).rowcount
+    db.commit()
+    return inserted
+
+def backfill_leaderboard(db: Session) -> Optional[int]:
+    """
+    排行榜为空、但已有评分时按评分表生成（新建排行榜表或升级已有数据库后），返回生成的条目数
+    录音表还按曲目名称关联（尚未执行 migrate_song_integer_ids.py）时无法汇总，返回 None
+    """
+    columns = {column["name"] for column in inspect(db.get_bind()).get_columns(PerformanceRecording.__tablename__)}
+    if "song_id" not in columns:
+        return None
+    if db.query(LeaderboardEntry.id).first() is not None or \
+            db.query(PerformanceScore.id).filter(PerformanceScore.overall_score.isnot(None)).first() is None:
+        return 0
+    return rebuild_leaderboard(db)
+
+def get_leaderboard(db: Session, song_id: int, instrument: str, limit: int = 10) -> List[LeaderboardEntry]:
+    """曲目某乐器的排行榜前 limit 名（按最高分，同分时先达到的在前）"""
+    return db.query(LeaderboardEntry).filter(
+        LeaderboardEntry.song_id == song_id, LeaderboardEntry.instrument == instrument
+    ).order_by(
+        LeaderboardEntry.best_score.desc(), LeaderboardEntry.best_score_at, LeaderboardEntry.id
+    ).limit(limit).all()
+
+def get_leaderboard_instruments(db: Session, song_id: int) -> List[str]:
+    """曲目下有排行榜的乐器"""
+    return [instrument for instrument, in db.query(LeaderboardEntry.instrument).filter(
+        LeaderboardEntry.song_id == song_id
+    ).distinct().order_by(LeaderboardEntry.instrument)]
+
+# 批量导入
+# 每批在一个事务中写入，不逐行 commit / refresh；新记录的ID在提交前取出，避免提交后逐条重新加载
+IN_CLAUSE_CHUNK = 500
+
+def _chunks(items: list, size: int = IN_CLAUSE_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def get_song_ids_by_name(db: Session, names: List[str]) -> dict:
+    """返回 names 中已存在的曲目 {名称: 曲目ID}"""
+    existing = {}
+    for chunk in _chunks(list(set(names))):
+        existing.update(db.query(Song.name, Song.id).filter(Song.name.in_(chunk)))
+    return existing
+
+def get_existing_solo_keys(db: Session, song_ids: List[int]) -> set:
+    """返回这些曲目已有乐谱的 (曲目ID, 乐器) 集合"""
+    existing = set()
+    for chunk in _chunks(list(set(song_ids))):
+        existing.update(db.query(Solo.song_id, Solo.instrument).filter(Solo.song_id.in_(chunk)))
+    return existing
+
+def bulk_create_songs(db: Session, songs: List[dict]) -> List[int]:
+    """批量创建曲目（字段同 create_song），在一个事务中写入，返回新曲目ID"""
+    db_songs = [Song(**song) for song in songs]
+    db.add_all(db_songs)
+    db.flush()
+    ids = [song.id for song in db_songs]
+    db.commit()
+    return ids
+
+def bulk_create_solos(db: Session, solos: List[dict]) -> List[int]:
+    """批量创建乐谱记录（字段同 create_solo），在一个事务中写入，返回新记录ID"""
+    db_solos = [Solo(**solo) for solo in solos]
+    db.add_all(db_solos)
+    db.flush()
+    ids = [solo.id for solo in db_solos]
+    for song_id, count in Counter(solo["song_id"] for solo in solos).items():
+        _adjust_song_counts(db, song_id, solos=count)
+    db.commit()
+    return ids
+
+def bulk_create_recordings(db: Session, recordings: List[dict]) -> List[int]:
+    """批量创建演奏录音记录（字段同 create_recording），在一个事务中写入，返回新记录ID"""
+    db_recordings = [PerformanceRecording(**recording) for recording in recordings]
+    db.add_all(db_recordings)
+    db.flush()
+    ids = [recording.id for recording in db_recordings]
+    for song_id, count in Counter(recording["song_id"] for recording in recordings).items():
+        _adjust_song_counts(db, song_id, recordings=count)
+    db.commit()
+    return ids
+
+# 归档（冷存储）
+# 录音、评分和分段数据移到归档数据库后，在线库只保留 ArchivedRecording 存根（归档流程见 database/archive.py）
+def get_archived_recording(db: Session, recording_id: int) -> Optional[ArchivedRecording]:
+    """根据原录音ID获取归档存根"""
+    return db.query(ArchivedRecording).filter(ArchivedRecording.id == recording_id).first()
+
+def get_archived_recordings_by_song(db: Session, song_id: int) -> List[ArchivedRecording]:
+    """获取曲目的已归档录音（按上传时间倒序）"""
+    return db.query(ArchivedRecording).filter(ArchivedRecording.song_id == song_id).order_by(
+        ArchivedRecording.created_at.desc(), ArchivedRecording.id.desc()
+    ).all()
+
+def count_archived_recordings_by_song(db: Session, song_id: int) -> int:
+    """曲目的已归档录音数量"""
+    return db.query(func.count(ArchivedRecording.id)).filter(ArchivedRecording.song_id == song_id).scalar()
+
+def replace_recordings_with_stubs(db: Session, recording_ids: List[int]) -> int:
+    """
+    在一个事务中删除录音及其评分、分段数据，写入归档存根，并更新曲目计数，返回替换的录音数
+    调用前录音数据应已复制到归档数据库
+    """
+    score_count = select(func.count(PerformanceScore.id)).where(
+        PerformanceScore.recording_id == PerformanceRecording.id
+    ).correlate(PerformanceRecording).scalar_subquery()
+    latest_overall_score = select(PerformanceScore.overall_score).where(
+        PerformanceScore.recording_id == PerformanceRecording.id
+    ).order_by(
+        PerformanceScore.created_at.desc(), PerformanceScore.id.desc()
+    ).limit(1).correlate(PerformanceRecording).scalar_subquery()
+
+    stubs = [row._asdict() for row in db.query(
+        PerformanceRecording.id, PerformanceRecording.song_id, PerformanceRecording.performer_name,
+        PerformanceRecording.instrument, PerformanceRecording.original_filename, PerformanceRecording.created_at,
+        latest_overall_score.label("overall_score"), score_count.label("score_count")
+    ).filter(PerformanceRecording.id.in_(recording_ids))]
+    if not stubs:
+        return 0
+
+    ids = [stub["id"] for stub in stubs]
+    db.execute(insert(ArchivedRecording), stubs)
+    score_ids = select(PerformanceScore.id).where(PerformanceScore.recording_id.in_(ids))
+    for statement in (
+        delete(ScoreSegments).where(ScoreSegments.score_id.in_(score_ids)),
+        delete(PerformanceScore).where(PerformanceScore.recording_id.in_(ids)),
+        delete(PerformanceRecording).where(PerformanceRecording.id.in_(ids)),
+    ):
+        db.execute(statement.execution_options(synchronize_session=False))
+    for song_id, count in Counter(stub["song_id"] for stub in stubs).items():
+        _adjust_song_counts(db, song_id, recordings=-count)
+        _refresh_latest_score_at(db, song_id)
+    _refresh_leaderboard_entries(db, [(stub["song_id"], stub["instrument"], stub["performer_name"]) for stub in stubs])
+    db.commit()
+    return len(stubs)
+
+def restore_recording_rows(db: Session, recording: dict, scores: List[dict], segments: List[dict]):
+    """
+    在一个事务中把从归档数据库取回的录音、评分、分段数据写回（保留原ID），删除存根并更新曲目计数
+    各参数为对应表的整行数据
+    """
+    db.execute(insert(PerformanceRecording), [recording])
+    if scores:
+        db.execute(insert(PerformanceScore), scores)
+    if segments:
+        db.execute(insert(ScoreSegments), segments)
+    db.execute(delete(ArchivedRecording).where(ArchivedRecording.id == recording["id"])
+               .execution_options(synchronize_session=False))
+    _adjust_song_counts(db, recording["song_id"], recordings=1)
+    _refresh_latest_score_at(db, recording["song_id"])
+    _refresh_leaderboard_entries(db, [(recording["song_id"], recording["instrument"], recording["performer_name"])])
+    db.commit()
+
 # 统计功能
 def get_user_stats(db: Session, user_id: int) -> dict:
     """获取用户统计信息"""
     projects_count = db.query(SheetMusicProject).filter(SheetMusicProject.user_id == user_id).count()
-    scores = db.query(PerformanceScore).filter(PerformanceScore.user_id == user_id).all()
-
-    if scores:
-        avg_score = sum(score.overall_score for score in scores) / len(scores)
-        best_score = max(score.overall_score for score in scores)
-    else:
-        avg_score = 0
-        best_score = 0
+    # 在 SQL 中汇总，不加载评分记录（按曲目、乐器、时间的统计见 database/analytics.py）
+    scores_count, avg_score, best_score = db.query(
+        func.count(PerformanceScore.id),
+        func.avg(PerformanceScore.overall_score),
+        func.max(PerformanceScore.overall_score)
+    ).filter(PerformanceScore.user_id == user_id).one()
 
     return {
         "projects_count": projects_count,
-        "scores_count": len(scores),
-        "average_score": round(avg_score, 1),
-        "best_score": best_score
+        "scores_count": scores_count,
+        "average_score": round(avg_score or 0, 1),
+        "best_score": best_score or 0
     }
\ No newline at end of file
@@ -1,13 +1,70 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, event, inspect, MetaData
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 import os
+from config.settings import (
+    DATABASE_URL, SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE_MB,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+)
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+
+def _engine_options():
+    """
+    连接池配置
+    SQLite 连接会在 Streamlit 的多个脚本线程和后台线程（参考音频预生成、OMR任务）之间复用，
+    因此关闭 check_same_thread，由连接池保证同一连接同一时间只被一个线程使用。
+    """
+    options = {
+        "echo": False,
+        "poolclass": QueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    if IS_SQLITE:
+        options["connect_args"] = {
+            "check_same_thread": False,
+            # sqlite3 驱动层面的等待，与 busy_timeout 保持一致
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+    return options
 
-# 数据库配置
-DATABASE_URL = "sqlite:///data/music_evaluator.db"
 
 # 创建数据库引擎
-engine = create_engine(DATABASE_URL, echo=False)
+engine = create_engine(DATABASE_URL, **_engine_options())
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """每个新连接都设置 SQLite 参数（WAL、同步级别、锁等待、缓存、内存映射）"""
+    if not IS_SQLITE:
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT_MS)}")
+        # 负数表示以 KB 为单位
+        cursor.execute(f"PRAGMA cache_size={-int(SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute(f"PRAGMA mmap_size={int(SQLITE_MMAP_SIZE_MB) * 1024 * 1024}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+def _dispose_engine_in_child():
+    """fork 出的工作进程不能复用父进程的连接，丢弃继承来的连接池（不关闭父进程的连接）"""
+    engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_engine_in_child)
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -28,5 +85,32 @@ def init_db():
     # 确保数据目录存在
     os.makedirs("data", exist_ok=True)
 
-    # 创建所有表
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    # 创建所有表（导入模型，确保都已注册到 Base.metadata）
+    from database.models import models  # noqa: F401
+    # 排行榜由评分表汇总而来，表结构落后于模型（缺少新增的列）时删除，建表后重新生成
+    leaderboard = models.LeaderboardEntry.__table__
+    inspector = inspect(engine)
+    if inspector.has_table(leaderboard.name):
+        columns = {column["name"] for column in inspector.get_columns(leaderboard.name)}
+        if not set(leaderboard.columns.keys()) <= columns:
+            leaderboard.drop(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    # 排行榜为空时（新建排行榜表、升级已有数据库）按现有评分填充
+    from database.crud import backfill_leaderboard
+    with SessionLocal() as db:
+        entries = backfill_leaderboard(db)
+    if entries is None:
+        print("⚠️ 录音表还按曲目名称关联，请先执行 migrate_song_integer_ids.py，排行榜暂不生成")
+    elif entries:
+        print(f"✅ 已按现有评分生成排行榜（{entries} 条）")
+
+    # 曲目全文搜索索引（FTS5 虚拟表和同步触发器不在模型中定义）
+    if IS_SQLITE:
+        from database.search import create_song_search_index
+        try:
+            with engine.begin() as connection:
+                if create_song_search_index(connection):
+                    print("✅ 已建立曲目搜索索引")
+        except Exception as e:
+            print(f"⚠️ 曲目搜索索引创建失败，搜索将使用名称匹配: {e}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Float, JSON, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .base import Base
@@ -7,12 +7,17 @@ class Song(Base):
     """曲目表"""
     __tablename__ = "songs"
 
-    name = Column(String(200), primary_key=True, index=True)  # 使用名称作为主键
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(200), unique=True, nullable=False, index=True)  # 曲目名称（唯一）
     description = Column(Text)
     composer = Column(String(100))  # 作曲家
     genre = Column(String(50))  # 音乐类型
     difficulty = Column(String(20))  # 难度等级
     synthesized_audio_path = Column(String(500))  # 合成音频文件路径
+    # 计数字段由 database/crud.py 在增删乐谱、录音、评分的同一事务中维护
+    solo_count = Column(Integer, nullable=False, default=0, server_default="0")  # 乐谱数量
+    recording_count = Column(Integer, nullable=False, default=0, server_default="0")  # 录音数量
+    latest_score_at = Column(DateTime(timezone=True))  # 最近一次评分时间
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
@@ -20,22 +25,37 @@ class Song(Base):
     projects = relationship("SheetMusicProject", back_populates="song")
     solos = relationship("Solo", back_populates="song", cascade="all, delete-orphan")
     recordings = relationship("PerformanceRecording", back_populates="song", cascade="all, delete-orphan")
+    archived_recordings = relationship("ArchivedRecording", back_populates="song", cascade="all, delete-orphan")
+    leaderboard_entries = relationship("LeaderboardEntry", back_populates="song", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_songs_created_id", "created_at", "id"),  # 曲目列表按 (创建时间, ID) 排序和分页
+    )
 
 class Solo(Base):
     """单奏乐谱表"""
     __tablename__ = "solos"
 
     id = Column(Integer, primary_key=True, index=True)
-    song_name = Column(String(200), ForeignKey("songs.name"), nullable=False)  # 关联曲目
+    song_id = Column(Integer, ForeignKey("songs.id"), nullable=False)  # 关联曲目
     instrument = Column(String(100), nullable=False)  # 乐器名称（或"总谱"表示合奏）
     file_path = Column(String(500), nullable=False)  # 乐谱文件路径
     original_filename = Column(String(200))  # 原始文件名
     file_size = Column(Integer)  # 文件大小（字节）
     mp3_path = Column(String(500))  # 单独生成的MP3文件路径
+    normalized_xml_path = Column(String(500))  # 规范化（已展开repeat）的MusicXML路径
+    midi_path = Column(String(500))  # 规范MIDI文件路径
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # 关系
     song = relationship("Song", back_populates="solos")
+    pages = relationship("SheetPage", back_populates="solo", cascade="all, delete-orphan",
+                         order_by="SheetPage.page_number")
+
+    __table_args__ = (
+        Index("ix_solos_song_instrument", "song_id", "instrument"),  # 按曲目（+乐器）查找乐谱
+        Index("ix_solos_song_created", "song_id", "created_at"),  # 曲目下的乐谱列表
+    )
 
 class User(Base):
     """用户表"""
@@ -56,7 +76,7 @@ class SheetMusicProject(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # 允许匿名用户
-    song_name = Column(String(200), ForeignKey("songs.name"), nullable=True)  # 关联曲目
+    song_id = Column(Integer, ForeignKey("songs.id"), nullable=True)  # 关联曲目
     title = Column(String(200), nullable=False)
     description = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -74,15 +94,18 @@ class SheetPage(Base):
     __tablename__ = "sheet_pages"
 
     id = Column(Integer, primary_key=True, index=True)
-    project_id = Column(Integer, ForeignKey("sheet_music_projects.id"), nullable=False)
+    project_id = Column(Integer, ForeignKey("sheet_music_projects.id"), nullable=True)
+    solo_id = Column(Integer, ForeignKey("solos.id"), nullable=True, index=True)  # 多页PDF乐谱按页识别时关联的单奏乐谱
     page_number = Column(Integer, nullable=False)
     original_image_path = Column(String(500))
     musicxml_path = Column(String(500))
+    content_hash = Column(String(40))  # 页面内容哈希，用于只重新识别有变化的页
     status = Column(String(20), default="uploaded")  # uploaded, processed, failed
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # 关系
     project = relationship("SheetMusicProject", back_populates="pages")
+    solo = relationship("Solo", back_populates="pages")
 
 class GeneratedAudio(Base):
     """生成音频表"""
@@ -103,7 +126,7 @@ class PerformanceRecording(Base):
     __tablename__ = "performance_recordings"
 
     id = Column(Integer, primary_key=True, index=True)
-    song_name = Column(String(200), ForeignKey("songs.name"), nullable=False)
+    song_id = Column(Integer, ForeignKey("songs.id"), nullable=False)  # 关联曲目
     performer_name = Column(String(100), nullable=False)
     instrument = Column(String(100), nullable=False)  # 乐器类型
     audio_path = Column(String(500), nullable=False)
@@ -115,6 +138,12 @@ class PerformanceRecording(Base):
     song = relationship("Song", back_populates="recordings")
     scores = relationship("PerformanceScore", back_populates="recording", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_recordings_song_created", "song_id", "created_at"),  # 曲目下的录音列表
+        # 已归档录音的ID仍由存根和归档库使用，不能分配给新录音
+        {"sqlite_autoincrement": True},
+    )
+
 class PerformanceScore(Base):
     """演奏评分表"""
     __tablename__ = "performance_scores"
@@ -131,7 +160,7 @@ class PerformanceScore(Base):
     rhythm_error = Column(Float)
     rhythm_stability_error = Column(Float)  # 节奏稳定性误差
     suggestions = Column(JSON)  # 存储建议列表
-    segment_scores = Column(JSON)  # 存储分段评分数据
+    segment_scores = Column(JSON)  # 旧字段，未使用；分段评分见 ScoreSegments
     chart_path = Column(String(500))
     reference_audio_path = Column(String(500))  # 参考音频文件路径
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -140,4 +169,87 @@ class PerformanceScore(Base):
     recording = relationship("PerformanceRecording", back_populates="scores")
     project = relationship("SheetMusicProject", back_populates="scores")
     user = relationship("User", back_populates="scores")
-    reference_solo = relationship("Solo", foreign_keys=[reference_solo_id])
\ No newline at end of file
+    reference_solo = relationship("Solo", foreign_keys=[reference_solo_id])
+    segments = relationship("ScoreSegments", back_populates="score", uselist=False, cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_scores_recording_created", "recording_id", "created_at"),  # 录音的评分记录（最新在前）
+        Index("ix_scores_project_created", "project_id", "created_at"),
+        Index("ix_scores_user_created", "user_id", "created_at"),
+        # 已归档评分的ID仍在归档库中使用，不能分配给新评分
+        {"sqlite_autoincrement": True},
+    )
+
+class ScoreSegments(Base):
+    """
+    评分的分段数据表（每个时间段的音准、节奏分数）
+    数组编码为二进制（见 database/segments.py），单独成表，列表查询评分时不会读取
+    """
+    __tablename__ = "score_segments"
+
+    score_id = Column(Integer, ForeignKey("performance_scores.id"), primary_key=True)
+    segment_size = Column(Integer)  # 每段包含的对齐帧数
+    segment_count = Column(Integer, nullable=False)
+    dtype = Column(String(10), nullable=False)  # 数组的 numpy 类型，如 "<f2"（float16）
+    pitch = Column(LargeBinary, nullable=False)  # 音准分段分数
+    rhythm = Column(LargeBinary, nullable=False)  # 节奏分段分数
+
+    # 关系
+    score = relationship("PerformanceScore", back_populates="segments")
+
+class ArchivedRecording(Base):
+    """
+    已归档录音的存根
+    录音、评分和分段数据已移到归档数据库，文件已压缩到归档目录（见 database/archive.py），
+    在线库只保留列表显示所需的信息，恢复时按录音ID取回
+    """
+    __tablename__ = "archived_recordings"
+
+    id = Column(Integer, primary_key=True)  # 原录音ID
+    song_id = Column(Integer, ForeignKey("songs.id"), nullable=False)
+    performer_name = Column(String(100), nullable=False)
+    instrument = Column(String(100), nullable=False)
+    original_filename = Column(String(255))
+    overall_score = Column(Integer)  # 归档时最新一次评分的综合评分
+    score_count = Column(Integer, nullable=False, default=0)  # 归档的评分数量
+    created_at = Column(DateTime(timezone=True))  # 录音的上传时间
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # 关系
+    song = relationship("Song", back_populates="archived_recordings")
+
+    __table_args__ = (
+        Index("ix_archived_recordings_song_created", "song_id", "created_at"),  # 曲目下的已归档录音
+    )
+
+class LeaderboardEntry(Base):
+    """
+    排行榜：每首曲目、每种乐器下每位演奏者的最高分、最近一次得分和平均分
+    创建评分时在同一事务中增量更新，删除、归档录音时按该演奏者的评分重新计算（见 database/crud.py），
+    排行榜按索引直接读取前 N 名，不必汇总评分表
+    """
+    __tablename__ = "leaderboard_entries"
+
+    id = Column(Integer, primary_key=True)
+    song_id = Column(Integer, ForeignKey("songs.id"), nullable=False)
+    instrument = Column(String(100), nullable=False)  # 录音的乐器
+    performer_name = Column(String(100), nullable=False)
+    best_score = Column(Integer, nullable=False)  # 最高综合评分
+    best_score_at = Column(DateTime(timezone=True))  # 第一次达到最高分的评分时间
+    latest_score = Column(Integer, nullable=False)  # 最近一次综合评分
+    score_total = Column(Integer, nullable=False, default=0)  # 综合评分之和（平均分 = 总和 / 次数）
+    score_count = Column(Integer, nullable=False, default=0)
+    latest_score_at = Column(DateTime(timezone=True))
+
+    # 关系
+    song = relationship("Song", back_populates="leaderboard_entries")
+
+    __table_args__ = (
+        Index("ix_leaderboard_performer", "song_id", "instrument", "performer_name", unique=True),  # 每人一条
+        # 按最高分取前 N 名：最高分降序、同分时先达到的在前，与索引顺序一致，不需要额外排序
+        Index("ix_leaderboard_song_instrument_best", song_id, instrument, best_score.desc(), best_score_at),
+    )
+
+    @property
+    def average_score(self) -> float:
+        return round(self.score_total / self.score_count, 1) if self.score_count else 0
@@ -0,0 +1,99 @@
+"""
+曲目全文搜索（SQLite FTS5）
+
+songs_fts 为 FTS5 虚拟表，索引曲目的名称、作曲家、类型和简介，由 songs 表上的触发器保持同步。
+索引行的 rowid 与曲目ID相同，搜索结果按 rowid 直接关联到 songs 表。
+
+默认的 unicode61 分词器把连续的中文当作一个词，前缀搜索能匹配"茉莉"→"茉莉花"，
+但不能匹配词中间的"莉花"，这种情况由 crud.search_songs 退回到名称的子串匹配。
+"""
+from sqlalchemy import column, func, literal_column, table, text
+
+SONG_SEARCH_TABLE = "songs_fts"
+
+# 搜索索引的列（与 songs 表同名）
+SONG_SEARCH_COLUMNS = ("name", "composer", "genre", "description")
+
+# 排序时各列的权重（bm25），名称匹配最重要
+SONG_SEARCH_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+# 建索引的语句，prefix 为 2、3 字前缀建立额外索引，加快短前缀搜索
+SONG_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(
+        name, composer, genre, description,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS songs_fts_insert AFTER INSERT ON songs BEGIN
+        INSERT INTO songs_fts (rowid, name, composer, genre, description)
+        VALUES (new.id, new.name, new.composer, new.genre, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS songs_fts_delete AFTER DELETE ON songs BEGIN
+        DELETE FROM songs_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS songs_fts_update AFTER UPDATE OF name, composer, genre, description ON songs BEGIN
+        DELETE FROM songs_fts WHERE rowid = old.id;
+        INSERT INTO songs_fts (rowid, name, composer, genre, description)
+        VALUES (new.id, new.name, new.composer, new.genre, new.description);
+    END
+    """,
+]
+
+SONG_SEARCH_OBJECTS = (SONG_SEARCH_TABLE, "songs_fts_insert", "songs_fts_delete", "songs_fts_update")
+
+# 按 songs 表重建索引内容
+SONG_SEARCH_REBUILD = [
+    "DELETE FROM songs_fts",
+    "INSERT INTO songs_fts (rowid, name, composer, genre, description) "
+    "SELECT id, name, composer, genre, description FROM songs",
+]
+
+# 供查询使用的表结构
+songs_fts = table(SONG_SEARCH_TABLE, column("rowid"), *(column(name) for name in SONG_SEARCH_COLUMNS))
+
+
+def create_song_search_index(connection) -> bool:
+    """
+    创建搜索索引和同步触发器（已存在时跳过）
+    索引表或任一触发器原本缺失时（新建、或删表重建了 songs），按 songs 表重建索引内容。
+    connection 为 SQLAlchemy 连接，返回是否重建了索引。
+    """
+    names = ", ".join(f"'{name}'" for name in SONG_SEARCH_OBJECTS)
+    existing = connection.execute(text(f"SELECT count(*) FROM sqlite_master WHERE name IN ({names})")).scalar()
+
+    for statement in SONG_SEARCH_DDL:
+        connection.execute(text(statement))
+    if existing == len(SONG_SEARCH_OBJECTS):
+        return False
+
+    for statement in SONG_SEARCH_REBUILD:
+        connection.execute(text(statement))
+    return True
+
+
+def build_match_query(search_term: str):
+    """
+    把用户输入转换为 FTS5 查询：按空白拆分，每个词作为前缀匹配，多个词同时满足
+    输入中的引号、运算符都按普通字符处理。没有可搜索的内容时返回 None。
+    """
+    terms = search_term.split()
+    if not terms:
+        return None
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+
+def songs_fts_match(match_query: str):
+    """songs_fts MATCH 条件"""
+    return literal_column(SONG_SEARCH_TABLE).op("MATCH")(match_query)
+
+
+def songs_fts_rank():
+    """相关度排序表达式（bm25 越小越相关）"""
+    return func.bm25(literal_column(SONG_SEARCH_TABLE), *SONG_SEARCH_WEIGHTS)
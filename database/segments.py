@@ -0,0 +1,21 @@
+"""
+评分分段数据的二进制编码
+
+分段评分（每个时间段的音准、节奏分数，0~100）按定长数值数组保存为 BLOB，
+默认使用 float16（每个值 2 字节，0~100 范围内精度约 0.06 分），比 JSON 文本小一个数量级，
+读取时直接按类型还原为 numpy 数组，不需要逐个解析文本。
+"""
+import numpy as np
+
+# 默认存储类型：小端 float16
+SEGMENT_DTYPE = "<f2"
+
+
+def encode_segment_scores(values, dtype: str = SEGMENT_DTYPE) -> bytes:
+    """把分数序列编码为二进制数组"""
+    return np.asarray(values, dtype=np.float64).astype(dtype).tobytes()
+
+
+def decode_segment_scores(data: bytes, dtype: str = SEGMENT_DTYPE) -> np.ndarray:
+    """把二进制数组还原为 float32 的 numpy 数组"""
+    return np.frombuffer(data, dtype=dtype).astype(np.float32)
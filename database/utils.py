@@ -79,16 +79,27 @@ def cleanup_project_files(project_id: int, db: Session):
             print(f"删除文件失败 {file_path}: {e}")
 
 def backup_database(backup_path: str = "data/backup"):
-    """备份数据库"""
-    import shutil
+    """
+    备份数据库
+    WAL 模式下最近提交的数据可能还在 -wal 文件中，直接复制数据库文件会丢失这些数据，
+    因此使用 SQLite 的在线备份接口。
+    """
+    import sqlite3
     from datetime import datetime
+    from database.models.base import engine
 
     os.makedirs(backup_path, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     backup_file = os.path.join(backup_path, f"music_evaluator_{timestamp}.db")
 
     try:
-        shutil.copy2("data/music_evaluator.db", backup_file)
+        source = sqlite3.connect(engine.url.database)
+        target = sqlite3.connect(backup_file)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
         print(f"✅ 数据库备份成功: {backup_file}")
         return backup_file
     except Exception as e:
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：曲目列表分页索引
+曲目列表按 (created_at, name) 键集分页，用 ix_songs_created_name 替换只包含 created_at 的 ix_songs_created_at。
+录音列表分页使用已有的 ix_recordings_song_created（索引中已包含录音ID）。
+
+需要先执行 migrate_add_query_indexes.py
+"""
+import sqlite3
+import os
+
+DB_PATH = "data/music_evaluator.db"
+
+def migrate():
+    """执行数据库迁移"""
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return False
+
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        existing = {row[0] for row in cursor.fetchall()}
+
+        if "ix_songs_created_name" in existing:
+            print("✅ 索引 ix_songs_created_name 已存在，无需迁移")
+        else:
+            print("🔄 正在创建索引 ix_songs_created_name ON songs (created_at, name)...")
+            cursor.execute("CREATE INDEX IF NOT EXISTS ix_songs_created_name ON songs (created_at, name)")
+
+        if "ix_songs_created_at" in existing:
+            print("🔄 正在删除被替代的索引 ix_songs_created_at...")
+            cursor.execute("DROP INDEX ix_songs_created_at")
+
+        cursor.execute("ANALYZE")
+
+        conn.commit()
+        print("✅ 数据库迁移成功！")
+
+        conn.close()
+        return True
+
+    except Exception as e:
+        print(f"❌ 数据库迁移失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("数据库迁移：曲目列表分页索引")
+    print("=" * 60)
+    print()
+
+    success = migrate()
+
+    print()
+    if success:
+        print("✅ 迁移完成！")
+    else:
+        print("❌ 迁移失败，请检查错误信息。")
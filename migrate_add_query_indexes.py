@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：为常用查询添加索引
+- 曲目列表按创建时间排序
+- 按曲目（+乐器）查找乐谱、曲目下的乐谱列表
+- 曲目下的录音列表（按创建时间倒序）
+- 录音/项目/用户的评分记录（按创建时间倒序）
+
+索引名称与 database/models/models.py 中的定义一致。
+"""
+import sqlite3
+import os
+
+DB_PATH = "data/music_evaluator.db"
+
+INDEXES = [
+    ("ix_songs_created_at", "songs", "created_at"),
+    ("ix_solos_song_instrument", "solos", "song_name, instrument"),
+    ("ix_solos_song_created", "solos", "song_name, created_at"),
+    ("ix_recordings_song_created", "performance_recordings", "song_name, created_at"),
+    ("ix_scores_recording_created", "performance_scores", "recording_id, created_at"),
+    ("ix_scores_project_created", "performance_scores", "project_id, created_at"),
+    ("ix_scores_user_created", "performance_scores", "user_id, created_at"),
+]
+
+def migrate():
+    """执行数据库迁移"""
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return False
+
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+
+        # 检查已有索引
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+        existing = {row[0] for row in cursor.fetchall()}
+
+        for index_name, table, columns in INDEXES:
+            if index_name in existing:
+                print(f"✅ 索引 {index_name} 已存在，无需迁移")
+                continue
+
+            print(f"🔄 正在创建索引 {index_name} ON {table} ({columns})...")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})")
+
+        # 更新统计信息，让查询规划器使用新索引
+        cursor.execute("ANALYZE")
+
+        conn.commit()
+        print("✅ 数据库迁移成功！")
+
+        conn.close()
+        return True
+
+    except Exception as e:
+        print(f"❌ 数据库迁移失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("数据库迁移：为常用查询添加索引")
+    print("=" * 60)
+    print()
+
+    success = migrate()
+
+    print()
+    if success:
+        print("✅ 迁移完成！")
+    else:
+        print("❌ 迁移失败，请检查错误信息。")
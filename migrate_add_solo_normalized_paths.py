@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：为 solos 表添加 normalized_xml_path 和 midi_path 字段
+"""
+import sqlite3
+import os
+
+DB_PATH = "data/music_evaluator.db"
+
+NEW_COLUMNS = [
+    ("normalized_xml_path", "VARCHAR(500)"),
+    ("midi_path", "VARCHAR(500)"),
+]
+
+def migrate():
+    """执行数据库迁移"""
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return False
+
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+
+        # 检查字段是否已存在
+        cursor.execute("PRAGMA table_info(solos)")
+        columns = [col[1] for col in cursor.fetchall()]
+
+        for column_name, column_type in NEW_COLUMNS:
+            if column_name in columns:
+                print(f"✅ 字段 {column_name} 已存在，无需迁移")
+                continue
+
+            print(f"🔄 正在添加 {column_name} 字段...")
+            cursor.execute(f"ALTER TABLE solos ADD COLUMN {column_name} {column_type}")
+
+        conn.commit()
+        print("✅ 数据库迁移成功！")
+        print("   - solos 表已包含 normalized_xml_path、midi_path 字段")
+        print("   - 旧乐谱会在下次生成MP3时自动完成规范化")
+
+        conn.close()
+        return True
+
+    except Exception as e:
+        print(f"❌ 数据库迁移失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("数据库迁移：添加乐谱规范化文件字段")
+    print("=" * 60)
+    print()
+
+    success = migrate()
+
+    print()
+    if success:
+        print("✅ 迁移完成！")
+    else:
+        print("❌ 迁移失败，请检查错误信息。")
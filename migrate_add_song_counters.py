@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：为 songs 表添加计数字段
+- solo_count:      乐谱数量
+- recording_count: 录音数量
+- latest_score_at: 最近一次评分时间
+
+添加字段后按现有数据计算初始值；之后由 database/crud.py 在增删乐谱、录音、评分时维护。
+重复执行会按现有数据重新计算，可用于修复计数。
+"""
+import sqlite3
+import os
+
+DB_PATH = "data/music_evaluator.db"
+
+NEW_COLUMNS = [
+    ("solo_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("recording_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("latest_score_at", "DATETIME"),
+]
+
+# {fk}/{key}：乐谱、录音关联曲目的字段（执行 migrate_song_integer_ids.py 前为 song_name/name）
+RECOUNT_SQL = """
+    UPDATE songs SET
+        solo_count = (SELECT count(*) FROM solos WHERE solos.{fk} = songs.{key}),
+        recording_count = (SELECT count(*) FROM performance_recordings
+                           WHERE performance_recordings.{fk} = songs.{key}),
+        latest_score_at = (SELECT max(performance_scores.created_at)
+                           FROM performance_scores
+                           JOIN performance_recordings
+                             ON performance_recordings.id = performance_scores.recording_id
+                           WHERE performance_recordings.{fk} = songs.{key})
+"""
+
+def migrate():
+    """执行数据库迁移"""
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return False
+
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+
+        # 检查字段是否已存在
+        cursor.execute("PRAGMA table_info(songs)")
+        columns = [col[1] for col in cursor.fetchall()]
+
+        for name, definition in NEW_COLUMNS:
+            if name in columns:
+                print(f"✅ 字段 {name} 已存在")
+                continue
+            print(f"🔄 正在添加 {name} 字段...")
+            cursor.execute(f"ALTER TABLE songs ADD COLUMN {name} {definition}")
+
+        print("🔄 正在按现有数据计算计数...")
+        cursor.execute("PRAGMA table_info(solos)")
+        if "song_id" in [col[1] for col in cursor.fetchall()]:
+            cursor.execute(RECOUNT_SQL.format(fk="song_id", key="id"))
+        else:
+            cursor.execute(RECOUNT_SQL.format(fk="song_name", key="name"))
+        updated = cursor.rowcount
+
+        conn.commit()
+        print("✅ 数据库迁移成功！")
+        print(f"   - 已更新 {updated} 首曲目的乐谱数量、录音数量和最近评分时间")
+
+        conn.close()
+        return True
+
+    except Exception as e:
+        print(f"❌ 数据库迁移失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("数据库迁移：曲目计数字段")
+    print("=" * 60)
+    print()
+
+    success = migrate()
+
+    print()
+    if success:
+        print("✅ 迁移完成！")
+    else:
+        print("❌ 迁移失败，请检查错误信息。")
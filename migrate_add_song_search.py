@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：曲目全文搜索索引
+创建 FTS5 虚拟表 songs_fts 及 songs 表上的同步触发器，并导入现有曲目。
+建表语句与 database/search.py 相同（新数据库由 init_db 自动创建）。
+
+索引行的 rowid 与曲目ID相同，需要在 migrate_song_integer_ids.py 之后执行；
+songs 表还没有整数主键时不做任何修改。建表、触发器和导入在同一事务中完成，失败时全部回滚。
+"""
+import sqlite3
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database.search import SONG_SEARCH_DDL, SONG_SEARCH_REBUILD, SONG_SEARCH_TABLE
+
+DB_PATH = "data/music_evaluator.db"
+
+def table_columns(cursor, table_name):
+    cursor.execute(f"PRAGMA table_info({table_name})")
+    return [col[1] for col in cursor.fetchall()]
+
+def migrate():
+    """执行数据库迁移"""
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return False
+
+    conn = None
+    try:
+        # 手动控制事务，建表、触发器也包含在同一事务中
+        conn = sqlite3.connect(DB_PATH, isolation_level=None)
+        cursor = conn.cursor()
+
+        if "id" not in table_columns(cursor, "songs"):
+            print("❌ songs 表还没有整数主键（搜索索引按曲目ID关联），请先执行 migrate_song_integer_ids.py")
+            conn.close()
+            return False
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE name = ?", (SONG_SEARCH_TABLE,))
+        if cursor.fetchone():
+            print(f"ℹ️ {SONG_SEARCH_TABLE} 已存在，补齐触发器并重建索引内容")
+
+        cursor.execute("BEGIN")
+        print("🔄 正在创建搜索索引和同步触发器...")
+        for statement in SONG_SEARCH_DDL:
+            cursor.execute(statement)
+
+        print("🔄 正在导入现有曲目...")
+        for statement in SONG_SEARCH_REBUILD:
+            cursor.execute(statement)
+
+        cursor.execute(f"SELECT count(*) FROM {SONG_SEARCH_TABLE}")
+        count = cursor.fetchone()[0]
+
+        cursor.execute("COMMIT")
+        print(f"✅ 数据库迁移成功！已索引 {count} 首曲目")
+
+        conn.close()
+        return True
+
+    except Exception as e:
+        if conn is not None:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            conn.close()
+        if "fts5" in str(e).lower():
+            print(f"❌ 数据库迁移失败（SQLite 需要支持 FTS5）: {e}")
+        else:
+            print(f"❌ 数据库迁移失败，已回滚: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("数据库迁移：曲目全文搜索索引")
+    print("=" * 60)
+    print()
+
+    success = migrate()
+
+    print()
+    if success:
+        print("✅ 迁移完成！")
+    else:
+        print("❌ 迁移失败，请检查错误信息。")
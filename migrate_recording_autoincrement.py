@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：录音、评分表的主键改为 AUTOINCREMENT
+- performance_recordings、performance_scores 按模型重建（INTEGER PRIMARY KEY AUTOINCREMENT）
+- 自增序列从 在线库、归档存根、归档数据库 中出现过的最大ID开始
+
+不加 AUTOINCREMENT 时 SQLite 会把已删除的最大ID再分配给新记录；录音归档后（见 database/archive.py）
+其ID仍由存根和归档数据库使用，被新录音占用后既无法恢复，再次归档时还会冲突。
+
+SQLite 不能修改主键定义，按 SQLite 文档的步骤重建表：按模型建新表、复制数据、删除旧表、新表改名，
+全部在一个事务中完成，ID 保持不变。需要在 migrate_song_integer_ids.py 之后执行；执行前请备份数据库。
+"""
+import sqlite3
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.schema import CreateIndex, CreateTable
+from database.models.models import PerformanceRecording, PerformanceScore
+from config.settings import ARCHIVE_DATABASE_PATH
+
+DB_PATH = "data/music_evaluator.db"
+
+TABLES = [PerformanceRecording.__table__, PerformanceScore.__table__]
+
+def table_exists(cursor, table_name):
+    cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+    return cursor.fetchone()[0] > 0
+
+def uses_autoincrement(cursor, table_name):
+    cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,))
+    row = cursor.fetchone()
+    return row is not None and "AUTOINCREMENT" in row[0].upper()
+
+def table_columns(cursor, table_name):
+    cursor.execute(f"PRAGMA table_info({table_name})")
+    return [col[1] for col in cursor.fetchall()]
+
+def replace_table(cursor, table):
+    """按模型建 <表名>_new，复制数据，删除旧表后把新表改为原名，再按模型建索引"""
+    ddl = str(CreateTable(table).compile(dialect=sqlite_dialect.dialect()))
+    cursor.execute(ddl.replace(f"CREATE TABLE {table.name} (", f"CREATE TABLE {table.name}_new (", 1))
+    old_columns = set(table_columns(cursor, table.name))
+    columns = ", ".join(col.name for col in table.columns if col.name in old_columns)
+    cursor.execute(f"INSERT INTO {table.name}_new ({columns}) SELECT {columns} FROM {table.name}")
+    copied = cursor.rowcount
+    cursor.execute(f"DROP TABLE {table.name}")
+    cursor.execute(f"ALTER TABLE {table.name}_new RENAME TO {table.name}")
+    for index in table.indexes:
+        cursor.execute(str(CreateIndex(index).compile(dialect=sqlite_dialect.dialect())))
+    return copied
+
+def archived_max_ids():
+    """归档数据库中录音、评分的最大ID，{表名: 最大ID}"""
+    if not os.path.exists(ARCHIVE_DATABASE_PATH):
+        return {}
+    conn = sqlite3.connect(ARCHIVE_DATABASE_PATH)
+    try:
+        cursor = conn.cursor()
+        return {
+            table.name: cursor.execute(f"SELECT max(id) FROM {table.name}").fetchone()[0] or 0
+            for table in TABLES if table_exists(cursor, table.name)
+        }
+    finally:
+        conn.close()
+
+def raise_sequence(cursor, table_name, value):
+    """自增序列至少为 value（之后分配的ID都大于 value）"""
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table_name,))
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (table_name, value))
+    elif row[0] < value:
+        cursor.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (value, table_name))
+
+def migrate():
+    """执行数据库迁移"""
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return False
+
+    conn = None
+    try:
+        # 手动控制事务，建表、删表也包含在同一事务中
+        conn = sqlite3.connect(DB_PATH, isolation_level=None)
+        cursor = conn.cursor()
+
+        if "id" not in table_columns(cursor, "songs"):
+            print("❌ songs 表还没有整数主键，请先执行 migrate_song_integer_ids.py")
+            conn.close()
+            return False
+
+        pending = [table for table in TABLES if not uses_autoincrement(cursor, table.name)]
+        max_ids = archived_max_ids()
+        if table_exists(cursor, "archived_recordings"):
+            cursor.execute("SELECT max(id) FROM archived_recordings")
+            stub_max = cursor.fetchone()[0] or 0
+            max_ids[PerformanceRecording.__tablename__] = max(max_ids.get(PerformanceRecording.__tablename__, 0), stub_max)
+
+            # 迁移前已被新录音占用的归档ID无法自动修复，只提示
+            cursor.execute("""
+                SELECT archived_recordings.id FROM archived_recordings
+                JOIN performance_recordings ON performance_recordings.id = archived_recordings.id
+            """)
+            reused = [row[0] for row in cursor.fetchall()]
+            if reused:
+                print(f"⚠️ 归档录音 {reused} 的ID已被新录音占用，这些录音需要手动处理后才能恢复")
+
+        # 重建期间外键暂时指向被删除的旧表
+        cursor.execute("PRAGMA foreign_keys = OFF")
+        cursor.execute("BEGIN")
+
+        for table in pending:
+            print(f"🔄 正在重建 {table.name} 表...")
+            copied = replace_table(cursor, table)
+            print(f"   - {copied} 条记录")
+        for table in TABLES:
+            cursor.execute(f"SELECT max(id) FROM {table.name}")
+            live_max = cursor.fetchone()[0] or 0
+            raise_sequence(cursor, table.name, max(live_max, max_ids.get(table.name, 0)))
+
+        cursor.execute("PRAGMA foreign_key_check")
+        violations = cursor.fetchall()
+        if violations:
+            cursor.execute("ROLLBACK")
+            print(f"❌ 外键检查失败，已回滚: {violations[:5]}")
+            conn.close()
+            return False
+
+        cursor.execute("COMMIT")
+        cursor.execute("PRAGMA foreign_keys = ON")
+        if pending:
+            cursor.execute("ANALYZE")
+            print("✅ 数据库迁移成功！")
+        else:
+            print("✅ 录音、评分表已使用 AUTOINCREMENT，已核对自增序列")
+
+        conn.close()
+        return True
+
+    except Exception as e:
+        if conn is not None:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            conn.close()
+        print(f"❌ 数据库迁移失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("数据库迁移：录音、评分表的主键改为 AUTOINCREMENT")
+    print("=" * 60)
+    print()
+
+    success = migrate()
+
+    print()
+    if success:
+        print("✅ 迁移完成！")
+    else:
+        print("❌ 迁移失败，请检查错误信息。")
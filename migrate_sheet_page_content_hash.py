@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：为 sheet_pages 表添加 content_hash 字段
+记录每页的内容哈希，重新上传多页PDF时只重新识别内容有变化的页
+
+需要先执行 migrate_sheet_pages_for_solos.py
+"""
+import sqlite3
+import os
+
+DB_PATH = "data/music_evaluator.db"
+
+def migrate():
+    """执行数据库迁移"""
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return False
+
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+
+        # 检查字段是否已存在
+        cursor.execute("PRAGMA table_info(sheet_pages)")
+        columns = [col[1] for col in cursor.fetchall()]
+
+        if not columns:
+            print("✅ sheet_pages 表不存在，启动应用时会按新结构创建")
+            conn.close()
+            return True
+
+        if "content_hash" in columns:
+            print("✅ 字段 content_hash 已存在，无需迁移")
+            conn.close()
+            return True
+
+        print("🔄 正在添加 content_hash 字段...")
+        cursor.execute("ALTER TABLE sheet_pages ADD COLUMN content_hash VARCHAR(40)")
+
+        conn.commit()
+        print("✅ 数据库迁移成功！")
+        print("   - sheet_pages 表已包含 content_hash 字段")
+        print("   - 已有页面会在下次识别时记录内容哈希")
+
+        conn.close()
+        return True
+
+    except Exception as e:
+        print(f"❌ 数据库迁移失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("数据库迁移：记录乐谱页面内容哈希")
+    print("=" * 60)
+    print()
+
+    success = migrate()
+
+    print()
+    if success:
+        print("✅ 迁移完成！")
+    else:
+        print("❌ 迁移失败，请检查错误信息。")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：让 sheet_pages 表可以记录单奏乐谱（多页PDF）的分页识别结果
+- 新增 solo_id 字段（关联 solos 表）
+- project_id 改为可空
+
+SQLite 不支持修改字段约束，这里按新结构重建 sheet_pages 表并复制原有数据。
+"""
+import sqlite3
+import os
+
+DB_PATH = "data/music_evaluator.db"
+
+CREATE_TABLE_SQL = """
+CREATE TABLE sheet_pages_new (
+    id INTEGER NOT NULL,
+    project_id INTEGER,
+    solo_id INTEGER,
+    page_number INTEGER NOT NULL,
+    original_image_path VARCHAR(500),
+    musicxml_path VARCHAR(500),
+    status VARCHAR(20),
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id),
+    FOREIGN KEY(project_id) REFERENCES sheet_music_projects (id),
+    FOREIGN KEY(solo_id) REFERENCES solos (id)
+)
+"""
+
+def migrate():
+    """执行数据库迁移"""
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return False
+
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
+
+        # 检查字段是否已存在
+        cursor.execute("PRAGMA table_info(sheet_pages)")
+        columns = [col[1] for col in cursor.fetchall()]
+
+        if not columns:
+            print("✅ sheet_pages 表不存在，启动应用时会按新结构创建")
+            conn.close()
+            return True
+
+        if "solo_id" in columns:
+            print("✅ 字段 solo_id 已存在，无需迁移")
+            conn.close()
+            return True
+
+        print("🔄 正在重建 sheet_pages 表...")
+        cursor.execute(CREATE_TABLE_SQL)
+        cursor.execute("""
+            INSERT INTO sheet_pages_new (id, project_id, page_number, original_image_path,
+                                         musicxml_path, status, created_at)
+            SELECT id, project_id, page_number, original_image_path, musicxml_path, status, created_at
+            FROM sheet_pages
+        """)
+        cursor.execute("DROP TABLE sheet_pages")
+        cursor.execute("ALTER TABLE sheet_pages_new RENAME TO sheet_pages")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_sheet_pages_id ON sheet_pages (id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS ix_sheet_pages_solo_id ON sheet_pages (solo_id)")
+
+        conn.commit()
+        print("✅ 数据库迁移成功！")
+        print("   - sheet_pages 表已包含 solo_id 字段，project_id 可为空")
+        print("   - 多页PDF乐谱会在下次识别时记录每页的识别状态")
+
+        conn.close()
+        return True
+
+    except Exception as e:
+        print(f"❌ 数据库迁移失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("数据库迁移：记录单奏乐谱的分页识别结果")
+    print("=" * 60)
+    print()
+
+    success = migrate()
+
+    print()
+    if success:
+        print("✅ 迁移完成！")
+    else:
+        print("❌ 迁移失败，请检查错误信息。")
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+数据库迁移脚本：曲目改用整数主键
+- songs 表新增整数主键 id，name 保留为唯一索引列
+- solos、performance_recordings、sheet_music_projects 的 song_name 外键改为 song_id（整数）
+- 重建曲目全文搜索索引（索引行的 rowid 与曲目ID相同）
+
+SQLite 不能修改主键和外键，按 SQLite 文档的步骤重建表：按模型建新表、复制数据、删除旧表、新表改名，
+全部在一个事务中完成。乐谱、录音、项目的ID保持不变，引用它们的表（乐谱页面、评分）无需修改。
+重建后的表结构、索引与 database/models/models.py 一致，曲目计数字段按现有数据重新计算。
+
+需要在其他迁移脚本之后执行（migrate_add_song_search.py、migrate_recording_autoincrement.py 除外，
+它们依赖整数主键，在本脚本之后执行；顺序见 README）；执行前请备份数据库。
+"""
+import sqlite3
+import os
+import sys
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.schema import CreateIndex, CreateTable
+from database.models.models import Song, Solo, PerformanceRecording, SheetMusicProject
+from database.search import SONG_SEARCH_DDL, SONG_SEARCH_REBUILD, SONG_SEARCH_OBJECTS, SONG_SEARCH_TABLE
+
+DB_PATH = "data/music_evaluator.db"
+
+# 通过 song_name 引用曲目的表
+CHILD_TABLES = [Solo.__table__, PerformanceRecording.__table__, SheetMusicProject.__table__]
+
+RECOUNT_SQL = """
+    UPDATE songs SET
+        solo_count = (SELECT count(*) FROM solos WHERE solos.song_id = songs.id),
+        recording_count = (SELECT count(*) FROM performance_recordings
+                           WHERE performance_recordings.song_id = songs.id),
+        latest_score_at = (SELECT max(performance_scores.created_at)
+                           FROM performance_scores
+                           JOIN performance_recordings
+                             ON performance_recordings.id = performance_scores.recording_id
+                           WHERE performance_recordings.song_id = songs.id)
+"""
+
+def table_columns(cursor, table_name):
+    cursor.execute(f"PRAGMA table_info({table_name})")
+    return [col[1] for col in cursor.fetchall()]
+
+def create_new_table(cursor, table):
+    """按模型创建 <表名>_new（不含索引）"""
+    ddl = str(CreateTable(table).compile(dialect=sqlite_dialect.dialect()))
+    cursor.execute(ddl.replace(f"CREATE TABLE {table.name} (", f"CREATE TABLE {table.name}_new (", 1))
+
+def replace_table(cursor, table, copy_sql):
+    """用 copy_sql 把数据写入新表，删除旧表后把新表改为原名，再按模型建索引"""
+    create_new_table(cursor, table)
+    cursor.execute(copy_sql)
+    copied = cursor.rowcount
+    cursor.execute(f"DROP TABLE {table.name}")
+    cursor.execute(f"ALTER TABLE {table.name}_new RENAME TO {table.name}")
+    for index in table.indexes:
+        cursor.execute(str(CreateIndex(index).compile(dialect=sqlite_dialect.dialect())))
+    return copied
+
+def find_orphans(cursor):
+    """song_name 在 songs 表中不存在的记录数，{表名: 数量}"""
+    orphans = {}
+    for table in CHILD_TABLES:
+        cursor.execute(f"""
+            SELECT count(*) FROM {table.name}
+            WHERE song_name IS NOT NULL AND song_name NOT IN (SELECT name FROM songs)
+        """)
+        count = cursor.fetchone()[0]
+        if count:
+            orphans[table.name] = count
+    return orphans
+
+def migrate():
+    """执行数据库迁移"""
+    if not os.path.exists(DB_PATH):
+        print(f"❌ 数据库文件不存在: {DB_PATH}")
+        return False
+
+    conn = None
+    try:
+        # 手动控制事务，建表、删表也包含在同一事务中
+        conn = sqlite3.connect(DB_PATH, isolation_level=None)
+        cursor = conn.cursor()
+
+        if "id" in table_columns(cursor, "songs"):
+            print("✅ songs 表已使用整数主键，无需迁移")
+            conn.close()
+            return True
+
+        orphans = find_orphans(cursor)
+        if orphans:
+            for table_name, count in orphans.items():
+                print(f"❌ {table_name} 中有 {count} 条记录引用了不存在的曲目，请先处理这些记录")
+            conn.close()
+            return False
+
+        cursor.execute(f"SELECT count(*) FROM sqlite_master WHERE name = '{SONG_SEARCH_TABLE}'")
+        had_search_index = cursor.fetchone()[0] > 0
+
+        # 重建期间旧外键暂时指向不存在的表
+        cursor.execute("PRAGMA foreign_keys = OFF")
+        cursor.execute("BEGIN")
+
+        # 1. 曲目：按 (创建时间, 名称) 顺序分配ID；删除旧表前先删除旧的搜索索引和触发器
+        for name in SONG_SEARCH_OBJECTS[1:]:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        cursor.execute(f"DROP TABLE IF EXISTS {SONG_SEARCH_TABLE}")
+
+        song_table = Song.__table__
+        old_columns = set(table_columns(cursor, "songs"))
+        columns = [col.name for col in song_table.columns if col.name in old_columns]
+        print(f"🔄 正在重建 songs 表（复制字段：{', '.join(columns)}）...")
+        copied = replace_table(cursor, song_table, f"""
+            INSERT INTO songs_new (id, {', '.join(columns)})
+            SELECT row_number() OVER (ORDER BY created_at, name), {', '.join(columns)} FROM songs
+        """)
+        print(f"   - {copied} 首曲目")
+
+        # 2. 引用曲目的表：song_name 换成对应的曲目ID，其余字段原样复制
+        for table in CHILD_TABLES:
+            old_columns = set(table_columns(cursor, table.name))
+            columns = [col.name for col in table.columns if col.name in old_columns]
+            missing = [col.name for col in table.columns if col.name not in old_columns and col.name != "song_id"]
+            print(f"🔄 正在重建 {table.name} 表...")
+            if missing:
+                print(f"   - 旧表缺少字段 {', '.join(missing)}，按默认值填充")
+            copied = replace_table(cursor, table, f"""
+                INSERT INTO {table.name}_new (song_id, {', '.join(columns)})
+                SELECT (SELECT id FROM songs WHERE songs.name = {table.name}.song_name), {', '.join(columns)}
+                FROM {table.name}
+            """)
+            print(f"   - {copied} 条记录")
+
+        # 3. 计数字段、搜索索引
+        print("🔄 正在按现有数据计算曲目计数...")
+        cursor.execute(RECOUNT_SQL)
+        if had_search_index:
+            print("🔄 正在重建曲目搜索索引...")
+            for statement in SONG_SEARCH_DDL + SONG_SEARCH_REBUILD:
+                cursor.execute(statement)
+
+        cursor.execute("PRAGMA foreign_key_check")
+        violations = cursor.fetchall()
+        if violations:
+            cursor.execute("ROLLBACK")
+            print(f"❌ 外键检查失败，已回滚: {violations[:5]}")
+            conn.close()
+            return False
+
+        cursor.execute("COMMIT")
+        cursor.execute("PRAGMA foreign_keys = ON")
+        # 更新统计信息，让查询规划器使用新索引
+        cursor.execute("ANALYZE")
+        print("✅ 数据库迁移成功！")
+
+        conn.close()
+        return True
+
+    except Exception as e:
+        if conn is not None:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            conn.close()
+        print(f"❌ 数据库迁移失败: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("数据库迁移：曲目改用整数主键")
+    print("=" * 60)
+    print()
+
+    success = migrate()
+
+    print()
+    if success:
+        print("✅ 迁移完成！")
+    else:
+        print("❌ 迁移失败，请检查错误信息。")
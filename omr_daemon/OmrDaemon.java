@@ -0,0 +1,156 @@
+import java.io.BufferedReader;
+import java.io.ByteArrayOutputStream;
+import java.io.FileOutputStream;
+import java.io.FileDescriptor;
+import java.io.InputStreamReader;
+import java.io.OutputStream;
+import java.io.PrintStream;
+import java.lang.reflect.InvocationTargetException;
+import java.lang.reflect.Method;
+import java.nio.charset.StandardCharsets;
+import java.security.Permission;
+
+/**
+ * 常驻 Audiveris 识别进程
+ *
+ * JVM 只启动一次，之后通过标准输入逐行接收任务，在同一进程内调用 Audiveris 的命令行入口，
+ * 省去每次识别的 JVM 启动、类加载以及 Tesseract/Leptonica 初始化开销。
+ *
+ * 协议（UTF-8，每行一条）：
+ *   输入：  输入文件路径 \t 输出目录
+ *   输出：  READY                 进程已就绪
+ *           LOG 日志行            任务过程中 Audiveris 的输出（逐行实时转发）
+ *           DONE 退出码           任务结束（0 表示成功）
+ *
+ * 由 utils/omr_daemon.py 编译和管理，不需要单独运行。
+ */
+public class OmrDaemon {
+
+    /** Audiveris 批处理结束时会调用 System.exit，这里把它转换成异常 */
+    private static class ExitTrappedException extends SecurityException {
+        final int status;
+
+        ExitTrappedException(int status) {
+            super("exit " + status);
+            this.status = status;
+        }
+    }
+
+    @SuppressWarnings("removal")
+    private static boolean installExitTrap() {
+        try {
+            System.setSecurityManager(new SecurityManager() {
+                @Override
+                public void checkExit(int status) {
+                    throw new ExitTrappedException(status);
+                }
+
+                @Override
+                public void checkPermission(Permission perm) {
+                    // 其他操作一律放行
+                }
+
+                @Override
+                public void checkPermission(Permission perm, Object context) {
+                    // 其他操作一律放行
+                }
+            });
+            return true;
+        } catch (UnsupportedOperationException | SecurityException e) {
+            // 新版本 JDK 不再支持 SecurityManager，Audiveris 退出时由 Python 端重启进程
+            return false;
+        }
+    }
+
+    /** 把写入的内容按行转发为 LOG 协议行，调用方可以实时看到识别进度 */
+    private static class LogForwarder extends OutputStream {
+        private final PrintStream protocol;
+        private final ByteArrayOutputStream line = new ByteArrayOutputStream();
+
+        LogForwarder(PrintStream protocol) {
+            this.protocol = protocol;
+        }
+
+        @Override
+        public synchronized void write(int b) {
+            if (b == '\n') {
+                flushLine();
+            } else if (b != '\r') {
+                line.write(b);
+            }
+        }
+
+        synchronized void flushLine() {
+            if (line.size() > 0) {
+                protocol.println("LOG " + line.toString(StandardCharsets.UTF_8));
+                line.reset();
+            }
+        }
+    }
+
+    private static int runJob(Method entry, String input, String output, PrintStream protocol) {
+        LogForwarder forwarder = new LogForwarder(protocol);
+        PrintStream capture = new PrintStream(forwarder, true, StandardCharsets.UTF_8);
+        PrintStream savedOut = System.out;
+        PrintStream savedErr = System.err;
+        System.setOut(capture);
+        System.setErr(capture);
+
+        int status;
+        try {
+            entry.invoke(null, (Object) new String[]{"-batch", "-export", "-output", output, input});
+            status = 0;
+        } catch (InvocationTargetException e) {
+            Throwable cause = e.getCause();
+            if (cause instanceof ExitTrappedException) {
+                status = ((ExitTrappedException) cause).status;
+            } else {
+                cause.printStackTrace(capture);
+                status = -1;
+            }
+        } catch (ExitTrappedException e) {
+            status = e.status;
+        } catch (Throwable e) {
+            e.printStackTrace(capture);
+            status = -1;
+        } finally {
+            System.setOut(savedOut);
+            System.setErr(savedErr);
+        }
+
+        capture.flush();
+        forwarder.flushLine();
+        protocol.println("DONE " + status);
+        return status;
+    }
+
+    public static void main(String[] args) throws Exception {
+        // 协议通道直接使用进程的标准输出，Audiveris 自身的输出在任务期间被捕获
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, StandardCharsets.UTF_8);
+        System.setOut(System.err);
+
+        // 预先加载 Audiveris 入口类，完成类加载和静态初始化
+        Method entry = Class.forName("Audiveris").getMethod("main", String[].class);
+        boolean trapped = installExitTrap();
+        if (!trapped) {
+            System.err.println("SecurityManager 不可用，Audiveris 退出时进程将随之结束");
+        }
+
+        BufferedReader reader = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        protocol.println("READY");
+
+        String line;
+        while ((line = reader.readLine()) != null) {
+            if (line.isEmpty()) {
+                continue;
+            }
+            String[] parts = line.split("\t", 2);
+            if (parts.length != 2) {
+                protocol.println("LOG 无效的任务: " + line);
+                protocol.println("DONE -1");
+                continue;
+            }
+            runJob(entry, parts[0], parts[1], protocol);
+        }
+    }
+}
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+按评分表重建排行榜
+
+排行榜（LeaderboardEntry）在创建、删除评分时自动更新，新建数据库或升级后首次启动时也会自动生成。
+绕过应用直接修改了评分、录音数据后，可用本脚本重新计算。
+
+用法：
+    PYTHONPATH=. python rebuild_leaderboard.py [--song-id ID]
+"""
+import sys
+import os
+import time
+import argparse
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database.models.base import SessionLocal, init_db
+from database.crud import rebuild_leaderboard
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按评分表重建排行榜")
+    parser.add_argument("--song-id", type=int, help="只重建指定曲目的排行榜")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("重建排行榜" + (f"：曲目 {args.song_id}" if args.song_id is not None else "：所有曲目"))
+    print("=" * 60)
+
+    # 已有数据库可能还没有排行榜表
+    init_db()
+
+    started = time.time()
+    db = SessionLocal()
+    try:
+        entries = rebuild_leaderboard(db, args.song_id)
+    finally:
+        db.close()
+    print(f"✅ 重建完成：{entries} 条排行榜记录，耗时 {time.time() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
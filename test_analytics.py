@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+测试脚本：评分统计（database/analytics.py）
+
+在临时数据库中写入评分，把 SQL 汇总结果与 Python 直接计算的结果对比，
+并确认统计过程中没有加载评分记录的 ORM 对象。
+
+运行：PYTHONPATH=. python test_analytics.py（也可以用 pytest 运行）
+"""
+import sys
+import os
+import math
+import random
+from datetime import datetime
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+from database.models.models import Song, PerformanceRecording, PerformanceScore
+from database import analytics
+from database.crud import get_user_stats
+from testing_utils import temp_database
+
+
+def seed_scores(db):
+    """写入随机评分，返回评分明细列表"""
+    rng = random.Random(42)
+    rows = []
+    for song_name in ("song0", "song1"):
+        song = Song(name=song_name)
+        db.add(song)
+        db.flush()
+        for instrument in ("flute", "violin"):
+            for _ in range(4):
+                recording = PerformanceRecording(song_id=song.id, performer_name="p",
+                                                 instrument=instrument, audio_path="a.mp3")
+                db.add(recording)
+                db.flush()
+                for _ in range(5):
+                    created_at = datetime(2025, rng.choice([1, 2]), rng.randint(1, 28), 12)
+                    score = rng.choice([rng.randint(0, 100), 100])
+                    user_id = rng.choice([1, 2, None])
+                    db.add(PerformanceScore(recording_id=recording.id, user_id=user_id,
+                                            overall_score=score, created_at=created_at))
+                    rows.append({"song": song.id, "instrument": instrument, "user": user_id,
+                                 "month": created_at.strftime("%Y-%m"), "score": score})
+    # 没有总分的评分不参与统计
+    db.add(PerformanceScore(recording_id=1, user_id=1, overall_score=None))
+    db.commit()
+    return rows
+
+
+def nearest_rank(scores, p):
+    ordered = sorted(scores)
+    return ordered[math.ceil(len(ordered) * p / 100) - 1]
+
+
+def expected_groups(rows, key):
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[key] if key else None, []).append(row["score"])
+    return groups
+
+
+def test_score_summary_matches_python():
+    with temp_database("analytics.db") as (engine, db, _):
+        rows = seed_scores(db)
+        for group_by, key in ((None, None), ("song", "song"), ("instrument", "instrument"),
+                              ("user", "user"), ("month", "month")):
+            summaries = analytics.score_summary(db, group_by, percentiles=(25, 50, 90, 100))
+            groups = expected_groups(rows, key)
+            assert {summary.group for summary in summaries} == set(groups), group_by
+            for summary in summaries:
+                scores = groups[summary.group]
+                assert summary.count == len(scores)
+                assert summary.average == round(sum(scores) / len(scores), 1)
+                assert (summary.minimum, summary.maximum) == (min(scores), max(scores))
+                for p, value in summary.percentiles.items():
+                    assert value == nearest_rank(scores, p), (group_by, summary.group, p)
+
+        # 过滤条件
+        summary, = analytics.score_summary(db, song_id=2, instrument="flute", user_id=2)
+        scores = [row["score"] for row in rows
+                  if row["song"] == 2 and row["instrument"] == "flute" and row["user"] == 2]
+        assert summary.count == len(scores)
+
+        february = analytics.score_summary(db, since=datetime(2025, 2, 1), until=datetime(2025, 3, 1))
+        assert february[0].count == sum(1 for row in rows if row["month"] == "2025-02")
+
+
+def test_score_histogram_matches_python():
+    with temp_database("analytics.db") as (engine, db, _):
+        rows = seed_scores(db)
+        bins = analytics.score_histogram(db, "song", bucket_width=20)
+        expected = {}
+        for row in rows:
+            lower = min(row["score"], 99) // 20 * 20
+            expected[(row["song"], lower)] = expected.get((row["song"], lower), 0) + 1
+        assert {(b.group, b.lower): b.count for b in bins} == expected
+        assert all(b.upper == b.lower + 20 for b in bins)
+
+
+def test_stats_do_not_load_orm_rows():
+    """统计只返回汇总结果，不创建评分记录的 ORM 对象"""
+    with temp_database("analytics.db") as (engine, db, _):
+        rows = seed_scores(db)
+        loaded = []
+
+        def on_load(target, context):
+            loaded.append(target)
+
+        event.listen(PerformanceScore, "load", on_load)
+        try:
+            db.expunge_all()
+            analytics.score_summary(db, "instrument")
+            analytics.score_histogram(db, "month")
+            stats = get_user_stats(db, 1)
+        finally:
+            event.remove(PerformanceScore, "load", on_load)
+    user_scores = [row["score"] for row in rows if row["user"] == 1]
+    assert stats["scores_count"] == len(user_scores) + 1  # 含没有总分的评分
+    assert stats["best_score"] == max(user_scores)
+    assert not loaded, f"统计时加载了 {len(loaded)} 条评分记录"
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("测试评分统计")
+    print("=" * 60)
+    try:
+        test_score_summary_matches_python()
+        test_score_histogram_matches_python()
+        test_stats_do_not_load_orm_rows()
+    except AssertionError as e:
+        print(f"❌ 统计测试未通过：{e}")
+        sys.exit(1)
+    print("✅ 统计结果与逐条计算一致，且未加载评分记录")
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+测试脚本：冷存储归档（database/archive.py）
+
+在临时目录中建在线库、归档库和录音文件，把部分录音的上传时间改到一年前，检查：
+- 只有上传时间早、且之后没有新评分的录音被归档
+- 在线库中留下存根，录音、评分、分段数据移到归档库，曲目计数随之更新
+- 文件被压缩到归档目录，原文件删除
+- 按需恢复后录音ID、文件内容、评分和分段数据与归档前一致
+- 已归档的录音、评分ID不会分配给新记录，恢复、再次归档都不会覆盖其他录音的数据
+- 归档、恢复中途失败后仍能正常归档、恢复
+
+运行：PYTHONPATH=. python test_archive.py（也可以用 pytest 运行）
+"""
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func, select, text
+from database.models.models import ArchivedRecording, PerformanceScore, ScoreSegments
+from database import crud, archive
+from testing_utils import temp_database
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def add_recording(db, song_id, files_dir, name, content):
+    audio_path = os.path.join(files_dir, f"{name}.wav")
+    chart_path = os.path.join(files_dir, "charts", f"{name}.png")
+    write_file(audio_path, content)
+    write_file(chart_path, b"chart-" + content)
+    recording = crud.create_recording(db, song_id, name, "Flute", audio_path, f"{name}.wav", len(content))
+    score = crud.create_score(db, recording.id, 80, 75, 85, 0.1, 0.1, "", chart_path=chart_path,
+                              segment_scores_pitch=[70, 80], segment_scores_rhythm=[90, 60])
+    return recording.id, score.id, [audio_path, chart_path]
+
+
+def backdate(db, recording_id, days):
+    created_at = (datetime.now(timezone.utc) - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    db.execute(text("UPDATE performance_recordings SET created_at = :t WHERE id = :id"), {"t": created_at, "id": recording_id})
+    db.execute(text("UPDATE performance_scores SET created_at = :t WHERE recording_id = :id"), {"t": created_at, "id": recording_id})
+    db.commit()
+
+
+def test_archive_and_restore():
+    with temp_database("live.db") as (engine, db, tmp_dir):
+        archive_engine = archive.get_archive_engine(os.path.join(tmp_dir, "archive.db"))
+        archive_dir = os.path.join(tmp_dir, "archive")
+        files_dir = os.path.join(tmp_dir, "recordings")
+        try:
+            song_id, = crud.bulk_create_songs(db, [{"name": "茉莉花"}])
+            old_id, old_score_id, old_files = add_recording(db, song_id, files_dir, "old", b"RIFF" * 1000)
+            rescored_id, _, _ = add_recording(db, song_id, files_dir, "rescored", b"b" * 100)
+            recent_id, _, recent_files = add_recording(db, song_id, files_dir, "recent", b"c" * 100)
+            backdate(db, old_id, 400)
+            backdate(db, rescored_id, 400)
+            # 旧录音最近重新评分过，不归档
+            crud.create_score(db, rescored_id, 90, 90, 90, 0.1, 0.1, "")
+            segments_before = crud.get_score_segments(db, old_score_id)
+            counts_before = tuple(crud.get_song_counts(db, song_id))
+
+            assert archive.archive_old_recordings(db, days=365, batch_size=1, archive_engine=archive_engine,
+                                                  archive_dir=archive_dir) == 1
+
+            stub = crud.get_archived_recording(db, old_id)
+            assert stub is not None and stub.overall_score == 80 and stub.score_count == 1
+            assert crud.count_archived_recordings_by_song(db, song_id) == 1
+            assert crud.get_recording_by_id(db, old_id) is None
+            assert db.query(ScoreSegments).filter(ScoreSegments.score_id == old_score_id).count() == 0
+            assert crud.get_song_counts(db, song_id).recording_count == 2
+            assert {r.id for r in crud.get_recordings_by_song(db, song_id)} == {rescored_id, recent_id}
+            # 原文件删除，压缩文件在归档目录
+            for path in old_files:
+                assert not os.path.exists(path)
+                assert os.path.exists(archive.archive_file_path(path, old_id, archive_dir))
+            assert all(os.path.exists(path) for path in recent_files)
+            with archive_engine.connect() as connection:
+                assert connection.execute(select(func.count()).select_from(archive.recordings_table)).scalar() == 1
+                assert connection.execute(select(func.count()).select_from(archive.segments_table)).scalar() == 1
+
+            # 再次执行没有可归档的录音
+            assert archive.archive_old_recordings(db, days=365, archive_engine=archive_engine,
+                                                  archive_dir=archive_dir) == 0
+
+            # 恢复：ID、文件、评分、分段数据和计数都回到归档前
+            assert archive.restore_recording(db, old_id, archive_engine, archive_dir)
+            assert crud.get_archived_recording(db, old_id) is None
+            assert crud.get_recording_by_id(db, old_id) is not None
+            assert db.query(PerformanceScore).filter(PerformanceScore.recording_id == old_id).count() == 1
+            segments_after = crud.get_score_segments(db, old_score_id)
+            assert segments_after["pitch"].tolist() == segments_before["pitch"].tolist()
+            assert segments_after["rhythm"].tolist() == segments_before["rhythm"].tolist()
+            assert tuple(crud.get_song_counts(db, song_id)) == counts_before
+            with open(old_files[0], "rb") as f:
+                assert f.read() == b"RIFF" * 1000
+            assert not os.path.exists(os.path.join(archive_dir, str(old_id)))
+            with archive_engine.connect() as connection:
+                assert connection.execute(select(func.count()).select_from(archive.recordings_table)).scalar() == 0
+
+            # 不在归档中的录音不能恢复
+            assert not archive.restore_recording(db, recent_id, archive_engine, archive_dir)
+        finally:
+            archive_engine.dispose()
+
+
+def test_archived_ids_are_not_reused():
+    with temp_database("live.db") as (engine, db, tmp_dir):
+        archive_engine = archive.get_archive_engine(os.path.join(tmp_dir, "archive.db"))
+        archive_dir = os.path.join(tmp_dir, "archive")
+        files_dir = os.path.join(tmp_dir, "recordings")
+        try:
+            song_id, = crud.bulk_create_songs(db, [{"name": "茉莉花"}])
+            # 归档ID最大的（唯一的）录音后再上传新录音
+            old_id, old_score_id, _ = add_recording(db, song_id, files_dir, "old", b"old")
+            backdate(db, old_id, 400)
+            assert archive.archive_old_recordings(db, days=365, archive_engine=archive_engine,
+                                                  archive_dir=archive_dir) == 1
+            new_id, new_score_id, _ = add_recording(db, song_id, files_dir, "new", b"new")
+            assert new_id != old_id and new_score_id != old_score_id
+
+            # 恢复后再把两个录音一起归档，各自的数据都保留
+            assert archive.restore_recording(db, old_id, archive_engine, archive_dir)
+            backdate(db, old_id, 400)
+            backdate(db, new_id, 400)
+            assert archive.archive_old_recordings(db, days=365, archive_engine=archive_engine,
+                                                  archive_dir=archive_dir) == 2
+            with archive_engine.connect() as connection:
+                performers = dict(connection.execute(
+                    select(archive.recordings_table.c.id, archive.recordings_table.c.performer_name)
+                ).all())
+            assert performers == {old_id: "old", new_id: "new"}
+            assert crud.get_archived_recording(db, old_id).performer_name == "old"
+            for recording_id, content in ((old_id, b"old"), (new_id, b"new")):
+                assert archive.restore_recording(db, recording_id, archive_engine, archive_dir)
+                with open(crud.get_recording_by_id(db, recording_id).audio_path, "rb") as f:
+                    assert f.read() == content
+        finally:
+            archive_engine.dispose()
+
+
+def count_rows(archive_engine, table):
+    with archive_engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(table)).scalar()
+
+
+def test_archive_recovers_from_failures():
+    """替换存根或恢复后清理归档库失败时，之后仍能正常归档、恢复"""
+    with temp_database("live.db") as (engine, db, tmp_dir):
+        archive_engine = archive.get_archive_engine(os.path.join(tmp_dir, "archive.db"))
+        archive_dir = os.path.join(tmp_dir, "archive")
+
+        def fail(*args, **kwargs):
+            raise RuntimeError("database is locked")
+
+        try:
+            song_id, = crud.bulk_create_songs(db, [{"name": "茉莉花"}])
+            recording_id, _, files = add_recording(db, song_id, os.path.join(tmp_dir, "recordings"), "a", b"a" * 100)
+            backdate(db, recording_id, 400)
+
+            # 替换存根失败：撤销归档库中的数据和压缩文件，在线数据和文件不变
+            replace = archive.replace_recordings_with_stubs
+            archive.replace_recordings_with_stubs = fail
+            try:
+                archive.archive_old_recordings(db, days=365, archive_engine=archive_engine, archive_dir=archive_dir)
+                assert False, "替换存根失败时应抛出异常"
+            except RuntimeError:
+                pass
+            finally:
+                archive.replace_recordings_with_stubs = replace
+            assert count_rows(archive_engine, archive.recordings_table) == 0
+            assert count_rows(archive_engine, archive.segments_table) == 0
+            assert not os.path.exists(os.path.join(archive_dir, str(recording_id)))
+            assert crud.get_recording_by_id(db, recording_id) is not None
+            assert crud.get_archived_recording(db, recording_id) is None
+            assert all(os.path.exists(path) for path in files)
+
+            assert archive.archive_old_recordings(db, days=365, archive_engine=archive_engine,
+                                                  archive_dir=archive_dir) == 1
+
+            # 恢复后删除归档库中的数据失败：恢复仍然成功，再次归档时覆盖留下的数据
+            delete_rows = archive._delete_archived_rows
+            archive._delete_archived_rows = fail
+            try:
+                assert archive.restore_recording(db, recording_id, archive_engine, archive_dir)
+            finally:
+                archive._delete_archived_rows = delete_rows
+            assert count_rows(archive_engine, archive.recordings_table) == 1
+            assert archive.archive_old_recordings(db, days=365, archive_engine=archive_engine,
+                                                  archive_dir=archive_dir) == 1
+            assert count_rows(archive_engine, archive.recordings_table) == 1
+            assert count_rows(archive_engine, archive.scores_table) == 1
+            assert count_rows(archive_engine, archive.segments_table) == 1
+            assert archive.restore_recording(db, recording_id, archive_engine, archive_dir)
+            with open(files[0], "rb") as f:
+                assert f.read() == b"a" * 100
+        finally:
+            archive_engine.dispose()
+
+
+def test_archive_refuses_to_overwrite():
+    """归档库中已有同一ID、且在线库中有其存根时（旧版数据库中ID被重用）拒绝归档，不覆盖已归档的数据"""
+    with temp_database("live.db") as (engine, db, tmp_dir):
+        archive_engine = archive.get_archive_engine(os.path.join(tmp_dir, "archive.db"))
+        try:
+            song_id, = crud.bulk_create_songs(db, [{"name": "茉莉花"}])
+            recording_id, _, _ = add_recording(db, song_id, os.path.join(tmp_dir, "recordings"), "new", b"new")
+            with archive_engine.begin() as connection:
+                connection.execute(archive.recordings_table.insert(), [{
+                    "id": recording_id, "song_id": song_id, "performer_name": "old",
+                    "instrument": "Flute", "audio_path": "old.wav"
+                }])
+            db.add(ArchivedRecording(id=recording_id, song_id=song_id, performer_name="old", instrument="Flute"))
+            db.commit()
+            try:
+                archive.archive_recordings(db, [recording_id], archive_engine, os.path.join(tmp_dir, "archive"))
+                assert False, "ID冲突时应拒绝归档"
+            except ValueError:
+                pass
+            assert crud.get_recording_by_id(db, recording_id) is not None
+            assert crud.get_archived_recording(db, recording_id).performer_name == "old"
+            with archive_engine.connect() as connection:
+                assert connection.execute(select(archive.recordings_table.c.performer_name)).scalar() == "old"
+        finally:
+            archive_engine.dispose()
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("测试冷存储归档")
+    print("=" * 60)
+    try:
+        test_archive_and_restore()
+        test_archived_ids_are_not_reused()
+        test_archive_recovers_from_failures()
+        test_archive_refuses_to_overwrite()
+    except AssertionError as e:
+        print(f"❌ 归档测试未通过：{e}")
+        sys.exit(1)
+    print("✅ 归档和恢复正常")
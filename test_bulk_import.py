@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+测试脚本：批量导入（bulk_import.py）
+
+在临时目录中构造导入目录和清单，导入到临时数据库（不评分），检查：
+- 曲目、乐谱、录音全部写入，文件复制（或硬链接）到存储目录
+- 按批提交，而不是逐行提交
+- 重复导入时沿用已有曲目、跳过已有乐谱，录音文件不互相覆盖
+- 写入失败时不留下没有写入数据库的文件
+
+运行：PYTHONPATH=. python test_bulk_import.py（也可以用 pytest 运行）
+"""
+import sys
+import os
+import json
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+from database.models.models import Song, Solo, PerformanceRecording
+import bulk_import
+from testing_utils import create_database
+
+
+def write_file(path, content=b"data"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def make_import_dir(root, song_count=3, recordings_per_song=4):
+    for song_index in range(song_count):
+        song_dir = os.path.join(root, f"曲目{song_index}")
+        write_file(os.path.join(song_dir, "song.json"), json.dumps({"composer": "民歌"}).encode("utf-8"))
+        write_file(os.path.join(song_dir, "sheets", "Flute.mxl"))
+        for recording_index in range(recordings_per_song):
+            write_file(os.path.join(song_dir, "recordings", f"学生{recording_index}.mp3"), b"x" * recording_index)
+    # 不支持的文件被忽略
+    write_file(os.path.join(root, "曲目0", "recordings", "notes.txt"))
+
+
+def make_env(tmp_dir):
+    engine = create_database(os.path.join(tmp_dir, "import.db"))
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    return engine, sessionmaker(bind=engine), commits
+
+
+def run(plan, session_factory, tmp_dir, **kwargs):
+    return bulk_import.run_import(plan, session_factory, sheet_dir=os.path.join(tmp_dir, "sheets"),
+                                  recording_dir=os.path.join(tmp_dir, "recordings"), score=False, **kwargs)
+
+
+def test_directory_import_batches_and_copies():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = os.path.join(tmp_dir, "source")
+        make_import_dir(source)
+        engine, session_factory, commits = make_env(tmp_dir)
+        try:
+            summary = run(bulk_import.load_plan(source), session_factory, tmp_dir, batch_size=5)
+            assert (summary["songs"], summary["solos"], summary["recordings"]) == (3, 3, 12)
+            # 曲目 1 批、乐谱 1 批、录音 3 批
+            assert len(commits) == 5, f"提交了 {len(commits)} 次"
+
+            db = session_factory()
+            try:
+                assert db.query(Song).filter(Song.composer == "民歌").count() == 3
+                recordings = db.query(PerformanceRecording).all()
+                # 曲目只有一个乐谱时录音使用该乐器
+                assert {recording.instrument for recording in recordings} == {"Flute"}
+                for recording in recordings:
+                    assert os.path.getsize(recording.audio_path) == recording.file_size
+                    assert recording.audio_path.startswith(os.path.join(tmp_dir, "recordings"))
+                assert all(os.path.exists(solo.file_path) for solo in db.query(Solo))
+            finally:
+                db.close()
+
+            # 再次导入：曲目沿用、乐谱跳过，录音另存为新文件
+            summary = run(bulk_import.load_plan(source), session_factory, tmp_dir, link=True)
+            assert (summary["songs"], summary["songs_existing"], summary["solos_skipped"]) == (0, 3, 3)
+            db = session_factory()
+            try:
+                paths = [path for path, in db.query(PerformanceRecording.audio_path)]
+            finally:
+                db.close()
+            assert len(paths) == len(set(paths)) == 24
+        finally:
+            engine.dispose()
+
+
+def test_manifest_import():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        write_file(os.path.join(tmp_dir, "files", "violin.pdf"))
+        write_file(os.path.join(tmp_dir, "files", "piano.pdf"))
+        write_file(os.path.join(tmp_dir, "files", "a.wav"))
+        manifest = {"songs": [{
+            "name": "小星星", "genre": "古典",
+            "solos": [{"instrument": "Violin", "file": "files/violin.pdf"},
+                      {"instrument": "Piano", "file": "files/piano.pdf"}],
+            "recordings": [{"performer": "张三", "instrument": "Violin", "file": "files/a.wav"},
+                           {"performer": "李四", "file": "files/a.wav"},
+                           {"performer": "王五", "file": "files/missing.wav"}],
+        }]}
+        manifest_path = os.path.join(tmp_dir, "manifest.json")
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        engine, session_factory, _ = make_env(tmp_dir)
+        try:
+            summary = run(bulk_import.load_plan(manifest_path), session_factory, tmp_dir)
+            assert (summary["solos"], summary["recordings"], summary["files_failed"]) == (2, 2, 1)
+            db = session_factory()
+            try:
+                instruments = {name: instrument for name, instrument in
+                               db.query(PerformanceRecording.performer_name, PerformanceRecording.instrument)}
+            finally:
+                db.close()
+            # 多个乐谱且未指定乐器时为合声
+            assert instruments == {"张三": "Violin", "李四": "合声"}
+        finally:
+            engine.dispose()
+
+
+def list_files(directory):
+    return [os.path.join(root, name) for root, _, names in os.walk(directory) for name in names]
+
+
+def test_failed_batch_removes_uninserted_files():
+    """乐谱第二批写入失败：已写入的第一个乐谱保留文件，其余乐谱和所有录音的已复制文件都删除"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = os.path.join(tmp_dir, "source")
+        make_import_dir(source)
+        engine, session_factory, _ = make_env(tmp_dir)
+        create_solos = bulk_import.bulk_create_solos
+        calls = []
+
+        def failing_create_solos(db, rows):
+            calls.append(1)
+            if len(calls) == 2:
+                raise RuntimeError("database is locked")
+            return create_solos(db, rows)
+
+        bulk_import.bulk_create_solos = failing_create_solos
+        try:
+            run(bulk_import.load_plan(source), session_factory, tmp_dir, batch_size=1)
+            assert False, "写入失败时应抛出异常"
+        except RuntimeError:
+            pass
+        finally:
+            bulk_import.bulk_create_solos = create_solos
+        try:
+            db = session_factory()
+            try:
+                solo_paths = [path for path, in db.query(Solo.file_path)]
+                assert db.query(PerformanceRecording).count() == 0
+            finally:
+                db.close()
+            assert len(solo_paths) == 1
+            assert list_files(os.path.join(tmp_dir, "sheets")) == solo_paths
+            assert list_files(os.path.join(tmp_dir, "recordings")) == []
+        finally:
+            engine.dispose()
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("测试批量导入")
+    print("=" * 60)
+    try:
+        test_directory_import_batches_and_copies()
+        test_manifest_import()
+        test_failed_batch_removes_uninserted_files()
+    except AssertionError as e:
+        print(f"❌ 导入测试未通过：{e}")
+        sys.exit(1)
+    print("✅ 批量导入正常")
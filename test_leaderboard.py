@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+测试脚本：排行榜（LeaderboardEntry）
+
+在临时数据库中通过 database/crud.py 创建评分、删除录音、修改演奏者、归档和恢复录音，
+每一步后把增量维护的排行榜与 rebuild_leaderboard 按评分表重建的结果对比，并检查排名顺序。
+
+运行：PYTHONPATH=. python test_leaderboard.py（也可以用 pytest 运行）
+"""
+import sys
+import os
+import time
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text
+from database.models.models import LeaderboardEntry
+from database import crud
+from testing_utils import temp_database
+
+
+def snapshot(db):
+    return sorted(
+        (entry.song_id, entry.instrument, entry.performer_name, entry.best_score, str(entry.best_score_at),
+         entry.latest_score, entry.score_total, entry.score_count, str(entry.latest_score_at))
+        for entry in db.query(LeaderboardEntry)
+    )
+
+
+def assert_matches_rebuild(db):
+    incremental = snapshot(db)
+    crud.rebuild_leaderboard(db)
+    db.expire_all()
+    rebuilt = snapshot(db)
+    assert incremental == rebuilt, f"{incremental} != {rebuilt}"
+
+
+def add_score(db, recording_id, score):
+    return crud.create_score(db, recording_id, score, score, score, 0.1, 0.1, "")
+
+
+def test_leaderboard_follows_crud_operations():
+    with temp_database("leaderboard.db") as (engine, db, _):
+        a, b = crud.bulk_create_songs(db, [{"name": "a"}, {"name": "b"}])
+        r1 = crud.create_recording(db, a, "张三", "Flute", "1.mp3").id
+        r2 = crud.create_recording(db, a, "张三", "Flute", "2.mp3").id
+        r3 = crud.create_recording(db, a, "李四", "Flute", "3.mp3").id
+        r4 = crud.create_recording(db, a, "李四", "Violin", "4.mp3").id
+        r5 = crud.create_recording(db, b, "张三", "Flute", "5.mp3").id
+        for recording_id, score in ((r1, 70), (r1, 90), (r2, 60), (r3, 85), (r4, 50), (r5, 99)):
+            add_score(db, recording_id, score)
+
+        top = crud.get_leaderboard(db, a, "Flute")
+        assert [(e.performer_name, e.best_score, e.latest_score, e.score_count) for e in top] == [
+            ("张三", 90, 60, 3), ("李四", 85, 85, 1)]
+        assert top[0].average_score == 73.3
+        assert crud.get_leaderboard_instruments(db, a) == ["Flute", "Violin"]
+        assert len(crud.get_leaderboard(db, a, "Flute", limit=1)) == 1
+        assert_matches_rebuild(db)
+
+        # 删除包含最高分的录音后重新计算最高分
+        crud.delete_recording(db, r1)
+        assert [(e.performer_name, e.best_score) for e in crud.get_leaderboard(db, a, "Flute")] == [
+            ("李四", 85), ("张三", 60)]
+        assert_matches_rebuild(db)
+
+        # 修改演奏者：评分移到新演奏者名下，原条目没有评分时删除
+        crud.update_recording(db, r4, performer_name="王五")
+        assert [e.performer_name for e in crud.get_leaderboard(db, a, "Violin")] == ["王五"]
+        assert_matches_rebuild(db)
+
+        # 归档后不在排行榜中，恢复后回到排行榜
+        crud.replace_recordings_with_stubs(db, [r3])
+        assert [e.performer_name for e in crud.get_leaderboard(db, a, "Flute")] == ["张三"]
+        assert_matches_rebuild(db)
+
+        # 删除曲目时排行榜一起删除
+        crud.delete_song(db, b)
+        assert db.query(LeaderboardEntry).filter(LeaderboardEntry.song_id == b).count() == 0
+
+        # 单首曲目重建不影响其他曲目
+        db.query(LeaderboardEntry).delete()
+        db.commit()
+        assert crud.rebuild_leaderboard(db, a) == 2
+        assert_matches_rebuild(db)
+
+
+
+def test_ties_go_to_first_to_reach_score():
+    with temp_database("leaderboard.db") as (engine, db, _):
+        song_id, = crud.bulk_create_songs(db, [{"name": "a"}])
+        alice = crud.create_recording(db, song_id, "alice", "Flute", "1.mp3").id
+        bob = crud.create_recording(db, song_id, "bob", "Flute", "2.mp3").id
+        # alice 的条目先建立，但 bob 先达到 90 分（评分时间精确到秒）
+        add_score(db, alice, 50)
+        add_score(db, bob, 90)
+        time.sleep(1.1)
+        add_score(db, alice, 90)
+        add_score(db, bob, 90)
+        assert [e.performer_name for e in crud.get_leaderboard(db, song_id, "Flute")] == ["bob", "alice"]
+        assert_matches_rebuild(db)
+        assert [e.performer_name for e in crud.get_leaderboard(db, song_id, "Flute")] == ["bob", "alice"]
+
+def test_backfill_after_upgrade():
+    """升级已有数据库：排行榜为空时按评分生成；录音表还按曲目名称关联时跳过"""
+    with temp_database("leaderboard.db") as (engine, db, _):
+        assert crud.backfill_leaderboard(db) == 0
+        song_id, = crud.bulk_create_songs(db, [{"name": "a"}])
+        add_score(db, crud.create_recording(db, song_id, "张三", "Flute", "1.mp3").id, 80)
+        add_score(db, crud.create_recording(db, song_id, "李四", "Flute", "2.mp3").id, 70)
+        db.query(LeaderboardEntry).delete()
+        db.commit()
+        assert crud.backfill_leaderboard(db) == 2
+        assert [e.performer_name for e in crud.get_leaderboard(db, song_id, "Flute")] == ["张三", "李四"]
+        # 已有条目时不重复生成
+        assert crud.backfill_leaderboard(db) == 0
+
+    with temp_database("legacy.db") as (engine, db, _):
+        # 尚未执行 migrate_song_integer_ids.py 的录音表
+        with engine.begin() as connection:
+            connection.execute(text("DROP TABLE performance_recordings"))
+            connection.execute(text("CREATE TABLE performance_recordings (id INTEGER PRIMARY KEY, song_name VARCHAR)"))
+        assert crud.backfill_leaderboard(db) is None
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("测试排行榜")
+    print("=" * 60)
+    try:
+        test_leaderboard_follows_crud_operations()
+        test_ties_go_to_first_to_reach_score()
+        test_backfill_after_upgrade()
+    except AssertionError as e:
+        print(f"❌ 排行榜测试未通过：{e}")
+        sys.exit(1)
+    print("✅ 排行榜与评分数据一致")
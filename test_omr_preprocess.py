@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+测试脚本：OMR 识别前的图片预处理（utils/omr_preprocess.py）
+
+用合成的五线谱图片（墨迹 0，背景 255）检查：
+- estimate_interline 估计的线间距，包括裁得很紧、没有大片空白的图片
+- estimate_skew + deskew 能把倾斜的谱线摆正
+- crop_margins 裁掉空白边缘、保留留白，且不被孤立噪点撑大
+- preprocess_image 对裁得很紧的扫描图也能完成预处理
+
+运行：PYTHONPATH=. python test_omr_preprocess.py（也可以用 pytest 运行）
+"""
+import sys
+import os
+import tempfile
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+from utils import omr_preprocess
+
+
+def staff_image(height, width, top, thickness=2, gap=10, staves=1, staff_gap=60):
+    """白底上画等距的五线谱，返回二值图片"""
+    image = np.full((height, width), 255, dtype=np.uint8)
+    y = top
+    for _ in range(staves):
+        for _ in range(5):
+            image[y:y + thickness, 10:width - 10] = 0
+            y += thickness + gap
+        y += staff_gap
+    return image
+
+
+def test_estimate_interline_on_tight_crop():
+    # 120×300，谱线间的空白都远小于 200 像素
+    image = staff_image(120, 300, top=30)
+    assert omr_preprocess.estimate_interline(image) == 12
+
+
+def test_estimate_interline_with_large_gaps():
+    # 多行谱之间有超过 200 像素的空白，不影响结果
+    image = staff_image(800, 400, top=40, thickness=3, gap=17, staves=3, staff_gap=250)
+    assert omr_preprocess.estimate_interline(image) == 20
+
+
+def test_estimate_interline_blank_page():
+    assert omr_preprocess.estimate_interline(np.full((100, 100), 255, dtype=np.uint8)) is None
+
+
+def test_deskew_straightens_staff():
+    image = staff_image(400, 600, top=150, thickness=3, gap=15)
+    tilted = omr_preprocess.deskew(image, 3.0)
+    angle = omr_preprocess.estimate_skew(tilted)
+    assert 2.5 < abs(angle) < 3.5, angle
+    straightened = omr_preprocess.deskew(tilted, angle)
+    assert abs(omr_preprocess.estimate_skew(straightened)) < 0.5
+    assert abs(omr_preprocess.estimate_skew(image)) < omr_preprocess.MIN_SKEW_DEGREES
+
+
+def test_crop_margins_keeps_padding_and_ignores_noise():
+    image = np.full((300, 400), 255, dtype=np.uint8)
+    image[100:150, 120:220] = 0
+    image[5, 5] = 0  # 孤立噪点
+    cropped = omr_preprocess.crop_margins(image, padding=10)
+    assert cropped.shape == (70, 120)
+    assert omr_preprocess.crop_margins(np.full((50, 50), 255, dtype=np.uint8), padding=10).shape == (50, 50)
+
+
+def test_preprocess_tight_crop():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = os.path.join(tmp_dir, "tight.png")
+        cv2.imwrite(source, cv2.cvtColor(staff_image(120, 300, top=30), cv2.COLOR_GRAY2BGR))
+        info = omr_preprocess.preprocess_image(source, os.path.join(tmp_dir, "out.png"))
+        assert info["interline"] is not None
+        assert os.path.exists(os.path.join(tmp_dir, "out.png"))
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("测试 OMR 图片预处理")
+    print("=" * 60)
+    try:
+        test_estimate_interline_on_tight_crop()
+        test_estimate_interline_with_large_gaps()
+        test_estimate_interline_blank_page()
+        test_deskew_straightens_staff()
+        test_crop_margins_keeps_padding_and_ignores_noise()
+        test_preprocess_tight_crop()
+    except AssertionError as e:
+        print(f"❌ 预处理测试未通过：{e}")
+        sys.exit(1)
+    print("✅ 线间距估计、纠偏、裁边正常")
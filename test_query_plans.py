@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+测试脚本：检查常用查询的执行计划，防止退化为全表扫描
+
+在临时数据库中按 database/models 建表，执行 database/crud.py 中的常用查询，
+用 EXPLAIN QUERY PLAN 检查实际执行的 SQL：
+- 不允许出现不走索引的全表扫描（SCAN 表名）
+- 不允许为排序额外建临时 B 树（USE TEMP B-TREE FOR ORDER BY）
+- 带过滤条件的查询必须按索引查找（SEARCH）
+
+运行：PYTHONPATH=. python test_query_plans.py（也可以用 pytest 运行）
+"""
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database.models.models import Song, Solo, PerformanceRecording, PerformanceScore
+from database import crud
+from testing_utils import temp_database, capture_selects, query_plan
+
+
+def seed_songs(db):
+    """写入少量曲目、乐谱、录音和评分"""
+    for song_index in range(3):
+        song = Song(name=f"song{song_index}")
+        db.add(song)
+        db.flush()
+        for instrument in ("flute", "violin"):
+            db.add(Solo(song_id=song.id, instrument=instrument, file_path=f"{song.name}_{instrument}.pdf"))
+        for recording_index in range(5):
+            recording = PerformanceRecording(song_id=song.id, performer_name=f"p{recording_index}",
+                                             instrument="flute", audio_path="a.mp3")
+            db.add(recording)
+            db.flush()
+            for _ in range(3):
+                db.add(PerformanceScore(recording_id=recording.id, project_id=1, user_id=1, overall_score=80))
+    db.commit()
+    crud.rebuild_leaderboard(db)
+
+
+def check_plan(engine, db, name, func, *args, filtered=True):
+    """检查一个查询函数的执行计划，返回问题列表"""
+    problems = []
+    statements = capture_selects(engine, func, db, *args)
+    if not statements:
+        return [f"{name}: 没有执行任何查询"]
+
+    for statement, parameters in statements:
+        plan = query_plan(engine, statement, parameters)
+        for detail in plan:
+            if detail.startswith("SCAN") and "USING" not in detail:
+                problems.append(f"{name}: 全表扫描 - {detail}")
+            if "TEMP B-TREE" in detail:
+                problems.append(f"{name}: 排序未使用索引 - {detail}")
+        if filtered and not any(detail.startswith("SEARCH") for detail in plan):
+            problems.append(f"{name}: 没有按索引查找 - {' | '.join(plan)}")
+    return problems
+
+
+# (名称, crud 函数, 参数, 是否带过滤条件)
+HOT_QUERIES = [
+    ("get_all_songs", crud.get_all_songs, (), False),
+    ("get_song_by_name", crud.get_song_by_name, ("song1",), True),
+    ("get_solos_by_song", crud.get_solos_by_song, (2,), True),
+    ("get_solo_by_song_and_instrument", crud.get_solo_by_song_and_instrument, (2, "flute"), True),
+    ("get_recordings_by_song", crud.get_recordings_by_song, (2,), True),
+    ("get_scores_by_recording_id", crud.get_scores_by_recording_id, (1,), True),
+    ("get_scores_by_project", crud.get_scores_by_project, (1,), True),
+    ("get_scores_by_user", crud.get_scores_by_user, (1,), True),
+    ("get_recordings_with_latest_scores", crud.get_recordings_with_latest_scores, (2,), True),
+    # 键集分页（带游标的翻页）
+    ("get_songs_page", crud.get_songs_page, (2, 2), True),
+    ("get_recordings_page", crud.get_recordings_page, (2, 2, 8), True),
+    ("get_recordings_page_with_latest_scores", crud.get_recordings_page_with_latest_scores, (2, 2, 8), True),
+    # 排行榜前 N 名
+    ("get_leaderboard", crud.get_leaderboard, (2, "flute", 3), True),
+    ("get_leaderboard_instruments", crud.get_leaderboard_instruments, (2,), True),
+]
+
+
+def test_hot_queries_use_indexes():
+    with temp_database("plans.db") as (engine, db, _):
+        seed_songs(db)
+        problems = []
+        for name, func, args, filtered in HOT_QUERIES:
+            problems.extend(check_plan(engine, db, name, func, *args, filtered=filtered))
+    assert not problems, "\n".join(problems)
+
+
+def test_recordings_list_is_single_query():
+    """录音列表（含最新评分和参考乐谱）只执行一条查询，与录音数量无关"""
+    with temp_database("plans.db") as (engine, db, _):
+        seed_songs(db)
+        statements = capture_selects(engine, crud.get_recordings_with_latest_scores, db, 2)
+        rows = crud.get_recordings_with_latest_scores(db, 2)
+        # 访问参考乐谱不应再触发查询
+        statements += capture_selects(engine, lambda: [score and score.reference_solo for _, score in rows])
+    assert len(statements) == 1, f"录音列表执行了 {len(statements)} 条查询"
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("检查常用查询的执行计划")
+    print("=" * 60)
+    try:
+        test_hot_queries_use_indexes()
+        test_recordings_list_is_single_query()
+    except AssertionError as e:
+        print(f"❌ 查询检查未通过：\n{e}")
+        sys.exit(1)
+    print(f"✅ {len(HOT_QUERIES)} 个常用查询均使用索引，录音列表为单条查询")
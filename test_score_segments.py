@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+测试脚本：评分分段数据的二进制存储（ScoreSegments）
+
+检查：
+- 分段分数编码后还原的误差在 float16 精度内，体积远小于 JSON 文本
+- 录音列表查询不读取 score_segments 表
+- 删除录音时分段数据随评分一起删除
+
+运行：PYTHONPATH=. python test_score_segments.py（也可以用 pytest 运行）
+"""
+import sys
+import os
+import json
+import numpy as np
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database.models.models import ScoreSegments
+from database.segments import encode_segment_scores, decode_segment_scores
+from database import crud
+from testing_utils import temp_database, capture_selects
+
+
+def test_codec_round_trip_and_size():
+    values = np.random.default_rng(0).uniform(0, 100, 2000).tolist()
+    data = encode_segment_scores(values)
+    decoded = decode_segment_scores(data)
+    assert len(decoded) == len(values)
+    assert np.max(np.abs(decoded - np.array(values))) < 0.05
+    assert len(data) == 2 * len(values)
+    assert len(data) * 8 < len(json.dumps(values))
+
+
+def test_segments_stored_separately():
+    with temp_database("segments.db") as (engine, db, _):
+        song = crud.create_song(db, "song")
+        recording = crud.create_recording(db, song.id, "p", "Flute", "a.mp3")
+        pitch = [90.5, 80.25, 0.0, 100.0]
+        rhythm = [50.0, 75.5, 99.9, 12.0]
+        score = crud.create_score(db, recording.id, 80, 80, 80, 1.0, 0.1, "",
+                                  segment_scores_pitch=pitch, segment_scores_rhythm=rhythm, segment_size=10)
+        crud.create_score(db, recording.id, 70, 70, 70, 1.0, 0.1, "")
+
+        segments = crud.get_score_segments(db, score.id)
+        assert segments["segment_size"] == 10
+        assert np.allclose(segments["pitch"], pitch, atol=0.05)
+        assert np.allclose(segments["rhythm"], rhythm, atol=0.05)
+
+        statements = capture_selects(engine, crud.get_recordings_with_latest_scores, db, song.id)
+        assert not any("score_segments" in statement for statement, _ in statements)
+
+        crud.delete_recording(db, recording.id)
+        assert db.query(ScoreSegments).count() == 0
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("测试评分分段数据存储")
+    print("=" * 60)
+    try:
+        test_codec_round_trip_and_size()
+        test_segments_stored_separately()
+    except AssertionError as e:
+        print(f"❌ 分段数据测试未通过：{e}")
+        sys.exit(1)
+    print("✅ 分段数据编码、按需读取和级联删除正常")
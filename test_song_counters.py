@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+测试脚本：曲目计数字段（Song.solo_count / recording_count / latest_score_at）
+
+在临时数据库中通过 database/crud.py 增删乐谱、录音和评分（含批量写入），
+每一步后把计数字段与 COUNT / MAX 的实际结果对比，并检查 recount_song_counts 能修复被改坏的计数。
+
+运行：PYTHONPATH=. python test_song_counters.py（也可以用 pytest 运行）
+"""
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func, text
+from database.models.models import PerformanceRecording, PerformanceScore
+from database import crud
+from testing_utils import temp_database
+
+
+def actual_counts(db, song_id):
+    latest = db.query(func.max(PerformanceScore.created_at)).join(PerformanceRecording).filter(
+        PerformanceRecording.song_id == song_id
+    ).scalar()
+    return (crud.count_solos_by_song(db, song_id), crud.count_recordings_by_song(db, song_id), latest)
+
+
+def assert_counts(db, song_id):
+    counts = tuple(crud.get_song_counts(db, song_id))
+    assert counts == actual_counts(db, song_id), f"{song_id}: {counts} != {actual_counts(db, song_id)}"
+
+
+def add_score(db, recording_id, score=80):
+    return crud.create_score(db, recording_id, score, score, score, 0.1, 0.1, "")
+
+
+def test_counters_follow_crud_operations():
+    with temp_database("counters.db") as (engine, db, _):
+        a, b = crud.bulk_create_songs(db, [{"name": "a"}, {"name": "b"}])
+        for song_id in (a, b):
+            assert tuple(crud.get_song_counts(db, song_id)) == (0, 0, None)
+
+        flute = crud.create_solo(db, a, "Flute", "a.mxl")
+        crud.create_solo(db, a, "Violin", "a2.mxl")
+        crud.bulk_create_solos(db, [{"song_id": b, "instrument": "Piano", "file_path": "b.mxl"}])
+        first = crud.create_recording(db, a, "p1", "Flute", "1.mp3")
+        ids = crud.bulk_create_recordings(db, [
+            {"song_id": song_id, "performer_name": "p", "instrument": "Flute", "audio_path": "x.mp3"}
+            for song_id in (a, a, b)
+        ])
+        for song_id in (a, b):
+            assert_counts(db, song_id)
+
+        add_score(db, first.id)
+        add_score(db, ids[0])
+        add_score(db, ids[2])
+        for song_id in (a, b):
+            assert_counts(db, song_id)
+        assert crud.get_song_counts(db, a).latest_score_at is not None
+
+        # 删除录音时评分一起删除，最近评分时间重新计算
+        crud.delete_recording(db, ids[2])
+        assert tuple(crud.get_song_counts(db, b)) == (1, 0, None)
+        crud.delete_solo(db, flute.id)
+        crud.delete_recording(db, first.id)
+        for song_id in (a, b):
+            assert_counts(db, song_id)
+
+        # 计数不改变曲目的修改时间
+        crud.update_song(db, a, composer="x")
+        before = db.execute(text("SELECT updated_at FROM songs WHERE id = :id"), {"id": a}).scalar()
+        crud.create_solo(db, a, "Piano", "a3.mxl")
+        after = db.execute(text("SELECT updated_at FROM songs WHERE id = :id"), {"id": a}).scalar()
+        assert before == after
+
+        # 计数被改坏后可按实际数据重算
+        db.execute(text("UPDATE songs SET solo_count = 99, recording_count = 99, latest_score_at = NULL"))
+        db.commit()
+        assert crud.recount_song_counts(db) == 2
+        for song_id in (a, b):
+            assert_counts(db, song_id)
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("测试曲目计数字段")
+    print("=" * 60)
+    try:
+        test_counters_follow_crud_operations()
+    except AssertionError as e:
+        print(f"❌ 计数测试未通过：{e}")
+        sys.exit(1)
+    print("✅ 计数字段与实际数据一致")
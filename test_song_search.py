@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+测试脚本：曲目全文搜索（database/search.py、crud.search_songs）
+
+在临时数据库中建立搜索索引，检查：
+- 新增、修改（含改名）、删除曲目后索引由触发器同步
+- 按词前缀匹配名称、作曲家、类型、简介，名称匹配排在前面
+- 搜索中文词中间部分时退回到名称子串匹配
+- 输入中的 FTS5 运算符、引号按普通字符处理
+- 搜索走全文索引，曲目按主键查找，不扫描 songs 表
+
+运行：PYTHONPATH=. python test_song_search.py（也可以用 pytest 运行）
+"""
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database.search import create_song_search_index, build_match_query
+from database import crud
+from testing_utils import temp_database, capture_selects, query_plan
+
+
+def seed_songs(engine, db):
+    """写入曲目并建立搜索索引"""
+    # 建索引之前已有的曲目由重建导入
+    crud.create_song(db, "茉莉花", composer="民歌", genre="民谣", description="江南小调")
+    with engine.begin() as connection:
+        assert create_song_search_index(connection)
+        assert not create_song_search_index(connection)
+    crud.create_song(db, "Mozart Sonata", composer="Wolfgang Amadeus Mozart", genre="古典")
+    crud.create_song(db, "Eine kleine Nachtmusik", composer="Mozart", description="serenade")
+    crud.create_song(db, "Moon River", composer="Henry Mancini", genre="流行")
+
+
+def song_id(db, name):
+    return crud.get_song_by_name(db, name).id
+
+
+def names(songs):
+    return [song.name for song in songs]
+
+
+def test_search_ranks_and_syncs():
+    with temp_database("search.db") as (engine, db, _):
+        seed_songs(engine, db)
+        # 前缀匹配，名称命中排在作曲家命中之前
+        assert names(crud.search_songs(db, "moz")) == ["Mozart Sonata", "Eine kleine Nachtmusik"]
+        assert names(crud.search_songs(db, "mozart sere")) == ["Eine kleine Nachtmusik"]
+        assert names(crud.search_songs(db, "茉莉")) == ["茉莉花"]
+        assert names(crud.search_songs(db, "江南")) == ["茉莉花"]
+
+        # 词中间的中文退回子串匹配
+        assert names(crud.search_songs(db, "莉花")) == ["茉莉花"]
+
+        # 修改、改名、删除后索引同步
+        moon_river = song_id(db, "Moon River")
+        crud.update_song(db, moon_river, composer="Audrey Hepburn")
+        assert names(crud.search_songs(db, "hepburn")) == ["Moon River"]
+        assert names(crud.search_songs(db, "mancini")) == []
+        crud.update_song(db, moon_river, name="Breakfast at Tiffany's")
+        assert names(crud.search_songs(db, "tiffany")) == ["Breakfast at Tiffany's"]
+        assert names(crud.search_songs(db, "river")) == []
+        crud.delete_song(db, moon_river)
+        assert names(crud.search_songs(db, "hepburn")) == []
+
+        # 运算符和引号不会造成语法错误
+        for term in ('"', "moz AND", "NEAR(", "mo*", "-x", "a:b"):
+            crud.search_songs(db, term)
+        assert crud.search_songs(db, "   ") == []
+
+
+def test_build_match_query():
+    assert build_match_query("mo  li") == '"mo"* "li"*'
+    assert build_match_query('a"b') == '"a""b"*'
+    assert build_match_query(" ") is None
+
+
+def test_search_uses_fts_index():
+    """
+    FTS5 的 MATCH 在执行计划中显示为虚拟表的 SCAN（索引串含 M 表示按全文索引查找），
+    曲目按 rowid（曲目ID）查找；按相关度排序只涉及匹配到的行
+    """
+    with temp_database("search.db") as (engine, db, _):
+        seed_songs(engine, db)
+        statements = capture_selects(engine, crud.search_songs, db, "moz")
+        plan = query_plan(engine, *statements[0])
+    assert len(statements) == 1, f"搜索执行了 {len(statements)} 条查询"
+    assert any(detail.startswith("SCAN songs_fts VIRTUAL TABLE") and ":M" in detail for detail in plan), plan
+    assert any(detail.startswith("SEARCH songs USING INTEGER PRIMARY KEY") for detail in plan), plan
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("测试曲目全文搜索")
+    print("=" * 60)
+    try:
+        test_build_match_query()
+        test_search_ranks_and_syncs()
+        test_search_uses_fts_index()
+    except AssertionError as e:
+        print(f"❌ 搜索测试未通过：{e}")
+        sys.exit(1)
+    print("✅ 搜索索引同步、排序和回退均正常")
@@ -0,0 +1,54 @@
+"""
+测试脚本共用的工具：临时数据库、捕获查询函数执行的 SQL 及其执行计划
+
+测试脚本（test_*.py）在项目根目录下直接运行或用 pytest 运行，都从这里导入。
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from database.models.base import Base
+
+
+def create_database(db_path):
+    """按 database/models 建库，返回 engine"""
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+@contextmanager
+def temp_database(name="test.db"):
+    """在临时目录中建库，返回 (engine, 会话, 临时目录)；退出时关闭会话、释放连接并删除临时目录"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_database(os.path.join(tmp_dir, name))
+        db = sessionmaker(bind=engine)()
+        try:
+            yield engine, db, tmp_dir
+        finally:
+            db.close()
+            engine.dispose()
+
+
+def capture_selects(engine, func, *args):
+    """执行查询函数，返回其间执行的 SELECT 语句及参数"""
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_execute)
+    try:
+        func(*args)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_execute)
+    return statements
+
+
+def query_plan(engine, statement, parameters):
+    """EXPLAIN QUERY PLAN 的各行说明"""
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return [row[-1] for row in rows]
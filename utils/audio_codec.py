@@ -0,0 +1,107 @@
+"""
+音频编码工具模块
+
+FluidSynth 只能输出未压缩的 PCM，这里用 soundfile（libsndfile）在进程内
+将合成结果编码为 MP3 / Ogg Vorbis / Opus，用于存储和前端播放；
+评分直接使用未压缩的内存数据，不必再解码压缩文件。
+"""
+import os
+import tempfile
+import numpy as np
+import soundfile as sf
+from config.settings import AUDIO_FORMAT, AUDIO_BITRATE_KBPS
+
+# 扩展名 → (容器格式, 编码, MIME 类型)
+AUDIO_FORMATS = {
+    "mp3": ("MP3", "MPEG_LAYER_III", "audio/mpeg"),
+    "ogg": ("OGG", "VORBIS", "audio/ogg"),
+    "opus": ("OGG", "OPUS", "audio/ogg"),
+    "wav": ("WAV", "PCM_16", "audio/wav"),
+}
+
+# Opus 只支持 48kHz 等固定采样率
+OPUS_SAMPLE_RATE = 48000
+DEFAULT_SAMPLE_RATE = 44100
+
+# libsndfile 的压缩等级 0.0 对应 320kbps，越大码率越低
+MAX_BITRATE_KBPS = 320
+MIN_BITRATE_KBPS = 32
+
+
+def get_audio_extension(audio_format: str = None) -> str:
+    """获取配置的压缩音频扩展名（含点）"""
+    audio_format = (audio_format or AUDIO_FORMAT).lower()
+    if audio_format not in AUDIO_FORMATS:
+        audio_format = "mp3"
+    return f".{audio_format}"
+
+
+def get_audio_mime(file_path: str) -> str:
+    """根据文件扩展名获取音频 MIME 类型（用于 st.audio / 下载）"""
+    ext = os.path.splitext(file_path)[1].lower().lstrip(".")
+    return AUDIO_FORMATS.get(ext, AUDIO_FORMATS["mp3"])[2]
+
+
+def get_render_sample_rate(output_path: str = None) -> int:
+    """合成时使用的采样率：Opus 需要 48kHz，其它格式使用 44.1kHz"""
+    ext = os.path.splitext(output_path)[1].lower() if output_path else get_audio_extension()
+    return OPUS_SAMPLE_RATE if ext == ".opus" else DEFAULT_SAMPLE_RATE
+
+
+def bitrate_to_compression_level(bitrate_kbps: int) -> float:
+    """将目标码率换算为 libsndfile 的压缩等级（0.0 ~ 1.0）"""
+    bitrate_kbps = max(MIN_BITRATE_KBPS, min(MAX_BITRATE_KBPS, bitrate_kbps))
+    level = (MAX_BITRATE_KBPS - bitrate_kbps) / (MAX_BITRATE_KBPS - MIN_BITRATE_KBPS)
+    # 等级 1.0 在部分编码器上会报错
+    return min(level, 0.95)
+
+
+def encode_audio(samples, sample_rate: int, output_path: str, bitrate_kbps: int = None) -> str:
+    """
+    将 PCM 数据编码为压缩音频文件，格式由输出文件扩展名决定
+
+    参数：
+    - samples: 音频数据，形状为 (帧数,) 或 (帧数, 声道数)
+    - sample_rate: 采样率
+    - bitrate_kbps: 目标码率，默认使用配置值
+
+    返回输出文件路径。
+    """
+    ext = os.path.splitext(output_path)[1].lower().lstrip(".")
+    if ext not in AUDIO_FORMATS:
+        raise ValueError(f"不支持的音频格式: {ext}")
+    container, subtype, _ = AUDIO_FORMATS[ext]
+
+    samples = np.asarray(samples, dtype=np.float32)
+    if ext == "opus" and sample_rate != OPUS_SAMPLE_RATE:
+        from scipy.signal import resample_poly
+        from math import gcd
+        divisor = gcd(OPUS_SAMPLE_RATE, sample_rate)
+        samples = resample_poly(samples, OPUS_SAMPLE_RATE // divisor, sample_rate // divisor, axis=0).astype(np.float32)
+        sample_rate = OPUS_SAMPLE_RATE
+
+    write_kwargs = {}
+    if container != "WAV":
+        write_kwargs["compression_level"] = bitrate_to_compression_level(bitrate_kbps or AUDIO_BITRATE_KBPS)
+    if ext == "mp3":
+        write_kwargs["bitrate_mode"] = "CONSTANT"
+
+    # 先写临时文件再替换，避免留下不完整的音频文件
+    output_dir = os.path.dirname(output_path) or "."
+    os.makedirs(output_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix=f".{ext}", dir=output_dir)
+    os.close(fd)
+    try:
+        sf.write(temp_path, samples, sample_rate, format=container, subtype=subtype, **write_kwargs)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    return output_path
+
+
+def decode_audio(file_path: str):
+    """读取音频文件，返回 (float32 PCM, 采样率)"""
+    samples, sample_rate = sf.read(file_path, dtype="float32")
+    return samples, sample_rate
@@ -5,20 +5,80 @@ from matplotlib import rcParams
 from scipy.spatial.distance import euclidean as norm
 from fastdtw import fastdtw
 import os
+from config.settings import TEMPO_MATCH_THRESHOLD, DTW_RADIUS, SOUNDFONT_PATH
 
 
-def calculate_rhythm_score(y_ref, sr_ref, y_user, sr_user):
+def to_mono_resampled(y, sr, sr_target):
+    """将 (PCM, 采样率) 转为指定采样率的单声道 float32"""
+    y = np.asarray(y, dtype=np.float32)
+    if y.ndim > 1:
+        y = librosa.to_mono(y.T)
+    if sr != sr_target:
+        y = librosa.resample(y, orig_sr=sr, target_sr=sr_target)
+    return y
+
+
+def estimate_tempo_ratio(ref_onsets, user_onsets):
+    """
+    用onset快速估计演奏速度与参考速度之比（用户时长 / 参考时长）
+
+    比较首尾onset之间的跨度，对两边onset数量不一致不敏感；
+    onset太少时返回1.0，结果限制在 0.5~2.0 倍之间。
+    """
+    if len(ref_onsets) < 3 or len(user_onsets) < 3:
+        return 1.0
+
+    ref_span = ref_onsets[-1] - ref_onsets[0]
+    user_span = user_onsets[-1] - user_onsets[0]
+    if ref_span <= 0 or user_span <= 0:
+        return 1.0
+
+    return float(np.clip(user_span / ref_span, 0.5, 2.0))
+
+
+def match_reference_tempo(y_ref, sr_ref, tempo_ratio, ref_midi=None):
+    """
+    将参考音频调整到演奏速度，使DTW路径接近对角线
+
+    - 速度差在 TEMPO_MATCH_THRESHOLD 以内时不做处理
+    - 有参考MIDI时按新速度重新合成（音色和音高不受影响）
+    - 否则对参考音频做时间拉伸
+
+    返回:
+        (调整后的参考音频, 实际采用的速度比例)
+    """
+    if abs(tempo_ratio - 1.0) < TEMPO_MATCH_THRESHOLD:
+        return y_ref, 1.0
+
+    if ref_midi and os.path.exists(ref_midi):
+        try:
+            from utils.midi_tools import render_midi_at_tempo
+            samples, sr = render_midi_at_tempo(ref_midi, SOUNDFONT_PATH, tempo_ratio)
+            print(f"🎼 已按演奏速度重新合成参考音频（速度比例 {tempo_ratio:.2f}）")
+            return to_mono_resampled(samples, sr, sr_ref), tempo_ratio
+        except Exception as e:
+            print(f"⚠️ 按演奏速度合成参考音频失败，改用时间拉伸: {e}")
+
+    print(f"🎼 已将参考音频时间拉伸到演奏速度（速度比例 {tempo_ratio:.2f}）")
+    return librosa.effects.time_stretch(y_ref, rate=1.0 / tempo_ratio), tempo_ratio
+
+
+def calculate_rhythm_score(y_ref, sr_ref, y_user, sr_user, ref_onsets=None, user_onsets=None):
     """
     改进的节奏评分算法：使用onset间隔比率评分
 
+    已检测过onset时可通过 ref_onsets / user_onsets 传入，避免重复计算
+
     返回:
         rhythm_score: 综合节奏评分 (0-100)
         tempo_error: 整体速度误差（比例）
         stability_error: 节奏稳定性误差（标准差）
     """
     # 1. Onset检测（检测音符开始时间点）
-    ref_onsets = librosa.onset.onset_detect(y=y_ref, sr=sr_ref, units='time')
-    user_onsets = librosa.onset.onset_detect(y=y_user, sr=sr_user, units='time')
+    if ref_onsets is None:
+        ref_onsets = librosa.onset.onset_detect(y=y_ref, sr=sr_ref, units='time')
+    if user_onsets is None:
+        user_onsets = librosa.onset.onset_detect(y=y_user, sr=sr_user, units='time')
 
     # 2. 检查onset数量
     if len(ref_onsets) < 3 or len(user_onsets) < 3:
@@ -58,21 +118,36 @@ def calculate_rhythm_score(y_ref, sr_ref, y_user, sr_user):
 
     return rhythm_score, tempo_error, stability_error
 
-def compare_audio2(ref_path, user_path, unique_id=None):
+def compare_audio2(ref_path, user_path, unique_id=None, ref_audio=None, ref_midi=None):
+    """
+    参数：
+    - ref_audio: 可选的未压缩参考音频 (PCM, 采样率)，提供时不再从 ref_path 读取
+    - ref_midi: 可选的参考MIDI，演奏速度偏离乐谱速度时用它按演奏速度重新合成参考音频
+    """
     # 固定采样率加载
     sr_target = 16000
-    y_ref, sr_ref = librosa.load(ref_path, sr=sr_target)
+    if ref_audio is not None:
+        y_ref = to_mono_resampled(ref_audio[0], ref_audio[1], sr_target)
+        sr_ref = sr_target
+    else:
+        y_ref, sr_ref = librosa.load(ref_path, sr=sr_target)
     y_user, sr_user = librosa.load(user_path, sr=sr_target)
 
+    # 先用onset估计演奏速度，把参考音频调整到演奏速度后再对齐
+    ref_onsets = librosa.onset.onset_detect(y=y_ref, sr=sr_ref, units='time')
+    user_onsets = librosa.onset.onset_detect(y=y_user, sr=sr_user, units='time')
+    tempo_ratio = estimate_tempo_ratio(ref_onsets, user_onsets)
+    y_ref_matched, applied_ratio = match_reference_tempo(y_ref, sr_ref, tempo_ratio, ref_midi)
+
     # MFCC 特征
-    ref_mfcc = librosa.feature.mfcc(y=y_ref, sr=sr_ref, n_mfcc=20)
+    ref_mfcc = librosa.feature.mfcc(y=y_ref_matched, sr=sr_ref, n_mfcc=20)
     user_mfcc = librosa.feature.mfcc(y=y_user, sr=sr_user, n_mfcc=20)
 
-    # DTW 对齐
-    distance, alignment = fastdtw(ref_mfcc.T, user_mfcc.T, dist=norm)
+    # DTW 对齐（速度已匹配，路径接近对角线，最小的搜索半径即可对准）
+    distance, alignment = fastdtw(ref_mfcc.T, user_mfcc.T, radius=DTW_RADIUS, dist=norm)
 
     # 基频提取
-    f0_ref, _, _ = librosa.pyin(y_ref, sr=sr_ref,
+    f0_ref, _, _ = librosa.pyin(y_ref_matched, sr=sr_ref,
                                fmin=librosa.note_to_hz('C2'),
                                fmax=librosa.note_to_hz('C7'))
     f0_user, _, _ = librosa.pyin(y_user, sr=sr_user,
@@ -92,9 +167,9 @@ def compare_audio2(ref_path, user_path, unique_id=None):
 
     pitch_error = np.mean(np.abs(f0_ref_aligned - f0_user_aligned)) if len(f0_ref_aligned) > 0 else 0
 
-    # 节奏误差 - 使用onset检测+双指标评分
+    # 节奏误差 - 使用onset检测+双指标评分（与乐谱速度的参考音频比较）
     rhythm_score, tempo_error, stability_error = calculate_rhythm_score(
-        y_ref, sr_ref, y_user, sr_user
+        y_ref, sr_ref, y_user, sr_user, ref_onsets, user_onsets
     )
 
     # 评分计算
@@ -136,7 +211,8 @@ def compare_audio2(ref_path, user_path, unique_id=None):
         pitch_segment_scores_f0.append(pitch_seg_score)
 
         # 节奏分段评分：使用onset检测（每个segment对应的时间范围）
-        seg_ref_times = librosa.frames_to_time([idx_ref for idx_ref, _ in segment], sr=sr_ref)
+        # 参考帧来自调整速度后的音频，换算回乐谱速度下的时间
+        seg_ref_times = librosa.frames_to_time([idx_ref for idx_ref, _ in segment], sr=sr_ref) / applied_ratio
         seg_user_times = librosa.frames_to_time([idx_user for _, idx_user in segment], sr=sr_user)
 
         if len(seg_ref_times) > 0 and len(seg_user_times) > 0:
@@ -168,10 +244,12 @@ def compare_audio2(ref_path, user_path, unique_id=None):
         "rhythm_error": round(tempo_error, 4),
         "rhythm_stability_error": round(stability_error, 4),
         "rhythm_score": round(rhythm_score),
+        "tempo_ratio": round(tempo_ratio, 3),
         "pitch_score": round(pitch_score),
         "suggestions": suggestions,
         "segment_scores_pitch": pitch_segment_scores_f0,
         "segment_scores_rhythm": rhythm_segment_scores,
+        "segment_size": segment_size,
         "chart": svg_path
     }
 
@@ -233,6 +311,7 @@ if __name__ == "__main__":
     print(f"\n【节奏分析】")
     print(f"  整体速度误差: {result['rhythm_error']} 秒（onset时间差，越低越好）")
     print(f"  节奏稳定性误差: {result['rhythm_stability_error']} 秒（去均值后的波动，越低越好）")
+    print(f"  速度比例: {result['tempo_ratio']}（演奏时长/乐谱时长，1.0为原速）")
     print(f"  节奏评分: {result['rhythm_score']}（范围0~100，速度40% + 稳定性60%）")
     print(f"\n【改进建议】")
     for s in result['suggestions']:
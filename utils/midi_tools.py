@@ -2,6 +2,8 @@ import inspect
 from music21 import converter, stream, instrument
 from midi2audio import FluidSynth
 from config.instruments import get_midi_instruments
+from utils.musicxml_fast import musicxml_to_midi_fast, UnsupportedScoreError
+from utils.audio_codec import encode_audio, decode_audio, get_render_sample_rate
 def get_instruments_from_score(file_path):
     """
     读取 MusicXML 文件，返回声部对应的乐器名称列表。
@@ -50,37 +52,100 @@ def musicxml_to_midi2(xml_path, midi_path, instrument_name=None):
         if "badly formed repeats" in str(e) or "cannot expand Stream" in str(e) or "repeat" in str(e).lower():
             print(f"⚠️ 检测到repeat标记问题，尝试处理repeat后重新转换...")
 
-            # 方法1: 尝试展开repeat
-            try:
-                expanded_score = score.expandRepeats()
-                expanded_score.write('midi', fp=midi_path)
-                print(f"✅ 转换完成（已展开repeat）")
-                return
-            except Exception as expand_e:
-                print(f"⚠️ 展开repeat失败: {expand_e}")
-
-            # 方法2: 移除所有repeat相关的标记
-            print(f"🔧 尝试移除repeat标记...")
-            from music21 import repeat
-            for part in score.parts:
-                # 移除repeat相关的元素
-                repeats_to_remove = []
-                for element in part.recurse():
-                    if hasattr(element, 'classes') and any('Repeat' in cls for cls in element.classes):
-                        repeats_to_remove.append(element)
-                for repeat_elem in repeats_to_remove:
-                    try:
-                        part.remove(repeat_elem, recurse=True)
-                    except:
-                        pass
-            # 重新尝试写入
+            # 展开repeat，失败时移除repeat标记
+            score = expand_or_strip_repeats(score)
             score.write('midi', fp=midi_path)
-            print(f"✅ 转换完成（已移除repeat标记）")
+            print(f"✅ 转换完成（已处理repeat）")
         else:
             # 如果不是repeat问题，重新抛出异常
             raise e
 
 
+def expand_or_strip_repeats(score):
+    """
+    展开乐谱中的repeat；无法展开时（badly formed repeats）移除所有repeat相关标记。
+    返回处理后的乐谱，之后写出MIDI不会再因repeat出错。
+    """
+    try:
+        return score.expandRepeats()
+    except Exception as expand_e:
+        print(f"⚠️ 展开repeat失败: {expand_e}")
+
+    print(f"🔧 尝试移除repeat标记...")
+    for part in score.parts:
+        repeats_to_remove = []
+        for element in part.recurse():
+            if hasattr(element, 'classes') and any('Repeat' in cls for cls in element.classes):
+                repeats_to_remove.append(element)
+        for repeat_elem in repeats_to_remove:
+            try:
+                part.remove(repeat_elem, recurse=True)
+            except:
+                pass
+    return score
+
+
+def normalize_musicxml(xml_path, normalized_xml_path, midi_path, instrument_name=None):
+    """
+    乐谱规范化：只在上传时执行一次。
+    展开（或移除）repeat 后写出规范化的 MusicXML 和对应的 MIDI，
+    之后的合成都从规范化结果开始，不再重复处理repeat。
+
+    参数：
+    - xml_path: 原始 MusicXML 文件路径
+    - normalized_xml_path: 输出的规范化 MusicXML 路径
+    - midi_path: 输出的规范 MIDI 路径
+    - instrument_name: 如果指定，MIDI 使用这个乐器；为 None 时保持原有乐器
+
+    返回：
+    - bool: 规范化是否成功
+    """
+    import os
+
+    try:
+        score = converter.parse(xml_path)
+        score = expand_or_strip_repeats(score)
+
+        os.makedirs(os.path.dirname(normalized_xml_path), exist_ok=True)
+        score.write('musicxml', fp=normalized_xml_path)
+
+        # 规范化后的乐谱不再含repeat，可以直接（或经快速路径）转换
+        os.makedirs(os.path.dirname(midi_path), exist_ok=True)
+        musicxml_to_midi_auto(normalized_xml_path, midi_path, instrument_name)
+
+        if not os.path.exists(midi_path) or os.path.getsize(midi_path) == 0:
+            print(f"❌ 规范MIDI生成失败或为空")
+            return False
+
+        print(f"✅ 乐谱规范化完成: {normalized_xml_path}")
+        return True
+
+    except Exception as e:
+        print(f"❌ 乐谱规范化失败: {e}")
+        return False
+
+
+def musicxml_to_midi_auto(xml_path, midi_path, instrument_name=None):
+    """
+    将 MusicXML 转换为 MIDI：单声部简单乐谱走流式快速路径，
+    超出支持范围时回退到 music21 的 musicxml_to_midi2。
+    """
+    program = None
+    if instrument_name is not None:
+        program = getattr(instrument, instrument_name)().midiProgram
+
+    try:
+        note_count = musicxml_to_midi_fast(xml_path, midi_path, program)
+        print(f"⚡ 快速路径转换完成（{note_count} 个音符）")
+        return
+    except UnsupportedScoreError as e:
+        print(f"ℹ️ 快速路径不适用（{e}），使用 music21 转换")
+    except Exception as e:
+        print(f"⚠️ 快速路径转换失败（{e}），使用 music21 转换")
+
+    musicxml_to_midi2(xml_path, midi_path, instrument_name)
+
+
 def merge_musicxml_to_midi(xml_paths, output_midi_path, instrument_name=None):
     print(f"xml_paths: {xml_paths}")
     print(f"output_midi_path: {output_midi_path}")
@@ -92,6 +157,11 @@ def merge_musicxml_to_midi(xml_paths, output_midi_path, instrument_name=None):
     - output_midi_path: 输出的 MIDI 路径
     - instrument_name: 如果指定，将强制所有声部使用这个乐器
     """
+    # 只有一个乐谱时无需合并，直接转换（可走快速路径）
+    if len(xml_paths) == 1:
+        musicxml_to_midi_auto(xml_paths[0], output_midi_path, instrument_name)
+        return
+
     combined_score = stream.Score()
 
     for xml_path in xml_paths:
@@ -123,40 +193,116 @@ def merge_musicxml_to_midi(xml_paths, output_midi_path, instrument_name=None):
         if "badly formed repeats" in str(e) or "cannot expand Stream" in str(e) or "repeat" in str(e).lower():
             print(f"⚠️ 检测到repeat标记问题，尝试处理repeat后重新转换...")
 
-            # 方法1: 尝试展开repeat
-            try:
-                expanded_score = combined_score.expandRepeats()
-                expanded_score.write('midi', fp=output_midi_path)
-                print(f"✅ 合并完成（已展开repeat），输出文件：{output_midi_path}")
-                return
-            except Exception as expand_e:
-                print(f"⚠️ 展开repeat失败: {expand_e}")
-
-            # 方法2: 移除所有repeat相关的标记
-            print(f"🔧 尝试移除repeat标记...")
-            from music21 import repeat
-            for part in combined_score.parts:
-                # 移除repeat相关的元素
-                repeats_to_remove = []
-                for element in part.recurse():
-                    if hasattr(element, 'classes') and any('Repeat' in cls for cls in element.classes):
-                        repeats_to_remove.append(element)
-                for repeat_elem in repeats_to_remove:
-                    try:
-                        part.remove(repeat_elem, recurse=True)
-                    except:
-                        pass
-            # 重新尝试写入
+            # 展开repeat，失败时移除repeat标记
+            combined_score = expand_or_strip_repeats(combined_score)
             combined_score.write('midi', fp=output_midi_path)
-            print(f"✅ 合并完成（已移除repeat标记），输出文件：{output_midi_path}")
+            print(f"✅ 合并完成（已处理repeat），输出文件：{output_midi_path}")
         else:
             # 如果不是repeat问题，重新抛出异常
             raise e
 
 
-def midi_to_mp3(midi_path, mp3_path, soundfont_path):
-    fs = FluidSynth(sound_font=soundfont_path)
-    fs.midi_to_audio(midi_path, mp3_path)
+def render_midi_audio(midi_path, soundfont_path, sample_rate=44100):
+    """
+    用 FluidSynth 合成 MIDI，返回未压缩的 (PCM, 采样率)。
+    FluidSynth 只能输出 WAV，这里写到临时文件后读入内存。
+    """
+    import os
+    import tempfile
+
+    fd, temp_wav = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        fs = FluidSynth(sound_font=soundfont_path, sample_rate=sample_rate)
+        fs.midi_to_audio(midi_path, temp_wav)
+        return decode_audio(temp_wav)
+    finally:
+        if os.path.exists(temp_wav):
+            os.remove(temp_wav)
+
+def scale_midi_tempo(midi_path, output_midi_path, tempo_ratio):
+    """
+    按比例整体改变MIDI速度：tempo_ratio > 1 表示放慢（时长变为原来的 tempo_ratio 倍）。
+    只需改写文件头中的每四分音符tick数，所有音轨和速度事件都按同一比例缩放。
+    """
+    with open(midi_path, 'rb') as f:
+        data = bytearray(f.read())
+
+    if data[:4] != b'MThd' or len(data) < 14:
+        raise ValueError(f"不是有效的MIDI文件: {midi_path}")
+
+    division = int.from_bytes(data[12:14], 'big')
+    if division & 0x8000:
+        raise ValueError("不支持SMPTE时间格式的MIDI文件")
+
+    new_division = max(1, min(0x7FFF, round(division / tempo_ratio)))
+    data[12:14] = new_division.to_bytes(2, 'big')
+
+    with open(output_midi_path, 'wb') as f:
+        f.write(data)
+    return output_midi_path
+
+def render_midi_at_tempo(midi_path, soundfont_path, tempo_ratio, sample_rate=44100):
+    """按指定速度比例合成MIDI，返回未压缩的 (PCM, 采样率)"""
+    import os
+    import tempfile
+
+    fd, scaled_midi = tempfile.mkstemp(suffix='.mid')
+    os.close(fd)
+    try:
+        scale_midi_tempo(midi_path, scaled_midi, tempo_ratio)
+        return render_midi_audio(scaled_midi, soundfont_path, sample_rate)
+    finally:
+        if os.path.exists(scaled_midi):
+            os.remove(scaled_midi)
+
+def midi_to_mp3(midi_path, mp3_path, soundfont_path, bitrate_kbps=None):
+    """
+    合成 MIDI 并编码为压缩音频（格式由 mp3_path 的扩展名决定：.mp3 / .ogg / .opus）
+
+    返回未压缩的 (PCM, 采样率)，评分时可直接使用，无需再解码压缩文件。
+    """
+    samples, sample_rate = render_midi_audio(midi_path, soundfont_path, get_render_sample_rate(mp3_path))
+    encode_audio(samples, sample_rate, mp3_path, bitrate_kbps)
+    return samples, sample_rate
+
+def render_midi_to_mp3(midi_path, output_mp3_path, soundfont_path="data/FluidR3_GM.sf2"):
+    """
+    将MIDI文件渲染为MP3文件并验证结果
+
+    返回：
+    - bool: 生成是否成功
+    """
+    import os
+
+    if not os.path.exists(soundfont_path):
+        print(f"❌ 音色库文件不存在: {soundfont_path}")
+        return False
+
+    # 确保输出目录存在
+    os.makedirs(os.path.dirname(output_mp3_path), exist_ok=True)
+
+    # 转换为MP3
+    print(f"🎵 转换MIDI为MP3...")
+    midi_to_mp3(midi_path, output_mp3_path, soundfont_path)
+
+    # 验证MP3文件是否生成成功
+    if not os.path.exists(output_mp3_path):
+        print(f"❌ MP3文件生成失败")
+        return False
+
+    if os.path.getsize(output_mp3_path) == 0:
+        print(f"❌ MP3文件生成为空")
+        return False
+
+    # 验证MP3文件大小合理（至少1KB）
+    mp3_size = os.path.getsize(output_mp3_path)
+    if mp3_size < 1024:
+        print(f"❌ MP3文件过小，可能生成异常: {mp3_size}字节")
+        return False
+
+    print(f"✅ MP3生成成功: {output_mp3_path} ({mp3_size/1024:.1f}KB)")
+    return True
 
 def synthesize_all_sheets_to_mp3(xml_paths, output_mp3_path, soundfont_path="data/FluidR3_GM.sf2"):
     """
@@ -231,37 +377,15 @@ def synthesize_single_sheet_to_mp3(xml_path, output_mp3_path, instrument_name=No
 
         # 转换为MIDI
         print(f"🎼 转换MusicXML为MIDI...")
-        musicxml_to_midi2(xml_path, temp_midi, instrument_name)
+        musicxml_to_midi_auto(xml_path, temp_midi, instrument_name)
 
         # 验证MIDI文件是否生成成功
         if not os.path.exists(temp_midi) or os.path.getsize(temp_midi) == 0:
             print(f"❌ MIDI文件生成失败或为空")
             return False
 
-        # 确保输出目录存在
-        os.makedirs(os.path.dirname(output_mp3_path), exist_ok=True)
-
-        # 转换为MP3
-        print(f"🎵 转换MIDI为MP3...")
-        midi_to_mp3(temp_midi, output_mp3_path, soundfont_path)
-
-        # 验证MP3文件是否生成成功
-        if not os.path.exists(output_mp3_path):
-            print(f"❌ MP3文件生成失败")
-            return False
-
-        if os.path.getsize(output_mp3_path) == 0:
-            print(f"❌ MP3文件生成为空")
-            return False
-
-        # 验证MP3文件大小合理（至少1KB）
-        mp3_size = os.path.getsize(output_mp3_path)
-        if mp3_size < 1024:
-            print(f"❌ MP3文件过小，可能生成异常: {mp3_size}字节")
-            return False
-
-        print(f"✅ MP3生成成功: {output_mp3_path} ({mp3_size/1024:.1f}KB)")
-        return True
+        # 转换为MP3并验证
+        return render_midi_to_mp3(temp_midi, output_mp3_path, soundfont_path)
 
     except Exception as e:
         print(f"❌ MP3生成过程出错: {str(e)}")
@@ -0,0 +1,405 @@
+"""
+MusicXML 快速转 MIDI 工具模块
+
+对单声部（单个 part）的简单独奏乐谱，直接用 iterparse 流式读取 MusicXML，
+生成 MIDI 音符事件，绕过 music21 的 converter.parse → score.write('midi') 流程。
+
+支持：连音线（tie）、反复记号与跳房子（repeat / ending）、速度标记（sound tempo / metronome）、
+和弦、多声部（backup / forward）、力度（sound dynamics）。
+不支持的乐谱（多个 part、D.C./D.S. 跳转、打击乐等）抛出 UnsupportedScoreError，
+由调用方回退到 music21 的 musicxml_to_midi2。
+"""
+import os
+import struct
+import zipfile
+import xml.etree.ElementTree as ET
+
+# 输出 MIDI 的时间分辨率
+TICKS_PER_QUARTER = 480
+
+# 默认速度（与 music21 / MIDI 默认值一致）
+DEFAULT_TEMPO = 120.0
+
+# MusicXML 中 dynamics="100" 对应的力度值（forte = 90）
+DEFAULT_VELOCITY = 90
+
+# 节拍单位到四分音符倍数的映射（用于 metronome 标记）
+BEAT_UNIT_QUARTERS = {
+    "whole": 4.0,
+    "half": 2.0,
+    "quarter": 1.0,
+    "eighth": 0.5,
+    "16th": 0.25,
+    "32nd": 0.125,
+}
+
+# 音名到半音的映射
+STEP_SEMITONES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+
+# 会导致跳转（无法按简单反复展开）的 sound 属性
+JUMP_ATTRIBUTES = ("dacapo", "dalsegno", "tocoda", "fine")
+
+
+class UnsupportedScoreError(ValueError):
+    """乐谱超出快速路径支持的范围"""
+    pass
+
+
+def open_musicxml(file_path: str):
+    """
+    打开 MusicXML 文件，返回二进制文件对象。
+    .mxl 为压缩格式，从 META-INF/container.xml 中找到主文件后直接在压缩包内读取。
+    """
+    if not file_path.lower().endswith(".mxl"):
+        return open(file_path, "rb")
+
+    zf = zipfile.ZipFile(file_path)
+    rootfile = None
+    try:
+        container = ET.fromstring(zf.read("META-INF/container.xml"))
+        for element in container.iter():
+            if element.tag.endswith("rootfile") and element.get("full-path"):
+                rootfile = element.get("full-path")
+                break
+    except KeyError:
+        pass
+
+    if rootfile is None:
+        candidates = [n for n in zf.namelist()
+                      if not n.startswith("META-INF/") and n.lower().endswith((".xml", ".musicxml"))]
+        if not candidates:
+            zf.close()
+            raise UnsupportedScoreError(f"MXL 文件中没有找到 MusicXML 内容: {file_path}")
+        rootfile = candidates[0]
+
+    return zf.open(rootfile)
+
+
+def _parse_ending_numbers(number: str) -> set:
+    """解析 ending 的 number 属性，例如 "1"、"1, 2"、"1-3" """
+    numbers = set()
+    for token in number.replace(" ", "").split(","):
+        if not token:
+            continue
+        if "-" in token:
+            low, high = token.split("-", 1)
+            numbers.update(range(int(low), int(high) + 1))
+        else:
+            numbers.add(int(token))
+    return numbers
+
+
+def _metronome_tempo(metronome) -> float:
+    """将 metronome 标记换算为每分钟四分音符数"""
+    beat_unit = metronome.findtext("beat-unit")
+    per_minute = metronome.findtext("per-minute")
+    if not beat_unit or not per_minute:
+        return None
+    try:
+        quarters = BEAT_UNIT_QUARTERS[beat_unit]
+        bpm = float(per_minute)
+    except (KeyError, ValueError):
+        return None
+    if metronome.find("beat-unit-dot") is not None:
+        quarters *= 1.5
+    return bpm * quarters
+
+
+def _parse_measure(measure, state: dict) -> dict:
+    """
+    解析单个小节，返回以 tick 为单位的紧凑结构：
+    - length: 小节长度
+    - notes: [(偏移, 时值, 音高, 连音开始, 连音结束, 力度)]
+    - tempos: [(偏移, 速度)]
+    - forward / backward / endings / ending_end: 反复记号信息
+    """
+    cursor = 0
+    length = 0
+    last_onset = 0
+    notes = []
+    tempos = []
+    info = {"forward": False, "backward": 0, "endings": None, "ending_end": False}
+
+    def to_ticks(divisions_value):
+        return int(round(float(divisions_value) * TICKS_PER_QUARTER / state["divisions"]))
+
+    for child in measure:
+        tag = child.tag
+
+        if tag == "attributes":
+            divisions = child.findtext("divisions")
+            if divisions:
+                state["divisions"] = float(divisions)
+            transpose = child.find("transpose")
+            if transpose is not None:
+                chromatic = int(transpose.findtext("chromatic", "0"))
+                octave_change = int(transpose.findtext("octave-change", "0"))
+                state["transpose"] = chromatic + octave_change * 12
+
+        elif tag == "note":
+            if child.find("grace") is not None or child.find("cue") is not None:
+                continue
+            if child.find("unpitched") is not None:
+                raise UnsupportedScoreError("不支持无音高（打击乐）音符")
+
+            duration = to_ticks(child.findtext("duration", "0"))
+            is_chord = child.find("chord") is not None
+            onset = last_onset if is_chord else cursor
+
+            pitch = child.find("pitch")
+            if pitch is not None:
+                step = pitch.findtext("step")
+                octave = int(pitch.findtext("octave"))
+                alter = float(pitch.findtext("alter", "0"))
+                midi_pitch = (octave + 1) * 12 + STEP_SEMITONES[step] + int(round(alter)) + state["transpose"]
+                tie_types = {tie.get("type") for tie in child.findall("tie")}
+                notes.append((onset, duration, midi_pitch,
+                              "start" in tie_types, "stop" in tie_types, state["velocity"]))
+
+            if not is_chord:
+                last_onset = cursor
+                cursor += duration
+                length = max(length, cursor)
+
+        elif tag == "backup":
+            cursor -= to_ticks(child.findtext("duration", "0"))
+
+        elif tag == "forward":
+            cursor += to_ticks(child.findtext("duration", "0"))
+            length = max(length, cursor)
+
+        elif tag in ("direction", "sound"):
+            sounds = [child] if tag == "sound" else child.findall("sound")
+            tempo = None
+            for sound in sounds:
+                if any(sound.get(attr) for attr in JUMP_ATTRIBUTES):
+                    raise UnsupportedScoreError("不支持 D.C./D.S./Coda 跳转")
+                if sound.get("tempo"):
+                    tempo = float(sound.get("tempo"))
+                if sound.get("dynamics"):
+                    velocity = round(DEFAULT_VELOCITY * float(sound.get("dynamics")) / 100)
+                    state["velocity"] = max(1, min(127, velocity))
+            if tempo is None and tag == "direction":
+                metronome = child.find("direction-type/metronome")
+                if metronome is not None:
+                    tempo = _metronome_tempo(metronome)
+            if tempo:
+                tempos.append((cursor, tempo))
+
+        elif tag == "barline":
+            repeat = child.find("repeat")
+            if repeat is not None:
+                if repeat.get("direction") == "forward":
+                    info["forward"] = True
+                elif repeat.get("direction") == "backward":
+                    info["backward"] = int(repeat.get("times", "2"))
+            ending = child.find("ending")
+            if ending is not None:
+                if ending.get("type") == "start":
+                    state["endings"] = _parse_ending_numbers(ending.get("number", "1"))
+                elif ending.get("type") in ("stop", "discontinue"):
+                    # OMR 结果中常缺少 ending 的 start，此时以本小节作为完整的结尾
+                    info["endings"] = state["endings"] or _parse_ending_numbers(ending.get("number", "1"))
+                    info["ending_end"] = True
+                    state["endings"] = None
+
+    if info["endings"] is None:
+        info["endings"] = state["endings"]
+
+    info.update(length=length, notes=notes, tempos=tempos)
+    return info
+
+
+def _expand_repeats(measures: list) -> list:
+    """按反复记号和跳房子展开小节顺序，返回小节索引列表"""
+    order = []
+    i = 0
+    start = 0
+    pass_number = 1
+    jumps = {}
+
+    while i < len(measures):
+        measure = measures[i]
+
+        if measure["forward"] and start != i:
+            start = i
+            pass_number = 1
+
+        # 跳房子：不属于本遍的结尾直接跳过
+        if measure["endings"] and pass_number not in measure["endings"]:
+            i += 1
+            continue
+
+        order.append(i)
+
+        if measure["backward"]:
+            taken = jumps.get(i, 0)
+            if taken < measure["backward"] - 1:
+                jumps[i] = taken + 1
+                pass_number += 1
+                i = start
+                continue
+            jumps.pop(i, None)
+            start = i + 1
+            pass_number = 1
+        elif measure["endings"] and measure["ending_end"]:
+            start = i + 1
+            pass_number = 1
+
+        i += 1
+
+    # 有小节在任何一遍中都不会被演奏，说明反复结构有误（常见于 OMR 识别错误）
+    if len(set(order)) < len(measures):
+        raise UnsupportedScoreError("反复记号结构不完整，无法展开")
+
+    return order
+
+
+def read_musicxml_notes(xml_path: str) -> dict:
+    """
+    流式读取单声部 MusicXML，返回展开反复后的音符事件。
+
+    返回：
+    - notes: [(开始tick, 结束tick, 音高, 力度)]，按开始时间排序
+    - tempos: [(tick, 每分钟四分音符数)]
+    - program: 乐谱中声明的 MIDI 音色（0 起），未声明时为 None
+    """
+    state = {"divisions": 1.0, "transpose": 0, "velocity": DEFAULT_VELOCITY, "endings": None}
+    measures = []
+    part_count = 0
+    score_part_count = 0
+    program = None
+
+    with open_musicxml(xml_path) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        for event, element in context:
+            tag = element.tag
+            if event == "start":
+                if tag == "score-timewise":
+                    raise UnsupportedScoreError("不支持 score-timewise 格式")
+                if tag == "part":
+                    part_count += 1
+                    if part_count > 1:
+                        raise UnsupportedScoreError("快速路径仅支持单声部乐谱")
+                continue
+
+            if tag == "score-part":
+                score_part_count += 1
+                midi_program = element.findtext("midi-instrument/midi-program")
+                if midi_program and program is None:
+                    program = max(0, int(midi_program) - 1)
+                if element.findtext("midi-instrument/midi-channel") == "10":
+                    raise UnsupportedScoreError("不支持打击乐声部")
+            elif tag == "part-list":
+                if score_part_count > 1:
+                    raise UnsupportedScoreError("快速路径仅支持单声部乐谱")
+                element.clear()
+            elif tag == "measure":
+                measures.append(_parse_measure(element, state))
+                element.clear()
+
+    if not measures:
+        raise UnsupportedScoreError(f"乐谱中没有小节: {xml_path}")
+
+    notes = []
+    tempos = []
+    open_ties = {}
+    measure_start = 0
+
+    for index in _expand_repeats(measures):
+        measure = measures[index]
+        for offset, tempo in measure["tempos"]:
+            tempos.append((measure_start + offset, tempo))
+        for offset, duration, pitch, tie_start, tie_stop, velocity in measure["notes"]:
+            onset = measure_start + offset
+            if tie_stop and pitch in open_ties:
+                # 连音线：延长前一个音符，而不是重新发音
+                note = open_ties[pitch]
+                note[1] = onset + duration
+            else:
+                note = [onset, onset + duration, pitch, velocity]
+                notes.append(note)
+            if tie_start:
+                open_ties[pitch] = note
+            else:
+                open_ties.pop(pitch, None)
+        measure_start += measure["length"]
+
+    if not tempos or tempos[0][0] > 0:
+        tempos.insert(0, (0, DEFAULT_TEMPO))
+
+    notes = [tuple(note) for note in notes if note[1] > note[0]]
+    notes.sort(key=lambda note: (note[0], note[2]))
+
+    return {"notes": notes, "tempos": tempos, "program": program}
+
+
+def _variable_length(value: int) -> bytes:
+    """MIDI 变长数值编码"""
+    buffer = value & 0x7F
+    value >>= 7
+    result = bytearray()
+    while value:
+        buffer = (buffer << 8) | ((value & 0x7F) | 0x80)
+        value >>= 7
+    while True:
+        result.append(buffer & 0xFF)
+        if buffer & 0x80:
+            buffer >>= 8
+        else:
+            break
+    return bytes(result)
+
+
+def write_midi(notes: list, tempos: list, midi_path: str, program: int = 0, channel: int = 0):
+    """
+    将音符事件写为单轨（format 0）标准 MIDI 文件
+
+    参数：
+    - notes: [(开始tick, 结束tick, 音高, 力度)]
+    - tempos: [(tick, 每分钟四分音符数)]
+    - program: MIDI 音色编号（0 起）
+    """
+    # (tick, 排序键, 数据)：同一 tick 上先处理速度，再关音，最后开音
+    events = []
+    for tick, tempo in tempos:
+        microseconds = int(round(60_000_000 / tempo))
+        events.append((tick, 0, b"\xff\x51\x03" + microseconds.to_bytes(3, "big")))
+    events.append((0, 1, bytes([0xC0 | channel, program & 0x7F])))
+    for start, end, pitch, velocity in notes:
+        pitch = max(0, min(127, pitch))
+        events.append((start, 3, bytes([0x90 | channel, pitch, velocity])))
+        events.append((end, 2, bytes([0x80 | channel, pitch, 0])))
+    events.sort(key=lambda event: (event[0], event[1]))
+
+    track = bytearray()
+    last_tick = 0
+    for tick, _, data in events:
+        track += _variable_length(tick - last_tick) + data
+        last_tick = tick
+    track += b"\x00\xff\x2f\x00"
+
+    os.makedirs(os.path.dirname(midi_path) or ".", exist_ok=True)
+    with open(midi_path, "wb") as f:
+        f.write(b"MThd" + struct.pack(">IHHH", 6, 0, 1, TICKS_PER_QUARTER))
+        f.write(b"MTrk" + struct.pack(">I", len(track)) + bytes(track))
+
+
+def musicxml_to_midi_fast(xml_path: str, midi_path: str, program: int = None) -> int:
+    """
+    快速将单声部 MusicXML 转换为 MIDI
+
+    参数：
+    - program: 指定 MIDI 音色（0 起）；为 None 时使用乐谱中声明的音色
+
+    返回写入的音符数量；乐谱不在支持范围内时抛出 UnsupportedScoreError。
+    """
+    score = read_musicxml_notes(xml_path)
+    if not score["notes"]:
+        raise UnsupportedScoreError(f"乐谱中没有可发音的音符: {xml_path}")
+
+    if program is None:
+        program = score["program"] or 0
+
+    write_midi(score["notes"], score["tempos"], midi_path, program)
+    return len(score["notes"])
@@ -2,11 +2,35 @@
 import subprocess
 import os
 import re
-def run_audiveris(image_path, output_path):
-    audiveris_bin = "Audiveris/app/bin/audiveris"
+import signal
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import (
+    OMR_USE_DAEMON, OMR_CACHE_DIR, OMR_PAGE_PARALLEL, OMR_PAGE_WORKERS, OMR_PAGE_TIMEOUT, OMR_JVM_MEMORY_MB,
+    OMR_PREPROCESS
+)
+from utils.omr_cache import (
+    omr_cache_key, get_cached_omr, get_cached_pages, get_omr_cache_dir, store_omr_result, get_omr_lock
+)
+from utils.omr_pages import get_pdf_page_count, get_pdf_page_digests, split_pdf_pages, merge_page_scores
+from utils.omr_preprocess import is_preprocessable, preprocess_signature, preprocess_for_omr
+from utils.omr_scheduler import scheduler, OmrQueueTimeout, OmrTimeout
 
-    if not os.path.exists(audiveris_bin):
-        print(f"❌ Audiveris 可执行文件不存在: {audiveris_bin}")
+AUDIVERIS_BIN = "Audiveris/app/bin/audiveris"
+
+
+def run_audiveris(image_path, output_path, timeout=None, on_log=None):
+    """
+    以命令行方式运行 Audiveris 识别乐谱
+
+    参数：
+    - timeout: 超时时间（秒），超时后结束整个识别进程组并抛出 OmrTimeout
+    - on_log: 逐行接收识别日志的回调，用于实时显示识别进度
+    """
+    if not os.path.exists(AUDIVERIS_BIN):
+        print(f"❌ Audiveris 可执行文件不存在: {AUDIVERIS_BIN}")
         return
 
     if not os.path.exists(image_path):
@@ -15,19 +39,258 @@ def run_audiveris(image_path, output_path):
 
     os.makedirs(output_path, exist_ok=True)
 
+    # 限制 JVM 堆内存，与调度器的内存预算保持一致
+    env = dict(os.environ)
+    env["AUDIVERIS_OPTS"] = f"{env.get('AUDIVERIS_OPTS', '')} -Xmx{OMR_JVM_MEMORY_MB}m".strip()
+
+    process = subprocess.Popen(
+        [AUDIVERIS_BIN, "-batch", "-export", "-output", output_path, image_path],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        env=env,
+        start_new_session=True
+    )
+
+    # 逐行读取日志；超时由计时器结束进程组，读取随之结束
+    timed_out = threading.Event()
+
+    def on_timeout():
+        timed_out.set()
+        _kill_process_group(process)
+
+    timer = threading.Timer(timeout, on_timeout) if timeout else None
+    if timer:
+        timer.daemon = True
+        timer.start()
+
+    log_lines = []
     try:
-        result = subprocess.run(
-            [audiveris_bin, "-batch", "-export", "-output", output_path, image_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            check=True
-        )
-        print("✅ Audiveris 运行成功")
-        print(result.stdout)
-        # 从 stdout 中提取 .mxl 文件路径
-        mxl_paths = re.findall(r"Score .*? exported to (.*?\.mxl)", result.stdout)
-        return mxl_paths
-    except subprocess.CalledProcessError as e:
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            log_lines.append(line)
+            if on_log:
+                on_log(line)
+        process.wait()
+    finally:
+        if timer:
+            timer.cancel()
+
+    if timed_out.is_set():
+        print(f"❌ Audiveris 识别超时（{timeout} 秒），已结束识别进程: {image_path}")
+        raise OmrTimeout(f"识别超时: {image_path}")
+
+    log = "\n".join(log_lines)
+    if process.returncode != 0:
         print("❌ Audiveris 执行出错：")
-        print(e.stderr)
+        print(log)
+        return
+
+    print("✅ Audiveris 运行成功")
+    print(log)
+    # 从日志中提取 .mxl 文件路径
+    mxl_paths = re.findall(r"Score .*? exported to (.*?\.mxl)", log)
+    return mxl_paths
+
+
+def _kill_process_group(process, grace_seconds=5):
+    """先发送 SIGTERM，宽限期后仍未退出则 SIGKILL 整个进程组（启动脚本及其 JVM）"""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=grace_seconds)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+    except ProcessLookupError:
+        pass
+
+
+def get_page_timeout(image_path):
+    """按页数计算识别超时时间：每页 OMR_PAGE_TIMEOUT 秒"""
+    pages = get_pdf_page_count(image_path) if image_path.lower().endswith(".pdf") else 1
+    return OMR_PAGE_TIMEOUT * max(1, pages)
+
+
+def _recognize(image_path, output_path, progress=None, part=None):
+    """
+    实际执行识别：经调度器排队后，优先交给常驻 Audiveris 进程处理，
+    省去每次启动JVM的开销；常驻进程不可用时退回命令行方式。
+    识别超时或排队超时返回 None。
+
+    参数：
+    - progress: 识别进度（utils.omr_progress.OmrProgress），识别日志逐行交给它解析
+    - part: 本次识别在进度中的单元名
+    """
+    label = os.path.basename(image_path)
+    part = part or label
+    timeout = get_page_timeout(image_path)
+    on_log = (lambda line: progress.feed(part, line)) if progress else None
+    try:
+        if progress:
+            progress.update(part, "QUEUED")
+        with scheduler.slot(label):
+            if progress:
+                progress.update(part, "STARTED")
+            if not OMR_USE_DAEMON:
+                return run_audiveris(image_path, output_path, timeout=timeout, on_log=on_log)
+
+            from utils.omr_daemon import acquire_daemon, OmrDaemonError
+            try:
+                with acquire_daemon() as daemon:
+                    return daemon.recognize(image_path, output_path, timeout=timeout, on_log=on_log)
+            except OmrTimeout:
+                raise
+            except OmrDaemonError as e:
+                print(f"⚠️ 常驻识别进程不可用，改用命令行识别: {e}")
+                return run_audiveris(image_path, output_path, timeout=timeout, on_log=on_log)
+    except OmrTimeout:
+        scheduler.record_timeout()
+        return None
+    except OmrQueueTimeout as e:
+        print(f"❌ {e}")
+        return None
+
+
+def _should_preprocess(image_path):
+    return OMR_PREPROCESS and is_preprocessable(image_path)
+
+
+def _cache_key(image_path):
+    """识别结果缓存键，开启预处理时包含预处理参数"""
+    return omr_cache_key(image_path, preprocess_signature() if _should_preprocess(image_path) else "")
+
+
+def run_omr(image_path, known_pages=None, progress=None):
+    """
+    识别乐谱图片/PDF，返回识别出的 .mxl 路径列表，失败时返回 None。
+
+    结果按（文件内容 + Audiveris 版本）缓存在 OMR_CACHE_DIR 下，
+    同一份乐谱只识别一次，之后直接返回缓存中的 .mxl 文件。
+
+    参数：
+    - known_pages: 上次按页识别的结果 {页面内容哈希: MusicXML路径}（来自 SheetPage），
+      多页PDF中内容未变化的页直接复用，只重新识别有变化的页
+    - progress: 识别进度（utils.omr_progress.OmrProgress），后台识别时由 submit_omr 传入
+    """
+    if not os.path.exists(image_path):
+        print(f"❌ 输入图片不存在: {image_path}")
+        return
+
+    return _run_omr(image_path, _cache_key(image_path), known_pages, progress)
+
+
+def _run_omr(image_path, cache_key, known_pages=None, progress=None, part=None):
+    """按给定缓存键识别（见 run_omr），part 为本次识别在进度中的单元名"""
+    preprocess = _should_preprocess(image_path)
+    part = part or os.path.basename(image_path)
+    cached = get_cached_omr(cache_key)
+    if cached:
+        print(f"✅ 命中OMR识别缓存: {image_path}")
+        if progress:
+            progress.update(part, "CACHED")
+        return cached
+
+    with get_omr_lock(cache_key):
+        # 等待期间其他线程可能已完成识别
+        cached = get_cached_omr(cache_key)
+        if cached:
+            print(f"✅ 命中OMR识别缓存: {image_path}")
+            if progress:
+                progress.update(part, "CACHED")
+            return cached
+
+        os.makedirs(OMR_CACHE_DIR, exist_ok=True)
+        work_dir = tempfile.mkdtemp(prefix="omr_", dir=OMR_CACHE_DIR)
+        try:
+            pages = None
+            if OMR_PAGE_PARALLEL and image_path.lower().endswith(".pdf") and get_pdf_page_count(image_path) > 1:
+                merged_path, pages = _recognize_pdf_by_pages(image_path, cache_key, work_dir, known_pages, progress)
+                if merged_path:
+                    return store_omr_result(cache_key, image_path, [merged_path], pages=pages)
+                print(f"⚠️ 按页识别未全部成功，改为整本识别: {image_path}")
+                if progress:
+                    progress.expect_parts(1)
+
+            # 图片先做预处理（结果按内容缓存），PDF 直接交给 Audiveris
+            source_path = preprocess_for_omr(image_path) if preprocess else image_path
+            mxl_paths = _recognize(source_path, work_dir, progress, part)
+            mxl_paths = [path for path in (mxl_paths or []) if os.path.exists(path)]
+            if not mxl_paths:
+                return None
+            return store_omr_result(cache_key, image_path, mxl_paths, pages=pages)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _recognize_pdf_by_pages(pdf_path, cache_key, work_dir, known_pages=None, progress=None):
+    """
+    将多页PDF拆成单页并行识别，再按页码顺序合并。
+    每页按页面内容哈希识别和缓存：替换其中一页后，只有该页会重新交给 Audiveris，
+    其余页直接使用 known_pages 中上次的结果或识别缓存。
+
+    返回：
+    - (合并后的MusicXML路径或None, 每页识别结果列表)
+      任一页识别失败时合并路径为 None
+    """
+    pages_dir = os.path.join(get_omr_cache_dir(cache_key), "pages")
+    page_paths = split_pdf_pages(pdf_path, pages_dir)
+    page_digests = get_pdf_page_digests(pdf_path)
+    known_pages = known_pages or {}
+    if progress:
+        progress.expect_parts(len(page_paths))
+
+    def recognize_page(page):
+        page_path, page_digest = page
+        part = os.path.basename(page_path)
+        known_mxl = known_pages.get(page_digest)
+        if known_mxl and os.path.exists(known_mxl):
+            if progress:
+                progress.update(part, "REUSED")
+            return [known_mxl]
+        return _run_omr(page_path, omr_cache_key(page_path, content_digest=page_digest),
+                        progress=progress, part=part)
+
+    reused = sum(1 for digest in page_digests
+                 if known_pages.get(digest) and os.path.exists(known_pages[digest]))
+    print(f"📄 {os.path.basename(pdf_path)} 共 {len(page_paths)} 页，使用 {OMR_PAGE_WORKERS} 个识别进程并行识别")
+    if reused:
+        print(f"♻️ {reused} 页内容未变化，复用上次识别结果，只识别其余 {len(page_paths) - reused} 页")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(OMR_PAGE_WORKERS, len(page_paths))),
+                            thread_name_prefix="omr-page") as executor:
+        page_results = list(executor.map(recognize_page, zip(page_paths, page_digests)))
+
+    pages = []
+    page_mxls = []
+    for page_number, (page_path, page_digest, mxl_paths) in enumerate(
+            zip(page_paths, page_digests, page_results), start=1):
+        pages.append({
+            "page_number": page_number,
+            "image_path": page_path,
+            "content_hash": page_digest,
+            "musicxml_path": mxl_paths[0] if mxl_paths else None,
+            "status": "processed" if mxl_paths else "failed",
+        })
+        page_mxls.extend(mxl_paths or [])
+
+    failed = [page["page_number"] for page in pages if page["status"] == "failed"]
+    if failed:
+        print(f"⚠️ 第 {', '.join(map(str, failed))} 页识别失败")
+        return None, pages
+
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    try:
+        merged_path = merge_page_scores(page_mxls, os.path.join(work_dir, f"{stem}.musicxml"))
+    except Exception as e:
+        print(f"⚠️ 合并分页识别结果失败: {e}")
+        return None, pages
+
+    print(f"✅ 分页识别完成，已合并 {len(page_paths)} 页")
+    return merged_path, pages
+
+
+def get_omr_pages(image_path):
+    """返回多页PDF按页识别的每页结果（见 _recognize_pdf_by_pages），未按页识别时返回 None"""
+    if not os.path.exists(image_path):
+        return None
+    return get_cached_pages(_cache_key(image_path))
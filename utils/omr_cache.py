@@ -0,0 +1,151 @@
+"""
+OMR 识别结果缓存
+
+识别结果由（输入图片/PDF内容 + Audiveris 版本）唯一确定，按内容哈希保存在 data/omr_cache 下，
+同一份乐谱无论从哪里调用（上传、合成、评分、补生成MP3）都只识别一次。
+"""
+import os
+import json
+import shutil
+import hashlib
+import zipfile
+import threading
+from functools import lru_cache
+from config.settings import OMR_CACHE_DIR, AUDIVERIS_HOME
+
+MANIFEST_NAME = "manifest.json"
+
+# 正在识别的缓存键，避免同一文件被并发重复识别
+_omr_locks = {}
+_omr_locks_guard = threading.Lock()
+
+
+def file_digest(file_path: str) -> str:
+    """计算文件内容的 SHA-1"""
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=1)
+def get_audiveris_version() -> str:
+    """
+    返回 Audiveris 版本标识，作为缓存键的一部分：
+    - 环境变量 MUSIC_EVALUATOR_AUDIVERIS_VERSION 优先
+    - 否则读取 audiveris.jar 中的 Implementation-Version，
+      并附加 lib 目录下所有 jar 的名称和大小指纹（升级依赖也会使缓存失效）
+    """
+    override = os.environ.get("MUSIC_EVALUATOR_AUDIVERIS_VERSION")
+    if override:
+        return override
+
+    lib_dir = os.path.join(AUDIVERIS_HOME, "lib")
+    if not os.path.isdir(lib_dir):
+        return "unknown"
+
+    version = "unknown"
+    main_jar = os.path.join(lib_dir, "audiveris.jar")
+    if os.path.exists(main_jar):
+        try:
+            with zipfile.ZipFile(main_jar) as jar:
+                manifest = jar.read("META-INF/MANIFEST.MF").decode("utf-8", errors="ignore")
+            for line in manifest.splitlines():
+                if line.startswith("Implementation-Version:"):
+                    version = line.split(":", 1)[1].strip()
+                    break
+        except (OSError, KeyError, zipfile.BadZipFile):
+            pass
+
+    fingerprint = hashlib.sha1()
+    for name in sorted(os.listdir(lib_dir)):
+        if name.endswith(".jar"):
+            fingerprint.update(f"{name}:{os.path.getsize(os.path.join(lib_dir, name))};".encode("utf-8"))
+    return f"{version}-{fingerprint.hexdigest()[:8]}"
+
+
+def omr_cache_key(input_path: str, variant: str = "", content_digest: str = None) -> str:
+    """
+    由输入文件内容和 Audiveris 版本计算缓存键
+
+    参数：
+    - variant: 影响识别结果的其他处理参数（如图片预处理），不同参数分别缓存
+    - content_digest: 已知的内容哈希（如PDF单页的页面内容哈希），代替文件内容哈希
+    """
+    digest = hashlib.sha1(get_audiveris_version().encode("utf-8"))
+    digest.update(variant.encode("utf-8"))
+    digest.update((content_digest or file_digest(input_path)).encode("ascii"))
+    return digest.hexdigest()[:20]
+
+
+def get_omr_cache_dir(cache_key: str) -> str:
+    """缓存条目目录"""
+    return os.path.join(OMR_CACHE_DIR, cache_key[:2], cache_key)
+
+
+def get_cached_omr(cache_key: str):
+    """返回已缓存的 .mxl 路径列表，未缓存（或文件缺失）时返回 None"""
+    entry_dir = get_omr_cache_dir(cache_key)
+    manifest_path = os.path.join(entry_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    mxl_paths = [os.path.join(entry_dir, name) for name in manifest.get("mxl_files", [])]
+    if not mxl_paths or not all(os.path.exists(path) for path in mxl_paths):
+        return None
+    return mxl_paths
+
+
+def store_omr_result(cache_key: str, source_path: str, mxl_paths, pages=None) -> list:
+    """
+    把识别出的 .mxl 文件移入缓存条目，返回缓存中的路径列表（保持原顺序）。
+    清单最后写入，读取方只会看到完整的条目。
+
+    参数：
+    - pages: 按页识别时每页的识别结果，一并写入清单
+    """
+    entry_dir = get_omr_cache_dir(cache_key)
+    os.makedirs(entry_dir, exist_ok=True)
+
+    cached_paths = []
+    for mxl_path in mxl_paths:
+        target = os.path.join(entry_dir, os.path.basename(mxl_path))
+        shutil.move(mxl_path, target)
+        cached_paths.append(target)
+
+    manifest = {
+        "source": os.path.basename(source_path),
+        "audiveris_version": get_audiveris_version(),
+        "mxl_files": [os.path.basename(path) for path in cached_paths],
+    }
+    if pages is not None:
+        manifest["pages"] = pages
+    temp_manifest = os.path.join(entry_dir, MANIFEST_NAME + ".tmp")
+    with open(temp_manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_manifest, os.path.join(entry_dir, MANIFEST_NAME))
+    return cached_paths
+
+
+def get_cached_pages(cache_key: str):
+    """返回按页识别时记录的每页结果，没有记录时返回 None"""
+    manifest_path = os.path.join(get_omr_cache_dir(cache_key), MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("pages")
+    except (OSError, ValueError):
+        return None
+
+
+def get_omr_lock(cache_key: str) -> threading.Lock:
+    with _omr_locks_guard:
+        return _omr_locks.setdefault(cache_key, threading.Lock())
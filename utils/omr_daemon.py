@@ -0,0 +1,262 @@
+"""
+常驻 Audiveris 识别进程的客户端
+
+每次调用 Audiveris 命令行都要重新启动 JVM、加载几十个 jar 并初始化 Tesseract/Leptonica，
+实际识别开始前就要花费数秒。这里维护一个常驻的 Java 进程（omr_daemon/OmrDaemon.java），
+通过标准输入/输出逐个提交识别任务，返回值与 utils.omr.run_audiveris 一致。
+
+最多同时运行 OMR_DAEMON_POOL_SIZE 个工作进程（多页PDF按页并行识别时使用），
+每个工作进程处理 OMR_DAEMON_MAX_JOBS 个任务后自动重启，避免内存持续增长。
+"""
+import os
+import re
+import time
+import queue
+import atexit
+import shutil
+import subprocess
+import threading
+from contextlib import contextmanager
+from config.settings import (
+    AUDIVERIS_HOME, OMR_DAEMON_MAX_JOBS, OMR_PAGE_TIMEOUT, OMR_DAEMON_BUILD_DIR,
+    OMR_DAEMON_POOL_SIZE, OMR_JVM_MEMORY_MB
+)
+from utils.omr_scheduler import OmrTimeout
+
+DAEMON_SOURCE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             "omr_daemon", "OmrDaemon.java")
+DAEMON_CLASS = "OmrDaemon"
+
+# Audiveris 启动脚本中的 JVM 参数，外加允许拦截 System.exit、无界面运行和堆内存上限
+JVM_OPTIONS = [
+    "--add-exports=java.desktop/sun.awt.image=ALL-UNNAMED",
+    "--add-exports=java.desktop/com.apple.eawt=ALL-UNNAMED",
+    "-Djava.security.manager=allow",
+    "-Djava.awt.headless=true",
+    f"-Xmx{OMR_JVM_MEMORY_MB}m",
+]
+
+# 启动（含类加载）允许的最长时间（秒）
+STARTUP_TIMEOUT = 120
+
+MXL_PATTERN = re.compile(r"Score .*? exported to (.*?\.mxl)")
+
+
+class OmrDaemonError(RuntimeError):
+    """常驻识别进程不可用或异常退出"""
+
+
+def _java_command(tool: str) -> str:
+    """优先使用 JAVA_HOME 中的 java/javac"""
+    java_home = os.environ.get("JAVA_HOME")
+    if java_home:
+        candidate = os.path.join(java_home, "bin", tool)
+        if os.path.exists(candidate):
+            return candidate
+    found = shutil.which(tool)
+    if not found:
+        raise OmrDaemonError(f"找不到 {tool}，无法启动常驻识别进程")
+    return found
+
+
+def _classpath(*entries) -> str:
+    return os.pathsep.join(entries + (os.path.join(AUDIVERIS_HOME, "lib", "*"),))
+
+
+def ensure_daemon_compiled() -> str:
+    """编译常驻进程（源文件有更新时重新编译），返回 class 所在目录"""
+    class_file = os.path.join(OMR_DAEMON_BUILD_DIR, f"{DAEMON_CLASS}.class")
+    if os.path.exists(class_file) and os.path.getmtime(class_file) >= os.path.getmtime(DAEMON_SOURCE):
+        return OMR_DAEMON_BUILD_DIR
+
+    os.makedirs(OMR_DAEMON_BUILD_DIR, exist_ok=True)
+    result = subprocess.run(
+        [_java_command("javac"), "-encoding", "UTF-8", "-nowarn",
+         "-cp", _classpath(), "-d", OMR_DAEMON_BUILD_DIR, DAEMON_SOURCE],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+    if result.returncode != 0:
+        raise OmrDaemonError(f"常驻识别进程编译失败：{result.stderr.strip()}")
+    print(f"✅ 常驻识别进程已编译: {OMR_DAEMON_BUILD_DIR}")
+    return OMR_DAEMON_BUILD_DIR
+
+
+class AudiverisDaemon:
+    """
+    单个常驻 Audiveris 工作进程
+
+    同一时间只处理一个任务（线程安全）；处理 max_jobs 个任务后在下一个任务前自动重启。
+    """
+
+    def __init__(self, max_jobs: int = OMR_DAEMON_MAX_JOBS, job_timeout: int = OMR_PAGE_TIMEOUT):
+        self.max_jobs = max_jobs
+        self.job_timeout = job_timeout
+        self.jobs_done = 0
+        self._process = None
+        self._lines = None
+        self._lock = threading.Lock()
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _read_stdout(self, process, lines):
+        """后台线程：把进程输出逐行放入队列，进程结束时放入 None"""
+        for line in process.stdout:
+            lines.put(line.rstrip("\n"))
+        lines.put(None)
+
+    def _next_line(self, timeout, during_job=False):
+        try:
+            line = self._lines.get(timeout=timeout)
+        except queue.Empty:
+            # 无响应的 JVM 直接强制结束，下一个任务会启动新的工作进程
+            self.kill()
+            if during_job:
+                raise OmrTimeout("识别超过时限，已结束常驻识别进程")
+            raise OmrDaemonError(f"常驻识别进程 {timeout} 秒内无响应")
+        if line is None:
+            self._process = None
+        return line
+
+    def start(self):
+        """启动工作进程并等待其就绪"""
+        build_dir = ensure_daemon_compiled()
+        log_path = os.path.join(OMR_DAEMON_BUILD_DIR, "daemon.log")
+        with open(log_path, "a", encoding="utf-8") as log_file:
+            self._process = subprocess.Popen(
+                [_java_command("java"), *JVM_OPTIONS, "-cp", _classpath(build_dir), DAEMON_CLASS],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=log_file,
+                text=True,
+                encoding="utf-8",
+                bufsize=1
+            )
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read_stdout, args=(self._process, self._lines),
+                         name="audiveris-daemon-reader", daemon=True).start()
+        self.jobs_done = 0
+
+        line = self._next_line(STARTUP_TIMEOUT)
+        if line != "READY":
+            self.stop()
+            raise OmrDaemonError(f"常驻识别进程启动失败，详见 {log_path}")
+        print(f"✅ 常驻识别进程已启动 (pid={self._process.pid})")
+
+    def stop(self):
+        """结束工作进程"""
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            process.stdin.close()
+            process.wait(timeout=10)
+        except Exception:
+            process.kill()
+            process.wait()
+
+    def kill(self):
+        """强制结束工作进程"""
+        process, self._process = self._process, None
+        if process is not None:
+            process.kill()
+            process.wait()
+
+    def recognize(self, image_path: str, output_path: str, timeout: int = None, on_log=None):
+        """
+        识别一个乐谱文件，返回值同 run_audiveris：
+        - 成功时返回导出的 .mxl 路径列表
+        - Audiveris 报错时返回 None
+
+        识别超过 timeout 秒（默认 job_timeout）时强制结束工作进程并抛出 OmrTimeout；
+        工作进程异常退出时抛出 OmrDaemonError。
+        on_log 逐行接收识别过程中的日志。
+        """
+        if "\t" in image_path or "\n" in image_path or "\t" in output_path or "\n" in output_path:
+            raise OmrDaemonError("路径中包含制表符或换行符，无法提交给常驻识别进程")
+
+        with self._lock:
+            # 达到任务上限时重启，回收 JVM 内存
+            if self.is_alive() and self.jobs_done >= self.max_jobs:
+                print(f"♻️ 常驻识别进程已处理 {self.jobs_done} 个任务，重启以回收内存")
+                self.stop()
+            if not self.is_alive():
+                self.start()
+
+            try:
+                self._process.stdin.write(f"{image_path}\t{output_path}\n")
+                self._process.stdin.flush()
+            except (BrokenPipeError, OSError) as e:
+                self.stop()
+                raise OmrDaemonError(f"无法提交识别任务：{e}")
+
+            # 超时按整个任务计算，而不是两行日志之间的间隔
+            deadline = time.monotonic() + (timeout or self.job_timeout)
+            log_lines = []
+            while True:
+                line = self._next_line(max(0.0, deadline - time.monotonic()), during_job=True)
+                if line is None:
+                    # 进程在任务中退出：导出已完成时仍可使用结果
+                    mxl_paths = MXL_PATTERN.findall("\n".join(log_lines))
+                    if mxl_paths:
+                        return mxl_paths
+                    raise OmrDaemonError("常驻识别进程在任务中意外退出")
+                if line.startswith("LOG "):
+                    log_lines.append(line[4:])
+                    if on_log:
+                        on_log(line[4:])
+                elif line.startswith("DONE "):
+                    status = int(line[5:] or -1)
+                    break
+
+            self.jobs_done += 1
+            log = "\n".join(log_lines)
+            if status != 0:
+                print("❌ Audiveris 执行出错：")
+                print(log)
+                return None
+
+            print("✅ Audiveris 运行成功（常驻进程）")
+            print(log)
+            return MXL_PATTERN.findall(log)
+
+
+_pool = None
+_daemons = []
+_daemon_guard = threading.Lock()
+
+
+def _get_pool() -> queue.Queue:
+    """进程内共享的工作进程池（各工作进程首次使用时才启动）"""
+    global _pool
+    with _daemon_guard:
+        if _pool is None:
+            _pool = queue.Queue()
+            for _ in range(max(1, OMR_DAEMON_POOL_SIZE)):
+                daemon = AudiverisDaemon()
+                _daemons.append(daemon)
+                _pool.put(daemon)
+        return _pool
+
+
+@contextmanager
+def acquire_daemon():
+    """从进程池中取出一个空闲的工作进程，用完后归还；全部忙碌时等待"""
+    pool = _get_pool()
+    daemon = pool.get()
+    try:
+        yield daemon
+    finally:
+        pool.put(daemon)
+
+
+def shutdown_daemon():
+    """结束所有常驻识别进程"""
+    with _daemon_guard:
+        for daemon in _daemons:
+            daemon.stop()
+
+
+atexit.register(shutdown_daemon)
@@ -0,0 +1,140 @@
+"""
+多页PDF按页识别的辅助函数
+
+Audiveris 会在一个进程中依次处理整本PDF。这里把PDF拆成单页，
+由多个识别进程并行处理，再把各页的 MusicXML 按页码顺序合并成一份乐谱。
+"""
+import os
+import hashlib
+import xml.etree.ElementTree as ET
+from utils.musicxml_fast import open_musicxml
+
+
+def get_pdf_page_count(pdf_path: str) -> int:
+    """返回PDF页数，无法读取时返回 0"""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        print("⚠️ 未安装 pypdf，无法按页识别PDF")
+        return 0
+
+    try:
+        return len(PdfReader(pdf_path).pages)
+    except Exception as e:
+        print(f"⚠️ 读取PDF页数失败: {pdf_path}, 错误: {e}")
+        return 0
+
+
+def split_pdf_pages(pdf_path: str, output_dir: str) -> list:
+    """
+    将PDF拆分为单页PDF，返回按页码排序的文件路径列表。
+    文件名为 <原文件名>_p001.pdf，已存在的页面文件直接复用。
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    reader = PdfReader(pdf_path)
+
+    page_paths = []
+    for index, page in enumerate(reader.pages, start=1):
+        page_path = os.path.join(output_dir, f"{stem}_p{index:03d}.pdf")
+        if not os.path.exists(page_path):
+            writer = PdfWriter()
+            writer.add_page(page)
+            temp_path = page_path + ".tmp"
+            with open(temp_path, "wb") as f:
+                writer.write(f)
+            os.replace(temp_path, page_path)
+        page_paths.append(page_path)
+    return page_paths
+
+
+def _hash_pdf_object(obj, digest, seen):
+    """递归把PDF对象的内容写入摘要（跳过指向父节点的 /Parent，避免把整份文档算进来）"""
+    from pypdf.generic import IndirectObject, DictionaryObject, ArrayObject, StreamObject
+
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref in seen:
+            digest.update(b"<ref>")
+            return
+        seen.add(ref)
+        obj = obj.get_object()
+
+    if isinstance(obj, StreamObject):
+        try:
+            digest.update(obj.get_data())
+        except Exception:
+            digest.update(obj._data)
+    if isinstance(obj, DictionaryObject):
+        for key in sorted(obj.keys()):
+            if key in ("/Parent", "/Length"):
+                continue
+            digest.update(key.encode("utf-8"))
+            _hash_pdf_object(obj[key], digest, seen)
+    elif isinstance(obj, ArrayObject):
+        digest.update(b"[")
+        for item in obj:
+            _hash_pdf_object(item, digest, seen)
+        digest.update(b"]")
+    elif not isinstance(obj, StreamObject):
+        digest.update(repr(obj).encode("utf-8"))
+
+
+def get_pdf_page_digests(pdf_path: str) -> list:
+    """
+    计算每一页的内容哈希（页面内容流、字体/图片等资源、页面尺寸），按页码排序。
+    只与页面本身有关：替换其中一页后，其他页的哈希保持不变。
+    """
+    from pypdf import PdfReader
+
+    digests = []
+    for page in PdfReader(pdf_path).pages:
+        digest = hashlib.sha1()
+        _hash_pdf_object(page, digest, set())
+        digests.append(digest.hexdigest())
+    return digests
+
+
+def merge_page_scores(mxl_paths, output_path: str) -> str:
+    """
+    按顺序把各页识别出的乐谱合并为一份 MusicXML（partwise）
+
+    以第一页的声部列表为准，后续各页的第 N 个声部的小节依次追加到第 N 个声部之后，
+    小节号重新连续编号。每页开头的 attributes（divisions、调号、拍号）保持不变。
+    """
+    if not mxl_paths:
+        raise ValueError("没有可合并的乐谱")
+
+    with open_musicxml(mxl_paths[0]) as f:
+        tree = ET.parse(f)
+    root = tree.getroot()
+    if root.tag != "score-partwise":
+        raise ValueError(f"不支持的 MusicXML 格式: {root.tag}")
+
+    parts = root.findall("part")
+    next_numbers = []
+    for part in parts:
+        measures = part.findall("measure")
+        for number, measure in enumerate(measures, start=1):
+            measure.set("number", str(number))
+        next_numbers.append(len(measures) + 1)
+
+    for page_index, mxl_path in enumerate(mxl_paths[1:], start=2):
+        with open_musicxml(mxl_path) as f:
+            page_root = ET.parse(f).getroot()
+        page_parts = page_root.findall("part")
+
+        if len(page_parts) != len(parts):
+            print(f"⚠️ 第 {page_index} 页声部数 ({len(page_parts)}) 与第 1 页 ({len(parts)}) 不一致，按顺序对应")
+
+        for part_index, page_part in enumerate(page_parts[:len(parts)]):
+            for measure in page_part.findall("measure"):
+                measure.set("number", str(next_numbers[part_index]))
+                next_numbers[part_index] += 1
+                parts[part_index].append(measure)
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    tree.write(output_path, encoding="UTF-8", xml_declaration=True)
+    return output_path
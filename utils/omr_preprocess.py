@@ -0,0 +1,230 @@
+"""
+OMR 识别前的图片预处理
+
+手机拍摄的乐谱照片分辨率高、带颜色、有倾斜和大片空白边缘，直接交给 Audiveris 会明显拖慢识别。
+这里用 OpenCV 依次完成：灰度化 → 自适应二值化 → 按五线谱纠偏 → 裁掉空白边缘
+→ 线间距过大时缩小到 Audiveris 最适合的尺寸。处理结果按图片内容缓存。
+"""
+import os
+import hashlib
+import numpy as np
+from config.settings import OMR_PREPROCESS_DIR, OMR_TARGET_INTERLINE
+from utils.omr_cache import file_digest
+
+# 预处理算法版本，算法调整后修改此值使旧缓存失效
+PREPROCESS_VERSION = "2"
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+# Audiveris 能可靠识别的最小线间距（像素）
+MIN_INTERLINE = 12
+
+# 只在偏差超过以下阈值时才纠偏/缩放
+MIN_SKEW_DEGREES = 0.1
+MAX_SKEW_DEGREES = 10.0
+MIN_SCALE_CHANGE = 0.1
+SCALE_RANGE = (0.25, 2.0)
+
+
+def is_preprocessable(image_path: str) -> bool:
+    """只处理位图文件，PDF 交给 Audiveris 自行处理"""
+    return image_path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def preprocess_signature() -> str:
+    """预处理参数标识，作为 OMR 缓存键的一部分"""
+    return f"preprocess-v{PREPROCESS_VERSION}-interline{OMR_TARGET_INTERLINE}"
+
+
+def _read_image(image_path: str):
+    import cv2
+    # 用 imdecode 读取，兼容中文路径
+    data = np.fromfile(image_path, dtype=np.uint8)
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+def _write_image(image, output_path: str):
+    import cv2
+    ok, encoded = cv2.imencode(".png", image)
+    if not ok:
+        raise ValueError(f"图片编码失败: {output_path}")
+    temp_path = output_path + ".tmp"
+    encoded.tofile(temp_path)
+    os.replace(temp_path, output_path)
+
+
+def binarize(gray):
+    """自适应阈值二值化（适应手机照片的不均匀光照），墨迹为 0，背景为 255"""
+    import cv2
+    block_size = max(15, (min(gray.shape) // 40) | 1)
+    denoised = cv2.medianBlur(gray, 3)
+    return cv2.adaptiveThreshold(denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, block_size, 15)
+
+
+def estimate_skew(binary) -> float:
+    """
+    用五线谱线估计倾斜角度（度），找不到时返回 0
+    只在水平方向 ±MAX_SKEW_DEGREES 范围内做霍夫变换，返回值可直接传给 deskew
+    """
+    import cv2
+    ink = cv2.bitwise_not(binary)
+    width = binary.shape[1]
+    max_skew = np.radians(MAX_SKEW_DEGREES)
+    lines = cv2.HoughLines(ink, 1, np.pi / 3600, threshold=width // 2,
+                           min_theta=np.pi / 2 - max_skew, max_theta=np.pi / 2 + max_skew)
+    if lines is None:
+        return 0.0
+
+    thetas = lines.reshape(-1, 2)[:, 1]
+    return float(np.median(np.degrees(thetas)) - 90)
+
+
+def deskew(binary, angle: float):
+    """按角度旋转图片，空出的区域填充白色"""
+    import cv2
+    height, width = binary.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(binary, matrix, (width, height), flags=cv2.INTER_NEAREST,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+
+
+def estimate_interline(binary):
+    """
+    估计五线谱线间距（像素）：统计纵向的黑、白游程长度，
+    最常见的黑游程为谱线粗细，最常见的白游程为两条谱线之间的空白，二者之和即线间距。
+    无法估计时返回 None。
+    """
+    height, width = binary.shape
+    black_runs = []
+    white_runs = []
+    for x in range(0, width, max(1, width // 100)):
+        column = binary[:, x] == 0
+        changes = np.flatnonzero(np.diff(column.astype(np.int8))) + 1
+        bounds = np.concatenate(([0], changes, [height]))
+        lengths = np.diff(bounds)
+        is_black = column[bounds[:-1]]
+        black_runs.extend(lengths[is_black])
+        # 首尾的白游程是页边空白，不计入
+        white_runs.extend(lengths[~is_black][1:-1])
+
+    if not black_runs or not white_runs:
+        return None
+
+    line_thickness = int(np.argmax(np.bincount(np.clip(black_runs, 0, 50))))
+    # minlength 保证下标 200 存在（没有超过 200 像素的空白时 bincount 不会自动补齐）
+    white_counts = np.bincount(np.clip(white_runs, 0, 200), minlength=201)
+    white_counts[:3] = 0  # 忽略噪点造成的极短空白
+    white_counts[200] = 0
+    gap = int(np.argmax(white_counts))
+    if line_thickness == 0 or gap == 0:
+        return None
+    return line_thickness + gap
+
+
+def crop_margins(binary, padding: int):
+    """裁掉四周的空白边缘，保留 padding 像素的留白"""
+    import cv2
+    ink = cv2.bitwise_not(binary)
+    # 开运算去掉孤立噪点，避免噪点撑大裁剪范围
+    ink = cv2.morphologyEx(ink, cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+    points = cv2.findNonZero(ink)
+    if points is None:
+        return binary
+
+    x, y, w, h = cv2.boundingRect(points)
+    height, width = binary.shape
+    top, bottom = max(0, y - padding), min(height, y + h + padding)
+    left, right = max(0, x - padding), min(width, x + w + padding)
+    return binary[top:bottom, left:right]
+
+
+def rescale_to_interline(binary, interline, target_interline: int = OMR_TARGET_INTERLINE):
+    """
+    按线间距缩放图片，返回 (图片, 缩放比例)
+    - 线间距大于目标值时缩小到目标值，减少识别的像素量
+    - 线间距小于 MIN_INTERLINE 时放大到 MIN_INTERLINE，避免谱线过细无法识别
+    """
+    import cv2
+    if not interline:
+        return binary, 1.0
+
+    if interline > target_interline:
+        scale = target_interline / interline
+    elif interline < MIN_INTERLINE:
+        scale = MIN_INTERLINE / interline
+    else:
+        return binary, 1.0
+
+    scale = float(np.clip(scale, *SCALE_RANGE))
+    if abs(scale - 1.0) < MIN_SCALE_CHANGE:
+        return binary, 1.0
+
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+    resized = cv2.resize(binary, None, fx=scale, fy=scale, interpolation=interpolation)
+    _, resized = cv2.threshold(resized, 127, 255, cv2.THRESH_BINARY)
+    return resized, scale
+
+
+def preprocess_image(image_path: str, output_path: str) -> dict:
+    """
+    预处理一张乐谱图片并保存为 PNG
+
+    返回处理信息：原始尺寸、倾斜角度、线间距、缩放比例、输出尺寸
+    """
+    import cv2
+
+    image = _read_image(image_path)
+    if image is None:
+        raise ValueError(f"无法读取图片: {image_path}")
+    original_size = (image.shape[1], image.shape[0])
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    binary = binarize(gray)
+
+    angle = estimate_skew(binary)
+    if abs(angle) >= MIN_SKEW_DEGREES:
+        binary = deskew(binary, angle)
+
+    interline = estimate_interline(binary)
+    binary = crop_margins(binary, padding=2 * (interline or 10))
+    binary, scale = rescale_to_interline(binary, interline)
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    _write_image(binary, output_path)
+
+    return {
+        "original_size": original_size,
+        "skew_degrees": round(angle, 2),
+        "interline": interline,
+        "scale": round(scale, 3),
+        "output_size": (binary.shape[1], binary.shape[0]),
+    }
+
+
+def get_preprocessed_path(image_path: str) -> str:
+    """预处理结果的缓存路径（按图片内容和预处理参数区分，文件名保留原图名）"""
+    digest = hashlib.sha1(preprocess_signature().encode("utf-8"))
+    digest.update(file_digest(image_path).encode("ascii"))
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(OMR_PREPROCESS_DIR, digest.hexdigest()[:20], f"{stem}.png")
+
+
+def preprocess_for_omr(image_path: str) -> str:
+    """
+    返回用于识别的图片路径：命中缓存直接返回，否则预处理后写入缓存。
+    预处理失败时返回原图路径。
+    """
+    output_path = get_preprocessed_path(image_path)
+    if os.path.exists(output_path):
+        return output_path
+
+    try:
+        info = preprocess_image(image_path, output_path)
+    except Exception as e:
+        print(f"⚠️ 图片预处理失败，使用原图识别: {image_path}, 错误: {e}")
+        return image_path
+
+    print(f"✅ 图片预处理完成: {info['original_size']} → {info['output_size']}，"
+          f"倾斜 {info['skew_degrees']}°，线间距 {info['interline']}px，缩放 {info['scale']}")
+    return output_path
@@ -0,0 +1,236 @@
+"""
+OMR 识别进度
+
+Audiveris 对每一页依次执行固定的处理步骤（LOAD、BINARY、SCALE、GRID …… PAGE），并在日志中输出当前步骤。
+这里逐行解析识别日志，把步骤映射为进度百分比并记录为进度事件。
+submit_omr 在后台线程中运行识别，界面和后台任务表通过 get_omr_job / list_omr_jobs 轮询进度。
+"""
+import re
+import time
+import itertools
+import threading
+from collections import OrderedDict
+
+# Audiveris 处理步骤 → (开始时的进度百分比, 说明)，按耗时粗略分配
+OMR_STEPS = OrderedDict([
+    ("LOAD", (2, "加载图片")),
+    ("BINARY", (5, "二值化")),
+    ("SCALE", (12, "估算谱线尺寸")),
+    ("GRID", (16, "识别五线谱")),
+    ("HEADERS", (30, "识别谱号、调号、拍号")),
+    ("STEM_SEEDS", (35, "查找符干")),
+    ("BEAMS", (40, "识别符杠")),
+    ("LEDGERS", (48, "识别加线")),
+    ("HEADS", (52, "识别符头")),
+    ("STEMS", (65, "识别符干")),
+    ("REDUCTION", (70, "筛选符号")),
+    ("CUE_BEAMS", (74, "识别小音符符杠")),
+    ("TEXTS", (76, "识别文字")),
+    ("MEASURES", (82, "划分小节")),
+    ("CHORDS", (85, "组合和弦")),
+    ("CURVES", (87, "识别连线")),
+    ("SYMBOLS", (89, "识别其他符号")),
+    ("LINKS", (93, "关联符号")),
+    ("RHYTHMS", (95, "计算节奏")),
+    ("PAGE", (97, "整理页面")),
+])
+
+# 步骤之外的进度阶段
+EXTRA_STEPS = {
+    "QUEUED": (0, "排队中"),
+    "STARTED": (1, "启动识别"),
+    "EXPORT": (99, "导出乐谱"),
+    "CACHED": (100, "使用缓存结果"),
+    "REUSED": (100, "页面未变化，复用上次结果"),
+    "DONE": (100, "识别完成"),
+    "FAILED": (100, "识别失败"),
+}
+
+STEP_PATTERN = re.compile(r"\b(" + "|".join(OMR_STEPS) + r")\b")
+EXPORT_PATTERN = re.compile(r"exported to")
+
+# 保留的已结束任务数
+MAX_FINISHED_JOBS = 50
+
+
+def parse_step(line: str):
+    """从一行 Audiveris 日志中解析处理步骤，没有步骤信息时返回 None"""
+    if EXPORT_PATTERN.search(line):
+        return "EXPORT"
+    match = STEP_PATTERN.search(line)
+    return match.group(1) if match else None
+
+
+def step_info(step: str):
+    """返回步骤的 (进度百分比, 说明)"""
+    return OMR_STEPS.get(step) or EXTRA_STEPS.get(step) or (0, step)
+
+
+class OmrProgress:
+    """
+    一个识别任务的进度（线程安全）
+
+    任务由一个或多个识别单元组成（多页PDF按页并行识别时每页一个单元），
+    总进度为各单元进度的平均值；每个单元的进度只增不减。
+    """
+
+    def __init__(self, job_id: int, label: str):
+        self.job_id = job_id
+        self.label = label
+        self.status = "queued"  # queued, running, done, failed
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self._expected_parts = 1
+        self._parts = OrderedDict()  # 识别单元 → (进度, 步骤)
+        self._events = []
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+
+    def expect_parts(self, count: int):
+        """设置识别单元数（开始按页识别、或改为整本识别时调用），已记录的单元进度清空"""
+        with self._lock:
+            self._expected_parts = max(1, count)
+            self._parts.clear()
+
+    def update(self, part: str, step: str, message: str = None):
+        """记录识别单元进入某个步骤"""
+        percent, description = step_info(step)
+        with self._lock:
+            if self.status == "queued" and step != "QUEUED":
+                self.status = "running"
+                self.started_at = time.time()
+            previous = self._parts.get(part, (0, None))[0]
+            if percent < previous:
+                return
+            self._parts[part] = (percent, step)
+            self._events.append({
+                "time": time.time(),
+                "part": part,
+                "step": step,
+                "description": description,
+                "percent": self._percent_locked(),
+                "message": message,
+            })
+
+    def feed(self, part: str, line: str):
+        """处理一行识别日志"""
+        step = parse_step(line)
+        if step:
+            self.update(part, step, line.strip())
+
+    def finish(self, result=None, error: str = None):
+        """标记任务结束"""
+        with self._lock:
+            self.result = result
+            self.error = error
+            self.status = "done" if result else "failed"
+            self.finished_at = time.time()
+            step = "DONE" if result else "FAILED"
+            self._events.append({
+                "time": self.finished_at,
+                "part": None,
+                "step": step,
+                "description": step_info(step)[1],
+                "percent": 100,
+                "message": error,
+            })
+        self._finished.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """等待任务结束，返回是否已结束"""
+        return self._finished.wait(timeout)
+
+    def done(self) -> bool:
+        return self._finished.is_set()
+
+    def _percent_locked(self) -> int:
+        total = sum(percent for percent, _ in self._parts.values())
+        return int(total / max(self._expected_parts, len(self._parts)))
+
+    @property
+    def percent(self) -> int:
+        if self.done():
+            return 100
+        with self._lock:
+            return self._percent_locked()
+
+    @property
+    def step_description(self) -> str:
+        """当前步骤说明（多个单元时显示最慢单元的步骤）"""
+        with self._lock:
+            if self.finished_at:
+                return step_info("DONE" if self.result else "FAILED")[1]
+            if not self._parts:
+                return step_info("QUEUED")[1]
+            _, step = min(self._parts.values(), key=lambda item: item[0])
+            if len(self._parts) < self._expected_parts:
+                return f"{step_info(step)[1]}（{len(self._parts)}/{self._expected_parts} 页已开始）"
+            return step_info(step)[1]
+
+    def events(self, since: int = 0) -> list:
+        """返回第 since 个之后的进度事件，轮询方记录已读数量即可增量获取"""
+        with self._lock:
+            return list(self._events[since:])
+
+    def snapshot(self) -> dict:
+        """供任务表显示的当前状态"""
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.job_id,
+            "label": self.label,
+            "status": self.status,
+            "percent": self.percent,
+            "step": self.step_description,
+            "elapsed_seconds": round(end - (self.started_at or self.created_at), 1),
+            "error": self.error,
+        }
+
+
+_jobs = OrderedDict()
+_jobs_guard = threading.Lock()
+_job_ids = itertools.count(1)
+
+
+def _register(job: OmrProgress):
+    with _jobs_guard:
+        _jobs[job.job_id] = job
+        finished = [job_id for job_id, item in _jobs.items() if item.done()]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del _jobs[job_id]
+
+
+def submit_omr(image_path: str, known_pages=None, label: str = None) -> OmrProgress:
+    """
+    在后台线程中识别乐谱，立即返回任务进度对象。
+    任务结束后 progress.result 为识别出的 .mxl 路径列表（失败时为 None）。
+    """
+    from utils.omr import run_omr
+
+    job = OmrProgress(next(_job_ids), label or image_path)
+    _register(job)
+
+    def run():
+        try:
+            job.finish(run_omr(image_path, known_pages=known_pages, progress=job))
+        except Exception as e:
+            print(f"❌ OMR识别任务异常: {image_path}, 错误: {e}")
+            job.finish(error=str(e))
+
+    threading.Thread(target=run, name=f"omr-job-{job.job_id}", daemon=True).start()
+    return job
+
+
+def get_omr_job(job_id: int):
+    """按编号获取识别任务，不存在（或已被清理）时返回 None"""
+    with _jobs_guard:
+        return _jobs.get(job_id)
+
+
+def list_omr_jobs() -> list:
+    """返回所有识别任务的当前状态，最新的在前"""
+    with _jobs_guard:
+        jobs = list(_jobs.values())
+    return [job.snapshot() for job in reversed(jobs)]
@@ -0,0 +1,122 @@
+"""
+OMR 识别任务调度
+
+每个 Audiveris 识别进程都是一个占用数 GB 内存的 JVM。调度器按内存预算限制同时运行的识别任务数，
+超出的任务按提交顺序排队；排队过久的任务直接放弃，避免页面被无限期阻塞。
+同时记录排队深度和等待时间，便于观察识别负载。
+"""
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from config.settings import OMR_MAX_CONCURRENT_JOBS, OMR_QUEUE_TIMEOUT
+
+
+class OmrQueueTimeout(RuntimeError):
+    """识别任务排队超时"""
+
+
+class OmrTimeout(RuntimeError):
+    """识别超时，识别进程已被强制结束"""
+
+
+class OmrScheduler:
+    """按提交顺序（FIFO）分配识别名额的调度器"""
+
+    def __init__(self, max_concurrent: int = OMR_MAX_CONCURRENT_JOBS):
+        self.max_concurrent = max(1, max_concurrent)
+        self._cond = threading.Condition()
+        self._waiting = deque()
+        self._running = 0
+
+        # 统计信息
+        self._started = 0
+        self._finished = 0
+        self._failed = 0
+        self._timed_out = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_run = 0.0
+
+    @contextmanager
+    def slot(self, label: str = "", queue_timeout: float = OMR_QUEUE_TIMEOUT):
+        """
+        申请一个识别名额，名额不足时排队等待
+
+        参数：
+        - label: 任务说明，用于日志
+        - queue_timeout: 最长排队时间（秒），超时抛出 OmrQueueTimeout
+        """
+        ticket = object()
+        enqueued_at = time.monotonic()
+
+        with self._cond:
+            self._waiting.append(ticket)
+            if self._waiting[0] is not ticket or self._running >= self.max_concurrent:
+                print(f"⏳ OMR任务排队中: {label}（{self._running} 个运行中，前面还有 {len(self._waiting) - 1} 个排队）")
+            while self._waiting[0] is not ticket or self._running >= self.max_concurrent:
+                remaining = queue_timeout - (time.monotonic() - enqueued_at)
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    self._rejected += 1
+                    self._cond.notify_all()
+                    raise OmrQueueTimeout(f"OMR任务排队超过 {queue_timeout} 秒: {label}")
+                self._cond.wait(remaining)
+
+            self._waiting.popleft()
+            self._running += 1
+            self._started += 1
+            wait = time.monotonic() - enqueued_at
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            # 队首变化，唤醒下一个等待者
+            self._cond.notify_all()
+
+        if wait >= 1:
+            print(f"▶️ OMR任务开始: {label}（排队 {wait:.1f} 秒）")
+
+        started_at = time.monotonic()
+        try:
+            yield
+        except Exception:
+            with self._cond:
+                self._failed += 1
+            raise
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._finished += 1
+                self._total_run += time.monotonic() - started_at
+                self._cond.notify_all()
+
+    def record_timeout(self):
+        """记录一次识别超时（由执行方在强制结束识别进程后调用）"""
+        with self._cond:
+            self._timed_out += 1
+
+    def stats(self) -> dict:
+        """返回当前队列深度和累计统计"""
+        with self._cond:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "running": self._running,
+                "queue_depth": len(self._waiting),
+                "started": self._started,
+                "finished": self._finished,
+                "failed": self._failed,
+                "timed_out": self._timed_out,
+                "rejected": self._rejected,
+                "avg_wait_seconds": round(self._total_wait / self._started, 2) if self._started else 0.0,
+                "max_wait_seconds": round(self._max_wait, 2),
+                "avg_run_seconds": round(self._total_run / self._finished, 2) if self._finished else 0.0,
+            }
+
+
+# 进程内共享的调度器
+scheduler = OmrScheduler()
+
+
+def get_omr_stats() -> dict:
+    """返回 OMR 调度统计（见 OmrScheduler.stats）"""
+    return scheduler.stats()
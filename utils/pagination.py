@@ -0,0 +1,41 @@
+"""
+列表分页（键集分页）
+
+每页的查询从上一页最后一行的游标开始（见 database/crud.py 的 get_songs_page 等），
+界面在 st.session_state 中保存已经翻过的游标栈：栈为空表示第一页，
+"下一页"压入本页返回的游标，"上一页"弹出栈顶。
+"""
+import math
+import streamlit as st
+
+
+def get_page_cursor(state_key: str):
+    """当前页的游标（第一页为 None）"""
+    stack = st.session_state.get(state_key) or []
+    return stack[-1] if stack else None
+
+
+def reset_page(state_key: str):
+    """回到第一页（游标对应的记录被删除、或列表条件改变时调用）"""
+    st.session_state.pop(state_key, None)
+
+
+def render_pager(state_key: str, next_cursor, total: int, page_size: int):
+    """显示翻页按钮，next_cursor 为 None 表示已经是最后一页"""
+    stack = st.session_state.get(state_key) or []
+    if not stack and next_cursor is None:
+        return
+
+    page_count = max(1, math.ceil(total / page_size))
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("⬅️ 上一页", key=f"{state_key}_prev", disabled=not stack, use_container_width=True):
+            st.session_state[state_key] = stack[:-1]
+            st.rerun()
+    with col_info:
+        st.caption(f"第 {min(len(stack) + 1, page_count)} / {page_count} 页，共 {total} 条")
+    with col_next:
+        if st.button("下一页 ➡️", key=f"{state_key}_next", disabled=next_cursor is None,
+                     use_container_width=True):
+            st.session_state[state_key] = stack + [next_cursor]
+            st.rerun()
@@ -7,15 +7,19 @@ import shutil
 from datetime import datetime
 from database.utils import get_db_session
 from database.crud import (
-    create_recording, get_recordings_by_song, delete_recording, update_recording, get_recording_by_id,
-    create_score, get_solos_by_song, get_scores_by_recording_id
+    create_recording, delete_recording, update_recording, get_recording_by_id,
+    create_score, get_song_by_id, get_solos_by_song, get_recordings_page_with_latest_scores, get_song_counts,
+    get_score_segments, get_archived_recordings_by_song, count_archived_recordings_by_song,
+    get_leaderboard, get_leaderboard_instruments
 )
-from utils.midi_tools import merge_musicxml_to_midi, midi_to_mp3
-from utils.compare_audio2 import compare_audio2
-from utils.omr import run_audiveris
-
-# 永久存储目录
-RECORDING_DIR = "data/recordings"
+from database.archive import restore_recording
+from config.settings import RECORDING_PAGE_SIZE, RECORDING_DIR, LEADERBOARD_SIZE
+from utils.pagination import get_page_cursor, reset_page, render_pager
+from utils.compare_audio2 import compare_audio2, plot_segment_scores_bar
+from utils.reference_cache import get_reference_for_solos, get_reference_midi_path
+from utils.audio_codec import get_audio_extension, get_audio_mime
+
+# 永久存储目录（录音目录见 config/settings.py）
 REFERENCE_AUDIO_DIR = "data/reference_audio"
 
 def ensure_recording_dir():
@@ -35,9 +39,9 @@ def generate_reference_audio_path(song_name: str, instrument: str, recording_id:
     song_dir = os.path.join(REFERENCE_AUDIO_DIR, song_name.replace("/", "_").replace("\\", "_"))
     os.makedirs(song_dir, exist_ok=True)
 
-    # 生成文件名：reference_{instrument}_{recording_id}_{timestamp}.mp3
+    # 生成文件名：reference_{instrument}_{recording_id}_{timestamp}.mp3（扩展名随配置的音频格式）
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"reference_{instrument}_{recording_id}_{timestamp}.mp3"
+    filename = f"reference_{instrument}_{recording_id}_{timestamp}{get_audio_extension()}"
 
     return os.path.join(song_dir, filename)
 
@@ -65,12 +69,12 @@ def save_recording_file(uploaded_file, file_path: str) -> int:
         f.write(uploaded_file.read())
     return os.path.getsize(file_path)
 
-def perform_scoring(db, song_name: str, instrument: str, user_audio_path: str, recording_id: int):
+def perform_scoring(db, song_id: int, instrument: str, user_audio_path: str, recording_id: int):
     """
     执行评分逻辑：
     1. 获取曲目的乐谱文件（图片或PDF）
     2. 如果是图片格式，先进行OMR识别生成MXL文件
-    3. 根据乐器类型合成标准音频：
+    3. 根据乐器类型合成标准音频（命中参考音频缓存时跳过合成）：
        - 如果有对应乐器的乐谱，使用该乐器乐谱合成音频
        - 如果没有对应乐器的乐谱，使用所有乐谱合成合声音频
     4. 与用户上传的音频进行对比评分
@@ -82,72 +86,30 @@ def perform_scoring(db, song_name: str, instrument: str, user_audio_path: str, r
         os.makedirs("data/output", exist_ok=True)
 
         # 获取曲目的所有乐谱
-        solos = get_solos_by_song(db, song_name)
+        song = get_song_by_id(db, song_id)
+        if not song:
+            print(f"❌ 曲目 {song_id} 不存在，无法评分")
+            return None
+        song_name = song.name
+        solos = get_solos_by_song(db, song_id)
         if not solos:
             print(f"❌ 曲目 {song_name} 没有乐谱文件，无法评分")
             return None
 
         # 检查是否有对应乐器的乐谱
         instrument_solos = [solo for solo in solos if solo.instrument == instrument]
-
-        # 生成临时文件路径
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        midi_path = f"tmp/output/ref_{timestamp}.mid"
-        mp3_path = f"tmp/output/ref_{timestamp}.mp3"
-
-        # 处理乐谱文件，区分图片和MXL文件
-        mxl_paths = []
-
-        # 选择要处理的乐谱文件
-        target_solos = instrument_solos if instrument_solos else solos
-
-        for solo in target_solos:
-            if not os.path.exists(solo.file_path):
-                continue
-
-            # 根据文件扩展名判断类型
-            file_ext = solo.file_path.lower().split('.')[-1]
-
-            if file_ext in ['mxl', 'musicxml']:
-                # 直接使用MXL文件
-                mxl_paths.append(solo.file_path)
-                print(f"✅ 直接使用MXL文件: {solo.file_path}")
-
-            elif file_ext in ['png', 'jpg', 'jpeg', 'pdf','PNG', 'JPG', 'JPEG', 'PDF']:
-                # 图片/PDF文件需要OMR识别
-                print(f"🔍 正在识别乐谱图片: {solo.file_path}")
-                try:
-                    # 使用OMR识别生成MXL文件
-                    recognized_mxls = run_audiveris(solo.file_path, "data/output/")
-                    if recognized_mxls and len(recognized_mxls) > 0:
-                        for mxl_file in recognized_mxls:
-                            if os.path.exists(mxl_file):
-                                mxl_paths.append(mxl_file)
-                                print(f"✅ OMR识别成功，生成MXL: {mxl_file}")
-                    else:
-                        print(f"⚠️ OMR识别失败: {solo.file_path}")
-                except Exception as omr_error:
-                    print(f"⚠️ OMR识别异常: {solo.file_path}, 错误: {omr_error}")
-                    continue
-
-        if not mxl_paths:
-            print("❌ 没有可用的MXL文件（原有或识别生成）")
-            return None
-
-        print(f"✅ 共获得 {len(mxl_paths)} 个MXL文件，开始合成音频")
-
-        # 根据乐器类型合成MIDI
-        inst = None if instrument == "合声" else instrument
-
         if instrument_solos:
             print(f"✅ 找到 {len(instrument_solos)} 个 {instrument} 乐谱，使用指定乐器合成")
         else:
             print(f"⚠️ 没有找到 {instrument} 乐谱，使用所有乐谱合成合声")
 
-        merge_musicxml_to_midi(mxl_paths, midi_path, inst)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-        # 将MIDI转换为MP3
-        midi_to_mp3(midi_path, mp3_path, "data/FluidR3_GM.sf2")
+        # 获取参考音频（已预生成或之前合成过时直接命中缓存）
+        mp3_path, reference_audio = get_reference_for_solos(song_name, instrument, solos)
+        if not mp3_path:
+            print("❌ 参考音频合成失败")
+            return None
 
         # 生成持久化参考音频路径并复制文件
         reference_audio_path = generate_reference_audio_path(song_name, instrument, recording_id)
@@ -155,7 +117,10 @@ def perform_scoring(db, song_name: str, instrument: str, user_audio_path: str, r
         print(f"✅ 参考音频已保存: {reference_audio_path}")
 
         # 执行音频对比评分，使用 recording_id 作为唯一标识
-        result = compare_audio2(mp3_path, user_audio_path, f"recording_{recording_id}_{timestamp}")
+        # 刚合成的参考音频直接使用内存中的未压缩数据，无需解码压缩文件
+        # 参考MIDI随参考音频一起缓存，用于按演奏速度重新合成参考音频
+        result = compare_audio2(mp3_path, user_audio_path, f"recording_{recording_id}_{timestamp}",
+                                ref_audio=reference_audio, ref_midi=get_reference_midi_path(mp3_path))
 
         # 保存评分结果到数据库，包含参考音频路径
         create_score(
@@ -169,19 +134,13 @@ def perform_scoring(db, song_name: str, instrument: str, user_audio_path: str, r
             rhythm_stability_error=result.get('rhythm_stability_error', 0),
             suggestions="; ".join(result['suggestions']),
             chart_path=result.get('chart', ''),
-            reference_audio_path=reference_audio_path
+            reference_audio_path=reference_audio_path,
+            segment_scores_pitch=result.get('segment_scores_pitch'),
+            segment_scores_rhythm=result.get('segment_scores_rhythm'),
+            segment_size=result.get('segment_size')
         )
 
-        # 清理临时文件
-        try:
-            if os.path.exists(midi_path):
-                os.remove(midi_path)
-            if os.path.exists(mp3_path):
-                os.remove(mp3_path)
-        except:
-            pass
-
-        print(f"✅ 评分完成，综合评分：{result['score']}/100")
+        print(f"✅ 评分完成，综合评分：{result['score']}/100，速度比例：{result['tempo_ratio']}")
         return result
 
     except Exception as e:
@@ -206,13 +165,15 @@ def perform_scoring_with_selected_solo(db, selected_solo, user_audio_path: str,
             song_name = selected_solo['song_name']
             instrument = selected_solo['instrument']
             original_filename = selected_solo['original_filename']
+            midi_path = selected_solo.get('midi_path')
         else:
             # ORM对象
             solo_id = selected_solo.id
             mp3_path = selected_solo.mp3_path
-            song_name = selected_solo.song_name
+            song_name = selected_solo.song.name
             instrument = selected_solo.instrument
             original_filename = selected_solo.original_filename
+            midi_path = selected_solo.midi_path
 
         # 确保选中的乐谱有MP3文件
         if not mp3_path or not os.path.exists(mp3_path):
@@ -234,7 +195,9 @@ def perform_scoring_with_selected_solo(db, selected_solo, user_audio_path: str,
 
         # 执行音频对比评分，使用 recording_id 作为唯一标识
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        result = compare_audio2(mp3_path, user_audio_path, f"recording_{recording_id}_{timestamp}")
+        # 有规范MIDI时，演奏速度偏离乐谱速度会按演奏速度重新合成参考音频再对齐
+        result = compare_audio2(mp3_path, user_audio_path, f"recording_{recording_id}_{timestamp}",
+                                ref_midi=midi_path)
 
         # 保存评分结果到数据库，包含参考音频路径和参考乐谱ID
         create_score(
@@ -249,10 +212,13 @@ def perform_scoring_with_selected_solo(db, selected_solo, user_audio_path: str,
             rhythm_stability_error=result.get('rhythm_stability_error', 0),
             suggestions="; ".join(result['suggestions']),
             chart_path=result.get('chart', ''),
-            reference_audio_path=reference_audio_path
+            reference_audio_path=reference_audio_path,
+            segment_scores_pitch=result.get('segment_scores_pitch'),
+            segment_scores_rhythm=result.get('segment_scores_rhythm'),
+            segment_size=result.get('segment_size')
         )
 
-        print(f"✅ 评分完成，综合评分：{result['score']}/100")
+        print(f"✅ 评分完成，综合评分：{result['score']}/100，速度比例：{result['tempo_ratio']}")
         print(f"✅ 使用的参考乐谱：{instrument} - {original_filename}")
         return result
 
@@ -260,7 +226,7 @@ def perform_scoring_with_selected_solo(db, selected_solo, user_audio_path: str,
         print(f"❌ 评分失败：{e}")
         return None
 
-def render_recording_upload_form(song_name: str):
+def render_recording_upload_form(song_id: int):
     """渲染演奏录音上传表单"""
     st.subheader("➕ 添加新评分")
 
@@ -275,18 +241,21 @@ def render_recording_upload_form(song_name: str):
     # 获取该曲目的所有乐谱并转换为字典以避免会话分离错误
     try:
         with get_db_session() as db:
-            solos_orm = get_solos_by_song(db, song_name)
+            song = get_song_by_id(db, song_id)
+            song_name = song.name if song else None
+            solos_orm = get_solos_by_song(db, song_id)
             # 将ORM对象转换为字典，避免会话分离错误
             available_solos = []
             for solo in solos_orm:
                 solo_dict = {
                     'id': solo.id,
-                    'song_name': solo.song_name,
+                    'song_name': song_name,
                     'instrument': solo.instrument,
                     'file_path': solo.file_path,
                     'original_filename': solo.original_filename,
                     'file_size': solo.file_size,
                     'mp3_path': solo.mp3_path,
+                    'midi_path': solo.midi_path,
                     'created_at': solo.created_at
                 }
                 available_solos.append(solo_dict)
@@ -348,7 +317,7 @@ def render_recording_upload_form(song_name: str):
                 if mp3_available:
                     st.write("**🎵 乐谱试听：**")
                     with open(selected_solo['mp3_path'], "rb") as audio_file:
-                        st.audio(audio_file.read(), format="audio/mp3")
+                        st.audio(audio_file.read(), format=get_audio_mime(selected_solo['mp3_path']))
     else:
         # 如果没有选中乐谱，设置默认值
         instrument = "合声"
@@ -399,7 +368,7 @@ def render_recording_upload_form(song_name: str):
                 with get_db_session() as db:
                     recording = create_recording(
                         db=db,
-                        song_name=song_name,
+                        song_id=song_id,
                         performer_name=performer_name.strip(),
                         instrument=instrument,
                         audio_path=file_path,
@@ -425,63 +394,148 @@ def render_recording_upload_form(song_name: str):
             except Exception as e:
                 st.error(f"上传录音失败：{e}")
 
-def render_recordings_list(song_name: str):
+def render_recordings_list(song_id: int):
     """显示演奏录音列表"""
     try:
         with get_db_session() as db:
-            recordings = get_recordings_by_song(db, song_name)
+            # 按页加载：录音、最新评分和参考乐谱一次查询取回
+            page_state = f"recording_list_cursors_{song_id}"
+            cursor = get_page_cursor(page_state)
+            recordings, next_cursor = get_recordings_page_with_latest_scores(
+                db, song_id, RECORDING_PAGE_SIZE, cursor)
+            if not recordings and cursor is not None:
+                # 游标对应的录音已被删除，回到第一页
+                reset_page(page_state)
+                recordings, next_cursor = get_recordings_page_with_latest_scores(
+                    db, song_id, RECORDING_PAGE_SIZE)
 
             if not recordings:
                 st.info("该曲目暂无评分，请上传演奏录音")
+                render_archived_recordings(db, song_id)
                 return
 
-            st.subheader(f"已有评分 ({len(recordings)} 个)")
+            counts = get_song_counts(db, song_id)
+            total = counts.recording_count if counts else len(recordings)
+            st.subheader(f"已有评分 ({total} 个)")
 
-            for recording in recordings:
-                render_recording_item(recording)
+            for recording, latest_score in recordings:
+                render_recording_item(recording, latest_score)
+
+            render_pager(page_state, next_cursor, total, RECORDING_PAGE_SIZE)
+            render_archived_recordings(db, song_id)
 
     except Exception as e:
         st.error(f"加载录音列表失败：{e}")
 
-def render_recording_item(recording):
-    """渲染单个录音项"""
-    with st.container():
-        # 获取评分结果
-        try:
-            with get_db_session() as db:
-                scores = get_scores_by_recording_id(db, recording.id)
-                latest_score = scores[0] if scores else None
-
-                # 如果有评分结果，提取需要的数据以避免会话问题
-                score_data = None
-                reference_solo_info = None
-                if latest_score:
-                    score_data = {
-                        'overall_score': latest_score.overall_score,
-                        'pitch_score': latest_score.pitch_score,
-                        'rhythm_score': latest_score.rhythm_score,
-                        'pitch_error': latest_score.pitch_error,
-                        'rhythm_error': latest_score.rhythm_error,
-                        'rhythm_stability_error': getattr(latest_score, 'rhythm_stability_error', None),
-                        'suggestions': latest_score.suggestions,
-                        'chart_path': latest_score.chart_path,
-                        'reference_audio_path': latest_score.reference_audio_path,
-                        'reference_solo_id': latest_score.reference_solo_id
+def render_leaderboard(song_id: int):
+    """显示曲目的排行榜（每种乐器按最高分取前 N 名，直接读取 LeaderboardEntry）"""
+    try:
+        with get_db_session() as db:
+            instruments = get_leaderboard_instruments(db, song_id)
+            if not instruments:
+                return
+
+            with st.expander("🏆 排行榜"):
+                instrument = instruments[0]
+                if len(instruments) > 1:
+                    instrument = st.selectbox("乐器", instruments, key=f"leaderboard_instrument_{song_id}")
+                entries = get_leaderboard(db, song_id, instrument, LEADERBOARD_SIZE)
+                st.dataframe([
+                    {
+                        "名次": rank,
+                        "演奏者": entry.performer_name,
+                        "最高分": entry.best_score,
+                        "最近得分": entry.latest_score,
+                        "平均分": entry.average_score,
+                        "评分次数": entry.score_count,
                     }
+                    for rank, entry in enumerate(entries, 1)
+                ], use_container_width=True, hide_index=True)
 
-                    # 获取参考乐谱信息
-                    if latest_score.reference_solo_id:
-                        from database.crud import get_solo_by_id
-                        ref_solo = get_solo_by_id(db, latest_score.reference_solo_id)
-                        if ref_solo:
-                            reference_solo_info = {
-                                'instrument': ref_solo.instrument,
-                                'original_filename': ref_solo.original_filename,
-                                'created_at': ref_solo.created_at
-                            }
-        except Exception as e:
-            st.error(f"获取评分结果失败：{e}")
-            score_data = None
+    except Exception as e:
+        st.error(f"加载排行榜失败：{e}")
+
+def render_archived_recordings(db, song_id: int):
+    """显示已归档（冷存储）的录音存根，可按需恢复到录音列表"""
+    archived_count = count_archived_recordings_by_song(db, song_id)
+    if not archived_count:
+        return
+
+    with st.expander(f"🗄️ 已归档的录音 ({archived_count})"):
+        st.caption("长时间没有新评分的录音已移到归档存储，恢复后可重新查看详细评分和音频")
+        for stub in get_archived_recordings_by_song(db, song_id):
+            col1, col2, col3 = st.columns([3, 2, 1])
+            with col1:
+                st.markdown(f"**🎤 {stub.performer_name}**")
+                if stub.original_filename:
+                    st.caption(f"文件：{stub.original_filename}")
+            with col2:
+                if stub.overall_score is not None:
+                    st.caption(f"最近评分：{stub.overall_score}/100（共 {stub.score_count} 次）")
+                st.caption(f"上传：{stub.created_at.strftime('%Y-%m-%d %H:%M')}")
+            with col3:
+                if st.button("♻️ 恢复", key=f"restore_recording_{stub.id}"):
+                    with st.spinner("正在从归档恢复..."):
+                        restored = restore_recording(db, stub.id)
+                    if restored:
+                        st.success("✅ 恢复成功！")
+                        st.rerun()
+                    else:
+                        st.error("❌ 恢复失败：归档中找不到该录音")
+
+def render_score_segments(score_id: int, redraw_chart: bool = False):
+    """
+    显示评分的分段音准、节奏分数（按需从 ScoreSegments 读取并解码）
+    redraw_chart 为 True 时（原图表文件已不存在），用分段数据重新绘制评分分析图表
+    """
+    with get_db_session() as db:
+        segments = get_score_segments(db, score_id)
+    if not segments:
+        st.caption("该评分没有保存分段数据（旧版评分）")
+        return
+
+    caption = f"共 {len(segments['pitch'])} 段"
+    if segments['segment_size']:
+        caption += f"，每段 {segments['segment_size']} 个对齐帧"
+    st.caption(caption)
+    st.bar_chart({"音准": segments['pitch'], "节奏": segments['rhythm']}, stack=False)
+
+    if redraw_chart:
+        chart_path = plot_segment_scores_bar(segments['pitch'], segments['rhythm'], f"score_{score_id}")
+        st.image(chart_path, caption="时间段评分分析（由分段数据重新生成）")
+
+def render_recording_item(recording, latest_score=None):
+    """
+    渲染单个录音项
+    latest_score 为该录音最新的评分（已加载参考乐谱），由 get_recordings_page_with_latest_scores 一并查出
+    """
+    with st.container():
+        # 整理评分结果
+        score_data = None
+        reference_solo_info = None
+        if latest_score:
+            score_data = {
+                'overall_score': latest_score.overall_score,
+                'pitch_score': latest_score.pitch_score,
+                'rhythm_score': latest_score.rhythm_score,
+                'pitch_error': latest_score.pitch_error,
+                'rhythm_error': latest_score.rhythm_error,
+                'rhythm_stability_error': getattr(latest_score, 'rhythm_stability_error', None),
+                'suggestions': latest_score.suggestions,
+                'chart_path': latest_score.chart_path,
+                'reference_audio_path': latest_score.reference_audio_path,
+                'reference_solo_id': latest_score.reference_solo_id,
+                'score_id': latest_score.id
+            }
+
+            # 参考乐谱信息
+            ref_solo = latest_score.reference_solo
+            if ref_solo:
+                reference_solo_info = {
+                    'instrument': ref_solo.instrument,
+                    'original_filename': ref_solo.original_filename,
+                    'created_at': ref_solo.created_at
+                }
 
         # 第一行：基本信息和评分
         col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
@@ -588,10 +642,15 @@ def render_recording_item(recording):
             with st.expander("📊 查看详细分析"):
 
                 # 评分分析图表
-                if score_data['chart_path'] and os.path.exists(score_data['chart_path']):
+                chart_exists = bool(score_data['chart_path'] and os.path.exists(score_data['chart_path']))
+                if chart_exists:
                     st.markdown("### 📈 评分分析图表")
                     st.image(score_data['chart_path'], caption="时间段评分分析")
 
+                # 分段评分数据只在需要时读取和解码
+                if st.toggle("显示分段评分数据", key=f"segments_{score_data['score_id']}"):
+                    render_score_segments(score_data['score_id'], redraw_chart=not chart_exists)
+
                 st.divider()
 
                 # 评分说明
@@ -625,14 +684,14 @@ def render_recording_item(recording):
             with audio_summary_col1:
                 st.caption("🎼 标准音频预览")
                 with open(score_data['reference_audio_path'], "rb") as f:
-                    st.audio(f.read(), format='audio/mp3')
+                    st.audio(f.read(), format=get_audio_mime(score_data['reference_audio_path']))
                 # 标准音频下载按钮
                 with open(score_data['reference_audio_path'], "rb") as f:
                     st.download_button(
                         label="📥 下载标准音频",
                         data=f.read(),
-                        file_name=f"标准音频_{recording.performer_name}_{recording.instrument}.mp3",
-                        mime="audio/mp3",
+                        file_name=f"标准音频_{recording.performer_name}_{recording.instrument}{os.path.splitext(score_data['reference_audio_path'])[1]}",
+                        mime=get_audio_mime(score_data['reference_audio_path']),
                         key=f"download_ref_summary_{recording.id}",
                         use_container_width=True
                     )
@@ -703,11 +762,11 @@ def render_edit_recording_form(recording):
             st.rerun()
 
 
-def get_recording_count(song_name: str) -> int:
-    """获取曲目的评分数量"""
+def get_recording_count(song_id: int) -> int:
+    """获取曲目的评分数量（读取曲目的计数字段）"""
     try:
         with get_db_session() as db:
-            recordings = get_recordings_by_song(db, song_name)
-            return len(recordings)
+            counts = get_song_counts(db, song_id)
+            return counts.recording_count if counts else 0
     except:
         return 0
\ No newline at end of file
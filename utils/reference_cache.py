@@ -0,0 +1,233 @@
+"""
+参考音频缓存模块
+
+参考音频由（乐器 + 参考乐谱内容 + 音色库 + 码率）唯一确定，按哈希缓存在 data/reference_cache 下，
+评分时命中缓存即可跳过 MusicXML → MIDI → 音频 的合成过程。
+上传乐谱后可在后台为所有配置的乐器预生成参考音频，使第一次评分也无需现场合成。
+"""
+import os
+import hashlib
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from config.instruments import get_instrument_choices
+from config.settings import REFERENCE_CACHE_DIR, PRERENDER_WORKERS, SOUNDFONT_PATH, AUDIO_BITRATE_KBPS
+from utils.audio_codec import get_audio_extension
+from utils.omr_cache import file_digest
+
+# 后台预生成线程池（进程内共享）
+_executor = None
+_executor_lock = threading.Lock()
+
+# 正在生成的缓存键 -> [锁, 使用中的线程数]，避免同一参考音频被重复合成；没有线程使用时删除
+_render_locks = {}
+_render_locks_guard = threading.Lock()
+
+
+def collect_reference_sources(solos, instrument: str):
+    """
+    选择用于合成参考音频的乐谱：
+    - 如果有对应乐器的乐谱，只使用该乐器乐谱
+    - 如果没有对应乐器的乐谱，使用所有乐谱
+    图片/PDF乐谱在没有规范化结果时先进行OMR识别。
+
+    返回：
+    - (MusicXML路径列表, 规范MIDI路径或None)
+    """
+    from utils.omr import run_omr
+
+    instrument_solos = [solo for solo in solos if solo.instrument == instrument]
+    target_solos = instrument_solos if instrument_solos else solos
+
+    mxl_paths = []
+    for solo in target_solos:
+        # 优先使用上传时生成的规范化乐谱
+        if solo.normalized_xml_path and os.path.exists(solo.normalized_xml_path):
+            mxl_paths.append(solo.normalized_xml_path)
+            continue
+
+        if not os.path.exists(solo.file_path):
+            continue
+
+        # 根据文件扩展名判断类型
+        file_ext = solo.file_path.lower().split('.')[-1]
+
+        if file_ext in ['mxl', 'musicxml', 'xml']:
+            mxl_paths.append(solo.file_path)
+
+        elif file_ext in ['png', 'jpg', 'jpeg', 'pdf']:
+            # 图片/PDF文件需要OMR识别
+            print(f"🔍 正在识别乐谱图片: {solo.file_path}")
+            try:
+                recognized_mxls = run_omr(solo.file_path)
+                if recognized_mxls:
+                    mxl_paths.extend(mxl for mxl in recognized_mxls if os.path.exists(mxl))
+                else:
+                    print(f"⚠️ OMR识别失败: {solo.file_path}")
+            except Exception as omr_error:
+                print(f"⚠️ OMR识别异常: {solo.file_path}, 错误: {omr_error}")
+
+    canonical_midi = None
+    if len(instrument_solos) == 1 and instrument_solos[0].midi_path and os.path.exists(instrument_solos[0].midi_path):
+        canonical_midi = instrument_solos[0].midi_path
+
+    return mxl_paths, canonical_midi
+
+
+def _soundfont_fingerprint() -> str:
+    """音色库路径、大小和修改时间（音色库很大，不计算内容哈希；替换文件也会使缓存失效）"""
+    try:
+        stat = os.stat(SOUNDFONT_PATH)
+        return f"{SOUNDFONT_PATH}:{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        return SOUNDFONT_PATH
+
+
+def reference_cache_key(mxl_paths, instrument: str) -> str:
+    """由乐器、参考乐谱内容和合成设置（音色库、码率）计算缓存键"""
+    digest = hashlib.sha1(instrument.encode("utf-8"))
+    digest.update(f"\0{_soundfont_fingerprint()}\0{AUDIO_BITRATE_KBPS}\0".encode("utf-8"))
+    for content_digest in sorted(file_digest(path) for path in mxl_paths):
+        digest.update(content_digest.encode("ascii"))
+    return digest.hexdigest()[:16]
+
+
+def get_reference_cache_path(song_name: str, instrument: str, cache_key: str) -> str:
+    """生成缓存参考音频的存储路径"""
+    song_dir = os.path.join(REFERENCE_CACHE_DIR, song_name.replace("/", "_").replace("\\", "_"))
+    os.makedirs(song_dir, exist_ok=True)
+    return os.path.join(song_dir, f"{instrument}_{cache_key}{get_audio_extension()}")
+
+
+def get_reference_midi_path(audio_path: str) -> str:
+    """返回与缓存参考音频一起保存的参考MIDI路径，不存在时返回 None"""
+    if not audio_path:
+        return None
+    midi_path = os.path.splitext(audio_path)[0] + ".mid"
+    return midi_path if os.path.exists(midi_path) else None
+
+
+def get_cached_reference(song_name: str, instrument: str, mxl_paths) -> str:
+    """返回已缓存的参考音频路径，未缓存时返回 None"""
+    if not mxl_paths:
+        return None
+    cache_path = get_reference_cache_path(song_name, instrument, reference_cache_key(mxl_paths, instrument))
+    return cache_path if os.path.exists(cache_path) else None
+
+
+@contextmanager
+def _render_lock(cache_key: str):
+    """持有缓存键对应的锁；最后一个使用者释放后删除该锁，_render_locks 不会随缓存键无限增长"""
+    with _render_locks_guard:
+        entry = _render_locks.setdefault(cache_key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _render_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _render_locks[cache_key]
+
+
+def render_reference(song_name: str, instrument: str, mxl_paths, canonical_midi: str = None):
+    """
+    获取参考音频：命中缓存直接返回，否则合成后写入缓存。
+
+    参数：
+    - mxl_paths: 参考乐谱 MusicXML 路径列表
+    - canonical_midi: 上传时生成的规范MIDI，提供时跳过 MusicXML 转换
+
+    返回：
+    - (缓存中的压缩参考音频路径, 未压缩的 (PCM, 采样率))
+      命中缓存时 PCM 为 None；失败时返回 (None, None)
+    """
+    from utils.midi_tools import merge_musicxml_to_midi, midi_to_mp3
+
+    if not mxl_paths:
+        return None, None
+
+    cache_key = reference_cache_key(mxl_paths, instrument)
+    cache_path = get_reference_cache_path(song_name, instrument, cache_key)
+
+    with _render_lock(cache_key):
+        if os.path.exists(cache_path):
+            print(f"✅ 命中参考音频缓存: {cache_path}")
+            return cache_path, None
+
+        temp_dir = tempfile.mkdtemp(prefix="reference_")
+        try:
+            midi_path = os.path.join(temp_dir, "reference.mid")
+            if canonical_midi:
+                shutil.copy2(canonical_midi, midi_path)
+            else:
+                merge_musicxml_to_midi(mxl_paths, midi_path, None if instrument == "合声" else instrument)
+
+            # 编码器先写临时文件再原子替换，不会留下不完整的缓存
+            reference_audio = midi_to_mp3(midi_path, cache_path, SOUNDFONT_PATH)
+            if not os.path.exists(cache_path) or os.path.getsize(cache_path) == 0:
+                print(f"❌ 参考音频合成失败: {song_name} - {instrument}")
+                return None, None
+            # 保留参考MIDI，评分时可按演奏速度重新合成参考音频
+            shutil.copy2(midi_path, os.path.splitext(cache_path)[0] + ".mid")
+            print(f"✅ 参考音频已缓存: {cache_path}")
+            return cache_path, reference_audio
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def get_reference_for_solos(song_name: str, instrument: str, solos):
+    """
+    按评分规则为指定乐器选择参考乐谱并获取（缓存的）参考音频
+
+    返回值同 render_reference。
+    """
+    mxl_paths, canonical_midi = collect_reference_sources(solos, instrument)
+    if not mxl_paths:
+        print("❌ 没有可用的MXL文件（原有或识别生成）")
+        return None, None
+    return render_reference(song_name, instrument, mxl_paths, canonical_midi)
+
+
+def prerender_song_references(song_id: int, instruments=None) -> dict:
+    """
+    为曲目预生成所有乐器的参考音频（同步执行）
+
+    返回：
+    - {乐器: 参考音频路径或None}
+    """
+    from database.utils import get_db_session
+    from database.crud import get_song_by_id, get_solos_by_song
+
+    instruments = instruments or get_instrument_choices()
+    results = {}
+
+    with get_db_session() as db:
+        song = get_song_by_id(db, song_id)
+        solos = get_solos_by_song(db, song_id)
+        if not song or not solos:
+            return results
+        song_name = song.name
+
+        for instrument in instruments:
+            try:
+                results[instrument], _ = get_reference_for_solos(song_name, instrument, solos)
+            except Exception as e:
+                print(f"⚠️ 预生成参考音频失败: {song_name} - {instrument}, 错误: {e}")
+                results[instrument] = None
+
+    print(f"✅ 曲目 {song_name} 参考音频预生成完成: {sum(1 for p in results.values() if p)}/{len(instruments)}")
+    return results
+
+
+def schedule_reference_prerender(song_id: int, instruments=None):
+    """在后台线程中预生成曲目的参考音频，返回 Future"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, PRERENDER_WORKERS),
+                                           thread_name_prefix="reference-prerender")
+    return _executor.submit(prerender_song_references, song_id, instruments)
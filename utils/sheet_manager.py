@@ -7,14 +7,19 @@ import shutil
 from datetime import datetime
 from database.utils import get_db_session
 from database.crud import (
-    create_solo, get_solos_by_song, delete_solo, update_solo, get_solo_by_id,
-    get_solo_by_song_and_instrument
+    create_solo, get_solos_by_song, delete_solo, update_solo, get_solo_by_id, get_song_by_id,
+    get_solo_by_song_and_instrument, replace_solo_pages, get_known_page_results, get_song_counts
 )
-from utils.omr import run_audiveris
+from utils.omr import run_omr, get_omr_pages
+from utils.omr_scheduler import get_omr_stats
+from utils.omr_progress import submit_omr, list_omr_jobs
+from utils.reference_cache import schedule_reference_prerender
+from utils.audio_codec import get_audio_extension, get_audio_mime
 from config.instruments import get_instrument_choices
+from config.settings import PRERENDER_REFERENCES, SHEET_MUSIC_DIR
 
-# 永久存储目录
-SHEET_MUSIC_DIR = "data/sheet_music"
+# 永久存储目录（乐谱原文件目录见 config/settings.py）
+NORMALIZED_SHEET_DIR = "data/sheet_normalized"
 
 def ensure_sheet_music_dir():
     """确保乐谱存储目录存在"""
@@ -49,38 +54,141 @@ def generate_mp3_path(song_name: str, instrument: str, original_filename: str) -
     song_dir = os.path.join(mp3_dir, song_name.replace("/", "_").replace("\\", "_"))
     os.makedirs(song_dir, exist_ok=True)
 
-    # 生成唯一文件名：乐器_时间戳_原文件名.mp3
+    # 生成唯一文件名：乐器_时间戳_原文件名.mp3（扩展名随配置的音频格式）
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    audio_ext = get_audio_extension()
     filename_parts = original_filename.rsplit('.', 1)
     if len(filename_parts) == 2:
         name, ext = filename_parts
-        unique_filename = f"{instrument}_{timestamp}_{name}.mp3"
+        unique_filename = f"{instrument}_{timestamp}_{name}{audio_ext}"
     else:
-        unique_filename = f"{instrument}_{timestamp}_{original_filename}.mp3"
+        unique_filename = f"{instrument}_{timestamp}_{original_filename}{audio_ext}"
 
     return os.path.join(song_dir, unique_filename)
 
+def generate_normalized_paths(song_name: str, instrument: str, original_filename: str):
+    """生成规范化MusicXML和规范MIDI的存储路径"""
+    song_dir = os.path.join(NORMALIZED_SHEET_DIR, song_name.replace("/", "_").replace("\\", "_"))
+    os.makedirs(song_dir, exist_ok=True)
+
+    # 生成唯一文件名：乐器_时间戳_原文件名
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    name = original_filename.rsplit('.', 1)[0]
+    base_path = os.path.join(song_dir, f"{instrument}_{timestamp}_{name}")
+
+    return f"{base_path}.musicxml", f"{base_path}.mid"
+
+def normalize_sheet_and_render_mp3(source_xml: str, song_name: str, instrument: str,
+                                   original_filename: str, mp3_path: str):
+    """
+    规范化乐谱（展开repeat，生成规范MIDI），再从规范MIDI生成MP3。
+
+    返回：
+    - (mp3是否生成成功, 规范化MusicXML路径, 规范MIDI路径)；规范化失败时路径为 None
+    """
+    from utils.midi_tools import normalize_musicxml, render_midi_to_mp3
+
+    normalized_xml_path, midi_path = generate_normalized_paths(song_name, instrument, original_filename)
+    if not normalize_musicxml(source_xml, normalized_xml_path, midi_path,
+                              instrument if instrument != "合声" else None):
+        remove_files(normalized_xml_path, midi_path)
+        return False, None, None
+
+    mp3_success = render_midi_to_mp3(midi_path, mp3_path)
+    return mp3_success, normalized_xml_path, midi_path
+
+def remove_files(*file_paths):
+    """删除文件，忽略不存在的路径和删除错误"""
+    for file_path in file_paths:
+        if file_path and os.path.exists(file_path):
+            try:
+                os.remove(file_path)
+            except:
+                pass  # 忽略删除错误
+
+def record_solo_pages(db, solo_id: int, source_path: str):
+    """多页PDF按页识别过时，把每页的识别状态记录到 SheetPage"""
+    pages = get_omr_pages(source_path)
+    if pages:
+        replace_solo_pages(db, solo_id, pages)
+
+def get_known_pages(song_id: int, instrument: str) -> dict:
+    """同一乐器已有乐谱上次按页识别的结果，重新上传多页PDF时只识别有变化的页"""
+    with get_db_session() as db:
+        solo = get_solo_by_song_and_instrument(db, song_id, instrument)
+        return get_known_page_results(db, solo.id) if solo else {}
+
 def save_uploaded_file(uploaded_file, file_path: str) -> int:
     """保存上传的文件并返回文件大小"""
     with open(file_path, "wb") as f:
         f.write(uploaded_file.read())
     return os.path.getsize(file_path)
 
-def render_sheet_music_management(song_name: str):
+def render_sheet_music_management(song_id: int):
     """渲染乐谱管理界面"""
+    with get_db_session() as db:
+        song = get_song_by_id(db, song_id)
+        song_name = song.name if song else None
+    if song_name is None:
+        st.error("曲目不存在")
+        return
+
     st.header(f"🎼 {song_name} - 乐谱管理")
 
     # 添加新乐谱
-    render_add_sheet_form(song_name)
+    render_add_sheet_form(song_id, song_name)
 
-    # 显示现有乐谱
-    render_existing_sheets(song_name)
+    # 乐谱识别队列状态
+    render_omr_queue_status()
 
-def render_existing_sheets(song_name: str):
+    # 显示现有乐谱
+    render_existing_sheets(song_id, song_name)
+
+def render_omr_queue_status():
+    """显示乐谱识别（OMR）队列深度和等待时间"""
+    stats = get_omr_stats()
+    busy = stats["running"] > 0 or stats["queue_depth"] > 0
+    with st.expander(f"🔍 乐谱识别队列：{stats['running']}/{stats['max_concurrent']} 运行中，"
+                     f"{stats['queue_depth']} 个排队", expanded=busy):
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("已完成", stats["finished"])
+        with col2:
+            st.metric("平均等待", f"{stats['avg_wait_seconds']} s")
+        with col3:
+            st.metric("最长等待", f"{stats['max_wait_seconds']} s")
+        with col4:
+            st.metric("超时", stats["timed_out"] + stats["rejected"])
+
+        jobs = list_omr_jobs()
+        if jobs:
+            status_names = {"queued": "排队中", "running": "识别中", "done": "完成", "failed": "失败"}
+            st.dataframe([
+                {
+                    "乐谱": job["label"],
+                    "状态": status_names.get(job["status"], job["status"]),
+                    "进度": f"{job['percent']}%",
+                    "当前步骤": job["step"],
+                    "耗时": f"{job['elapsed_seconds']} s",
+                }
+                for job in jobs
+            ], use_container_width=True, hide_index=True)
+
+def wait_for_omr(image_path: str, progress_bar, start: int, end: int, known_pages=None, label: str = None):
+    """
+    在后台识别乐谱，识别期间把进度显示在 progress_bar 的 start~end 区间内，返回识别出的 .mxl 路径列表
+    """
+    job = submit_omr(image_path, known_pages=known_pages, label=label)
+    while not job.wait(timeout=0.5):
+        percent = start + (end - start) * job.percent // 100
+        progress_bar.progress(percent, text=f"正在进行乐谱识别：{job.step_description}（{job.percent}%）")
+    return job.result
+
+def render_existing_sheets(song_id: int, song_name: str):
     """显示现有乐谱列表"""
     try:
         with get_db_session() as db:
-            solos = get_solos_by_song(db, song_name)
+            solos = get_solos_by_song(db, song_id)
 
             if not solos:
                 st.info("该曲目暂无乐谱，请添加乐谱文件")
@@ -90,8 +198,8 @@ def render_existing_sheets(song_name: str):
             if len(solos) > 0:
                 col1, col2 = st.columns([1, 3])
                 with col1:
-                    if st.button("🎵 合成音乐", key=f"synthesize_{song_name}", use_container_width=True, type="primary"):
-                        synthesize_song_audio(song_name, solos)
+                    if st.button("🎵 合成音乐", key=f"synthesize_{song_id}", use_container_width=True, type="primary"):
+                        synthesize_song_audio(song_id, song_name, solos)
                 with col2:
                     st.empty()
                 st.divider()
@@ -112,7 +220,7 @@ def render_sheet_item(solo):
         with col1:
             # 乐器名称可点击，点击后切换到评分管理
             if st.button(f"🎹 {solo.instrument}", key=f"select_instrument_{solo.id}", use_container_width=True):
-                st.session_state.selected_song = solo.song_name
+                st.session_state.selected_song = solo.song_id
                 if 'show_sheet_management' in st.session_state:
                     del st.session_state.show_sheet_management  # 删除乐谱管理状态
                 st.rerun()
@@ -124,6 +232,9 @@ def render_sheet_item(solo):
                 size_kb = solo.file_size / 1024
                 st.caption(f"大小：{size_kb:.1f} KB")
             st.caption(f"上传：{solo.created_at.strftime('%Y-%m-%d %H:%M')}")
+            if solo.pages:
+                processed = sum(1 for page in solo.pages if page.status == "processed")
+                st.caption(f"分页识别：{processed}/{len(solo.pages)} 页")
 
         with col3:
             if st.button("✏️", key=f"edit_solo_{solo.id}", help="编辑"):
@@ -155,7 +266,7 @@ def render_sheet_item(solo):
             if solo.mp3_path and os.path.exists(solo.mp3_path):
                 if st.button("🎵 播放", key=f"play_{solo.id}", use_container_width=True):
                     with open(solo.mp3_path, "rb") as audio_file:
-                        st.audio(audio_file.read(), format="audio/mp3")
+                        st.audio(audio_file.read(), format=get_audio_mime(solo.mp3_path))
             else:
                 if st.button("🎵 生成MP3", key=f"generate_mp3_{solo.id}", use_container_width=True):
                     generate_mp3_for_existing_solo(solo)
@@ -170,7 +281,7 @@ def render_sheet_item(solo):
     if st.session_state.get('delete_solo') == solo.id:
         render_delete_solo_confirmation(solo)
 
-def render_add_sheet_form(song_name: str):
+def render_add_sheet_form(song_id: int, song_name: str):
     """渲染添加乐谱表单"""
     st.subheader("➕ 添加新乐谱")
 
@@ -186,7 +297,7 @@ def render_add_sheet_form(song_name: str):
     if instrument:
         try:
             with get_db_session() as db:
-                existing_solo = get_solo_by_song_and_instrument(db, song_name, instrument)
+                existing_solo = get_solo_by_song_and_instrument(db, song_id, instrument)
                 if existing_solo:
                     st.warning(f"⚠️ 该曲目已存在 '{instrument}' 乐器的乐谱（文件：{existing_solo.original_filename}）。上传新文件将覆盖现有乐谱。")
         except:
@@ -200,6 +311,13 @@ def render_add_sheet_form(song_name: str):
             help="支持 MusicXML格式（MXL、MusicXML、XML）和图片格式（PDF、PNG、JPG、JPEG）。推荐使用MusicXML格式以获得最佳MP3生成效果。"
         )
 
+        # 后台预生成参考音频（可选）
+        prerender = st.checkbox(
+            "保存后在后台为所有乐器预生成参考音频",
+            value=PRERENDER_REFERENCES,
+            help="预生成后，任意乐器的第一次评分都无需现场合成参考音频"
+        )
+
         submit = st.form_submit_button("💾 保存乐谱", use_container_width=True)
 
         if submit:
@@ -229,40 +347,33 @@ def render_add_sheet_form(song_name: str):
                 # 先尝试生成MP3，只有成功才保存数据
                 mp3_success = False
                 mp3_error_msg = ""
+                normalized_xml_path = None
+                midi_path = None
 
                 try:
                     # 检查文件类型
                     file_ext = temp_file_path.lower().split('.')[-1]
+                    source_xml = None
 
                     if file_ext in ['mxl', 'musicxml', 'xml']:
-                        # 直接从MusicXML生成MP3
-                        from utils.midi_tools import synthesize_single_sheet_to_mp3
-                        progress_bar.progress(40, text="正在从MusicXML生成MP3...")
-                        mp3_success = synthesize_single_sheet_to_mp3(
-                            temp_file_path, mp3_path,
-                            instrument if instrument != "合声" else None
-                        )
-                        progress_bar.progress(70, text="MP3生成完成，正在验证...")
+                        # 直接使用上传的MusicXML
+                        source_xml = temp_file_path
 
                     elif file_ext in ['png', 'jpg', 'jpeg', 'pdf']:
                         # 对于图片/PDF文件，先通过OMR识别
-                        from utils.omr import run_audiveris
-                        from utils.midi_tools import synthesize_single_sheet_to_mp3
-
-                        progress_bar.progress(30, text="正在进行乐谱识别...")
+                        queue_depth = get_omr_stats()["queue_depth"]
+                        queue_note = f"（前面还有 {queue_depth} 个识别任务排队）" if queue_depth else ""
+                        progress_bar.progress(30, text=f"正在进行乐谱识别...{queue_note}")
 
                         # 使用OMR识别生成MXL文件
-                        recognized_mxls = run_audiveris(temp_file_path, "tmp/output/")
+                        recognized_mxls = wait_for_omr(temp_file_path, progress_bar, 30, 40,
+                                                       known_pages=get_known_pages(song_id, instrument),
+                                                       label=f"{song_name} - {instrument}")
                         if recognized_mxls and len(recognized_mxls) > 0:
-                            # 使用第一个识别出的MXL文件生成MP3
+                            # 使用第一个识别出的MXL文件
                             first_mxl = recognized_mxls[0]
                             if os.path.exists(first_mxl):
-                                progress_bar.progress(50, text="识别完成，正在生成MP3...")
-                                mp3_success = synthesize_single_sheet_to_mp3(
-                                    first_mxl, mp3_path,
-                                    instrument if instrument != "合声" else None
-                                )
-                                progress_bar.progress(70, text="MP3生成完成，正在验证...")
+                                source_xml = first_mxl
                             else:
                                 mp3_error_msg = "OMR识别生成的MXL文件不存在"
                         else:
@@ -271,6 +382,16 @@ def render_add_sheet_form(song_name: str):
                     else:
                         mp3_error_msg = f"不支持的文件格式：{file_ext}。支持的格式：MXL, MusicXML, XML, PNG, JPG, JPEG, PDF"
 
+                    if source_xml:
+                        # 上传时一次性规范化（展开repeat、生成规范MIDI），之后的合成都从规范结果开始
+                        progress_bar.progress(40, text="正在规范化乐谱并生成MP3...")
+                        mp3_success, normalized_xml_path, midi_path = normalize_sheet_and_render_mp3(
+                            source_xml, song_name, instrument, uploaded_file.name, mp3_path
+                        )
+                        if normalized_xml_path is None:
+                            mp3_error_msg = "乐谱规范化失败，无法解析乐谱内容"
+                        progress_bar.progress(70, text="MP3生成完成，正在验证...")
+
                     # 验证MP3文件是否真的生成成功
                     if mp3_success and not os.path.exists(mp3_path):
                         mp3_success = False
@@ -290,7 +411,7 @@ def render_add_sheet_form(song_name: str):
 
                     # 检查是否已存在同乐器的乐谱
                     with get_db_session() as db:
-                        existing_solo = get_solo_by_song_and_instrument(db, song_name, instrument)
+                        existing_solo = get_solo_by_song_and_instrument(db, song_id, instrument)
 
                         if existing_solo:
                             # 更新已有乐谱
@@ -305,6 +426,7 @@ def render_add_sheet_form(song_name: str):
                                     os.remove(existing_solo.mp3_path)
                                 except:
                                     pass  # 忽略删除错误
+                            remove_files(existing_solo.normalized_xml_path, existing_solo.midi_path)
 
                             # 更新数据库记录
                             update_solo(
@@ -313,22 +435,28 @@ def render_add_sheet_form(song_name: str):
                                 file_path=file_path,
                                 original_filename=uploaded_file.name,
                                 file_size=temp_file_size,
-                                mp3_path=mp3_path
+                                mp3_path=mp3_path,
+                                normalized_xml_path=normalized_xml_path,
+                                midi_path=midi_path
                             )
+                            record_solo_pages(db, existing_solo.id, file_path)
 
                             progress_bar.progress(100, text="更新完成！")
                             st.success(f"✅ 乐谱 '{instrument}' 更新成功，MP3文件已重新生成！")
                         else:
                             # 创建新乐谱
-                            create_solo(
+                            new_solo = create_solo(
                                 db=db,
-                                song_name=song_name,
+                                song_id=song_id,
                                 instrument=instrument,
                                 file_path=file_path,
                                 original_filename=uploaded_file.name,
                                 file_size=temp_file_size,
-                                mp3_path=mp3_path
+                                mp3_path=mp3_path,
+                                normalized_xml_path=normalized_xml_path,
+                                midi_path=midi_path
                             )
+                            record_solo_pages(db, new_solo.id, file_path)
 
                             progress_bar.progress(100, text="保存完成！")
                             st.success(f"✅ 乐谱 '{instrument}' 添加成功，MP3文件已生成！")
@@ -336,7 +464,11 @@ def render_add_sheet_form(song_name: str):
                         # 显示播放控件
                         st.info("🎵 您可以立即播放生成的MP3文件：")
                         with open(mp3_path, "rb") as audio_file:
-                            st.audio(audio_file.read(), format="audio/mp3")
+                            st.audio(audio_file.read(), format=get_audio_mime(mp3_path))
+
+                    if prerender:
+                        schedule_reference_prerender(song_id)
+                        st.info("⏳ 已在后台为所有乐器预生成参考音频")
 
                 else:
                     # MP3生成失败，清理临时文件并显示错误
@@ -344,6 +476,7 @@ def render_add_sheet_form(song_name: str):
                         os.remove(temp_file_path)
                     if os.path.exists(mp3_path):
                         os.remove(mp3_path)  # 清理可能生成的不完整MP3文件
+                    remove_files(normalized_xml_path, midi_path)
 
                     progress_bar.progress(100, text="处理失败")
                     st.error(f"❌ 乐谱添加失败：MP3生成失败")
@@ -393,6 +526,12 @@ def render_edit_solo_form(solo):
             try:
                 with get_db_session() as db:
                     update_solo(db, solo.id, instrument=new_instrument)
+
+                    # 乐器变更后重新生成规范MIDI（规范化MusicXML不受影响）
+                    if solo.normalized_xml_path and os.path.exists(solo.normalized_xml_path) and solo.midi_path:
+                        from utils.midi_tools import musicxml_to_midi_auto
+                        musicxml_to_midi_auto(solo.normalized_xml_path, solo.midi_path,
+                                              new_instrument if new_instrument != "合声" else None)
                     st.success("更新成功！")
                     st.session_state.edit_solo = None
                     st.rerun()
@@ -419,6 +558,7 @@ def render_delete_solo_confirmation(solo):
                     # 删除文件
                     if os.path.exists(solo.file_path):
                         os.remove(solo.file_path)
+                    remove_files(solo.normalized_xml_path, solo.midi_path)
 
                     st.success("删除成功！")
                     st.session_state.delete_solo = None
@@ -431,16 +571,16 @@ def render_delete_solo_confirmation(solo):
             st.session_state.delete_solo = None
             st.rerun()
 
-def get_solo_count(song_name: str) -> int:
-    """获取曲目的乐谱数量"""
+def get_solo_count(song_id: int) -> int:
+    """获取曲目的乐谱数量（读取曲目的计数字段）"""
     try:
         with get_db_session() as db:
-            solos = get_solos_by_song(db, song_name)
-            return len(solos)
+            counts = get_song_counts(db, song_id)
+            return counts.solo_count if counts else 0
     except:
         return 0
 
-def synthesize_song_audio(song_name: str, solos):
+def synthesize_song_audio(song_id: int, song_name: str, solos):
     """合成曲目的所有乐谱为MP3文件"""
     from utils.midi_tools import synthesize_all_sheets_to_mp3
     from database.crud import update_song
@@ -454,6 +594,12 @@ def synthesize_song_audio(song_name: str, solos):
         xml_paths = []
 
         for solo in solos:
+            # 优先使用上传时生成的规范化乐谱
+            if solo.normalized_xml_path and os.path.exists(solo.normalized_xml_path):
+                xml_paths.append(solo.normalized_xml_path)
+                print(f"✅ 使用规范化乐谱: {solo.normalized_xml_path}")
+                continue
+
             if not os.path.exists(solo.file_path):
                 continue
 
@@ -470,7 +616,7 @@ def synthesize_song_audio(song_name: str, solos):
                 print(f"🔍 正在识别乐谱图片: {solo.file_path}")
                 try:
                     # 使用OMR识别生成MXL文件
-                    recognized_mxls = run_audiveris(solo.file_path, "data/output/")
+                    recognized_mxls = run_omr(solo.file_path)
                     if recognized_mxls and len(recognized_mxls) > 0:
                         for mxl_file in recognized_mxls:
                             if os.path.exists(mxl_file):
@@ -494,7 +640,7 @@ def synthesize_song_audio(song_name: str, solos):
         os.makedirs(audio_dir, exist_ok=True)
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_mp3_path = os.path.join(audio_dir, f"{song_name.replace('/', '_')}_{timestamp}.mp3")
+        output_mp3_path = os.path.join(audio_dir, f"{song_name.replace('/', '_')}_{timestamp}{get_audio_extension()}")
 
         status_text.text("正在合成音频...")
         progress_bar.progress(50)
@@ -508,7 +654,7 @@ def synthesize_song_audio(song_name: str, solos):
 
             # 更新数据库中的音频路径
             with get_db_session() as db:
-                update_song(db, song_name, synthesized_audio_path=output_mp3_path)
+                update_song(db, song_id, synthesized_audio_path=output_mp3_path)
 
             progress_bar.progress(100)
             status_text.text("合成完成！")
@@ -518,7 +664,7 @@ def synthesize_song_audio(song_name: str, solos):
 
             # 添加音频播放控件
             with open(output_mp3_path, "rb") as audio_file:
-                st.audio(audio_file.read(), format="audio/mp3")
+                st.audio(audio_file.read(), format=get_audio_mime(output_mp3_path))
 
         else:
             st.error("音频合成失败，请检查乐谱文件格式")
@@ -541,47 +687,55 @@ def generate_mp3_for_existing_solo(solo):
             progress_bar = st.progress(0, text="正在生成MP3...")
 
         # 生成MP3路径
-        mp3_path = generate_mp3_path(solo.song_name, solo.instrument, solo.original_filename or "score")
+        song_name = solo.song.name
+        mp3_path = generate_mp3_path(song_name, solo.instrument, solo.original_filename or "score")
 
-        # 检查文件类型
-        file_ext = solo.file_path.lower().split('.')[-1]
         mp3_success = False
-
-        if file_ext in ['mxl', 'musicxml', 'xml']:
-            # 直接从MusicXML生成MP3
-            from utils.midi_tools import synthesize_single_sheet_to_mp3
-            progress_bar.progress(30, text="正在转换MusicXML...")
-            mp3_success = synthesize_single_sheet_to_mp3(
-                solo.file_path, mp3_path,
-                solo.instrument if solo.instrument != "合声" else None
-            )
+        normalized_xml_path = None
+        midi_path = None
+
+        if solo.midi_path and os.path.exists(solo.midi_path):
+            # 已规范化的乐谱直接从规范MIDI生成MP3
+            from utils.midi_tools import render_midi_to_mp3
+            progress_bar.progress(30, text="正在从规范MIDI生成MP3...")
+            mp3_success = render_midi_to_mp3(solo.midi_path, mp3_path)
             progress_bar.progress(80, text="MP3生成完成...")
 
-        elif file_ext in ['png', 'jpg', 'jpeg', 'pdf']:
-            # 对于图片/PDF文件，先通过OMR识别
-            from utils.omr import run_audiveris
-            from utils.midi_tools import synthesize_single_sheet_to_mp3
-
-            progress_bar.progress(20, text="正在进行乐谱识别...")
-
-            # 使用OMR识别生成MXL文件
-            recognized_mxls = run_audiveris(solo.file_path, "tmp/output/")
-            if recognized_mxls and len(recognized_mxls) > 0:
-                # 使用第一个识别出的MXL文件生成MP3
-                first_mxl = recognized_mxls[0]
-                if os.path.exists(first_mxl):
-                    progress_bar.progress(50, text="识别完成，正在生成MP3...")
-                    mp3_success = synthesize_single_sheet_to_mp3(
-                        first_mxl, mp3_path,
-                        solo.instrument if solo.instrument != "合声" else None
-                    )
+        else:
+            # 旧乐谱：先获取MusicXML，规范化后保存，以后不再重复处理
+            file_ext = solo.file_path.lower().split('.')[-1]
+            source_xml = None
+
+            if file_ext in ['mxl', 'musicxml', 'xml']:
+                source_xml = solo.file_path
+
+            elif file_ext in ['png', 'jpg', 'jpeg', 'pdf']:
+                # 对于图片/PDF文件，先通过OMR识别
+                progress_bar.progress(20, text="正在进行乐谱识别...")
+
+                # 使用OMR识别生成MXL文件
+                with get_db_session() as db:
+                    known_pages = get_known_page_results(db, solo.id)
+                recognized_mxls = wait_for_omr(solo.file_path, progress_bar, 20, 50, known_pages=known_pages,
+                                               label=f"{song_name} - {solo.instrument}")
+                if recognized_mxls and len(recognized_mxls) > 0 and os.path.exists(recognized_mxls[0]):
+                    source_xml = recognized_mxls[0]
+
+            if source_xml:
+                progress_bar.progress(50, text="正在规范化乐谱并生成MP3...")
+                mp3_success, normalized_xml_path, midi_path = normalize_sheet_and_render_mp3(
+                    source_xml, song_name, solo.instrument,
+                    solo.original_filename or "score", mp3_path
+                )
             progress_bar.progress(80, text="MP3生成完成...")
 
         # 更新数据库
         if mp3_success:
             with get_db_session() as db:
                 from database.crud import update_solo
-                update_solo(db, solo.id, mp3_path=mp3_path)
+                update_solo(db, solo.id, mp3_path=mp3_path,
+                            normalized_xml_path=normalized_xml_path, midi_path=midi_path)
+                record_solo_pages(db, solo.id, solo.file_path)
 
             progress_bar.progress(100, text="保存完成！")
             st.success("✅ MP3文件生成成功！")
@@ -5,10 +5,12 @@ import streamlit as st
 import os
 from database.utils import get_db_session
 from database.crud import (
-    create_song, get_all_songs, search_songs_by_name,
-    update_song, delete_song, get_song_by_name
+    create_song, get_songs_page, count_songs, search_songs,
+    update_song, delete_song, get_song_by_id, get_song_by_name
 )
-from utils.sheet_manager import get_solo_count
+from config.settings import SONG_PAGE_SIZE
+from utils.pagination import get_page_cursor, reset_page, render_pager
+from utils.audio_codec import get_audio_mime
 
 def render_song_sidebar():
     """渲染左侧曲目库侧边栏（使用 Streamlit 默认侧边栏）"""
@@ -16,7 +18,7 @@ def render_song_sidebar():
         st.header("🎵 曲目库")
 
         # 搜索框
-        search_term = st.text_input("🔍 搜索曲目", placeholder="输入曲目名称...")
+        search_term = st.text_input("🔍 搜索曲目", placeholder="曲目名称、作曲家、类型...")
 
         # 添加新曲目按钮
         if st.button("➕ 添加新曲目", use_container_width=True):
@@ -34,7 +36,7 @@ def render_song_sidebar_content():
     st.header("🎵 曲目库")
 
     # 搜索框
-    search_term = st.text_input("🔍 搜索曲目", placeholder="输入曲目名称...")
+    search_term = st.text_input("🔍 搜索曲目", placeholder="曲目名称、作曲家、类型...")
 
     # 添加新曲目按钮
     if st.button("➕ 添加新曲目", use_container_width=True):
@@ -89,15 +91,27 @@ def render_add_song_form():
             st.session_state.show_add_song = False
             st.rerun()
 
+# 曲目列表翻页状态（游标栈）在 st.session_state 中的键
+SONG_PAGE_STATE = "song_list_cursors"
+
+
 def render_song_list(search_term: str):
     """渲染曲目列表"""
     try:
         with get_db_session() as db:
-            # 根据搜索条件获取曲目
+            # 根据搜索条件获取曲目；不搜索时按页加载
+            next_cursor = None
             if search_term:
-                songs = search_songs_by_name(db, search_term)
+                songs = search_songs(db, search_term)
+                total = len(songs)
             else:
-                songs = get_all_songs(db)
+                cursor = get_page_cursor(SONG_PAGE_STATE)
+                songs, next_cursor = get_songs_page(db, SONG_PAGE_SIZE, cursor)
+                if not songs and cursor is not None:
+                    # 游标对应的曲目已被删除，回到第一页
+                    reset_page(SONG_PAGE_STATE)
+                    songs, next_cursor = get_songs_page(db, SONG_PAGE_SIZE)
+                total = count_songs(db)
 
             if not songs:
                 if search_term:
@@ -106,12 +120,15 @@ def render_song_list(search_term: str):
                     st.info("暂无曲目，点击上方按钮添加")
                 return
 
-            st.subheader(f"曲目列表 ({len(songs)})")
+            st.subheader(f"曲目列表 ({total})")
 
             # 显示曲目
             for song in songs:
                 render_song_item(song)
 
+            if not search_term:
+                render_pager(SONG_PAGE_STATE, next_cursor, total, SONG_PAGE_SIZE)
+
     except Exception as e:
         st.error(f"加载曲目失败：{e}")
 
@@ -120,14 +137,13 @@ def render_song_item(song):
     """渲染单个曲目项（四行布局）"""
     with st.container():
         # 第一行：曲目名称（可点击选择）
-        if st.button(f"🎼 {song.name}", key=f"select_{song.name}", use_container_width=True):
-            # 检查乐谱数量
-            solo_count = get_solo_count(song.name)
-            if solo_count == 0:
+        if st.button(f"🎼 {song.name}", key=f"select_{song.id}", use_container_width=True):
+            # 检查乐谱数量（曲目的计数字段，不再逐个查询乐谱）
+            if song.solo_count == 0:
                 # 使用 toast 显示提示
                 st.toast(f"⚠️ 曲目 \"{song.name}\" 还没有上传乐谱文件，需要先上传乐谱才能进行演奏评分", icon="⚠️")
             else:
-                st.session_state.selected_song = song.name
+                st.session_state.selected_song = song.id
                 # 清除乐谱管理状态，确保切换到评分管理
                 if 'show_sheet_management' in st.session_state:
                     del st.session_state.show_sheet_management
@@ -137,28 +153,27 @@ def render_song_item(song):
         col1, col2, col3, col4 = st.columns(4)
         with col1:
             # 乐谱按钮，显示乐谱数量
-            solo_count = get_solo_count(song.name)
-            sheet_label = f"🎵 乐谱({solo_count})" if solo_count > 0 else "🎵 乐谱"
-            if st.button(sheet_label, key=f"sheet_{song.name}", help="乐谱管理", use_container_width=True):
-                st.session_state.selected_song = song.name
-                st.session_state.show_sheet_management = song.name
+            sheet_label = f"🎵 乐谱({song.solo_count})" if song.solo_count > 0 else "🎵 乐谱"
+            if st.button(sheet_label, key=f"sheet_{song.id}", help="乐谱管理", use_container_width=True):
+                st.session_state.selected_song = song.id
+                st.session_state.show_sheet_management = song.id
 
         with col2:
             # 播放按钮
             if song.synthesized_audio_path and os.path.exists(song.synthesized_audio_path):
-                if st.button("▶️ 播放", key=f"play_{song.name}", help="播放合成音频", use_container_width=True):
-                    st.session_state.show_audio_player = song.name
+                if st.button("▶️ 播放", key=f"play_{song.id}", help="播放合成音频", use_container_width=True):
+                    st.session_state.show_audio_player = song.id
             else:
-                st.button("▶️ 播放", key=f"play_disabled_{song.name}", help="需要先合成音频",
+                st.button("▶️ 播放", key=f"play_disabled_{song.id}", help="需要先合成音频",
                          use_container_width=True, disabled=True)
 
         with col3:
-            if st.button("✏️ 编辑", key=f"edit_{song.name}", help="编辑曲目", use_container_width=True):
-                st.session_state.edit_song = song.name
+            if st.button("✏️ 编辑", key=f"edit_{song.id}", help="编辑曲目", use_container_width=True):
+                st.session_state.edit_song = song.id
 
         with col4:
-            if st.button("🗑️ 删除", key=f"delete_{song.name}", help="删除曲目", use_container_width=True):
-                st.session_state.delete_song = song.name
+            if st.button("🗑️ 删除", key=f"delete_{song.id}", help="删除曲目", use_container_width=True):
+                st.session_state.delete_song = song.id
 
         # 第三行：作曲家
         if song.composer:
@@ -178,21 +193,27 @@ def render_song_item(song):
         else:
             st.markdown("**难度：** ⚪ 未设定")
 
+        # 录音数量和最近评分时间
+        if song.recording_count:
+            latest = song.latest_score_at.strftime('%Y-%m-%d %H:%M') if song.latest_score_at else "暂无"
+            st.caption(f"🎤 {song.recording_count} 个录音 · 最近评分：{latest}")
+
         st.divider()
 
     # 处理编辑
-    if st.session_state.get('edit_song') == song.name:
+    if st.session_state.get('edit_song') == song.id:
         render_edit_song_form(song)
 
     # 处理删除
-    if st.session_state.get('delete_song') == song.name:
+    if st.session_state.get('delete_song') == song.id:
         render_delete_confirmation(song)
 
 def render_edit_song_form(song):
     """渲染编辑曲目表单"""
     st.subheader(f"编辑：{song.name}")
 
-    with st.form(f"edit_song_form_{song.name}"):
+    with st.form(f"edit_song_form_{song.id}"):
+        name = st.text_input("曲目名称 *", value=song.name)
         composer = st.text_input("作曲家", value=song.composer or "")
         genre = st.selectbox("音乐类型",
                            ["", "古典", "流行", "民谣", "爵士", "摇滚", "其他"],
@@ -208,20 +229,27 @@ def render_edit_song_form(song):
         with col2:
             cancel = st.form_submit_button("取消", use_container_width=True)
 
-        if save:
+        if save and not name:
+            st.error("请输入曲目名称！")
+        elif save:
             try:
                 with get_db_session() as db:
-                    update_song(
-                        db=db,
-                        name=song.name,
-                        composer=composer if composer else None,
-                        genre=genre if genre else None,
-                        difficulty=difficulty if difficulty else None,
-                        description=description if description else None
-                    )
-                    st.success("更新成功！")
-                    st.session_state.edit_song = None
-                    st.rerun()
+                    # 改名时检查新名称是否已被其他曲目使用
+                    if name != song.name and get_song_by_name(db, name):
+                        st.error("曲目名称已存在！")
+                    else:
+                        update_song(
+                            db=db,
+                            song_id=song.id,
+                            name=name,
+                            composer=composer if composer else None,
+                            genre=genre if genre else None,
+                            difficulty=difficulty if difficulty else None,
+                            description=description if description else None
+                        )
+                        st.success("更新成功！")
+                        st.session_state.edit_song = None
+                        st.rerun()
             except Exception as e:
                 st.error(f"更新失败：{e}")
 
@@ -235,10 +263,10 @@ def render_delete_confirmation(song):
 
     col1, col2 = st.columns(2)
     with col1:
-        if st.button("确认删除", key=f"confirm_delete_{song.name}", type="primary"):
+        if st.button("确认删除", key=f"confirm_delete_{song.id}", type="primary"):
             try:
                 with get_db_session() as db:
-                    delete_song(db, song.name)
+                    delete_song(db, song.id)
                     st.success("删除成功！")
                     st.session_state.delete_song = None
                     st.rerun()
@@ -246,30 +274,40 @@ def render_delete_confirmation(song):
                 st.error(f"删除失败：{e}")
 
     with col2:
-        if st.button("取消", key=f"cancel_delete_{song.name}"):
+        if st.button("取消", key=f"cancel_delete_{song.id}"):
             st.session_state.delete_song = None
             st.rerun()
 
 
 def get_selected_song():
-    """获取当前选中的曲目"""
-    return st.session_state.get('selected_song', None)
+    """获取当前选中的曲目，返回 (曲目ID, 曲目名称)；未选中或曲目已被删除时返回 None"""
+    song_id = st.session_state.get('selected_song', None)
+    if song_id is None:
+        return None
+
+    with get_db_session() as db:
+        song = get_song_by_id(db, song_id)
+        song_name = song.name if song else None
+    if song_name is None:
+        del st.session_state.selected_song
+        return None
+    return song_id, song_name
 
 def render_audio_player():
     """渲染音频播放器"""
     if st.session_state.get('show_audio_player'):
-        song_name = st.session_state.show_audio_player
+        song_id = st.session_state.show_audio_player
 
         try:
             with get_db_session() as db:
-                song = get_song_by_name(db, song_name)
+                song = get_song_by_id(db, song_id)
 
                 if song and song.synthesized_audio_path and os.path.exists(song.synthesized_audio_path):
-                    st.subheader(f"🎵 播放：{song_name}")
+                    st.subheader(f"🎵 播放：{song.name}")
 
                     # 音频播放控件
                     with open(song.synthesized_audio_path, "rb") as audio_file:
-                        st.audio(audio_file.read(), format="audio/mp3")
+                        st.audio(audio_file.read(), format=get_audio_mime(song.synthesized_audio_path))
 
                     # 关闭按钮
                     if st.button("❌ 关闭播放器", key="close_audio_player"):